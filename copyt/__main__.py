@@ -24,7 +24,40 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-if __name__ == "__main__":
-    from copyt import _cli_handler
+import os
+import sys
+
+
+def main() -> None:
+    """
+    Run copyt. `store` and `get` run without loading the full CLI,
+    which takes most of the startup time.
+    """
+
+    from copyt import _trace  # pylint: disable=C0415
+
+    # enabled before anything else is imported, so that imports are traced
+    trace_output = _trace.get_output(os.environ.get(_trace.TRACE_VARIABLE))
+    if trace_output is not None:
+        _trace.enable(trace_output)
+
+    with _trace.phase("import"):
+        from copyt import _fast_path  # pylint: disable=C0415
 
-    _cli_handler.cmd()
+    exit_code = _fast_path.run(sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
+
+    with _trace.phase("import cli"):
+        from copyt import _cli_handler, _daemon  # pylint: disable=C0415
+
+    try:
+        _cli_handler.cmd()
+
+    except _daemon.DaemonError as e:  # e.g. the daemon was stopped
+        _fast_path.show_error(_cli_handler.global_options, str(e))
+        sys.exit(12)
+
+
+if __name__ == "__main__":
+    main()
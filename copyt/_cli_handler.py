@@ -26,30 +26,34 @@ SOFTWARE.
 
 
 import base64
+import dataclasses
 import json
-import os
 import pathlib
+import signal
+import string
 import sys
-from typing import Optional
+from datetime import datetime
+from typing import Iterable, Optional
 
-import magic
 import typer
 from typing_extensions import Annotated
 
-from copyt import api, helpers, info
+from copyt import (
+    _compression,
+    _daemon,
+    _db_manager,
+    _fast_path,
+    _trace,
+    _watch,
+    api,
+    helpers,
+    info,
+)
+from copyt.models.clipboard_record import ClipboardRecord
 from copyt.models.global_options import GlobalOptions
 
 cmd = typer.Typer()
-global_options: GlobalOptions = GlobalOptions(
-    json=False,
-    max_items=750,
-    max_item_size_in_bytes=1024 * 1024 * 5,  # 5MB
-    verbose=False,
-    cache_dir=helpers.get_program_cache_dir(
-        os.getenv("XDG_CACHE_HOME") or pathlib.Path(pathlib.Path.home(), ".cache")
-    ),
-    text_encoding="utf-8",
-)
+global_options: GlobalOptions = helpers.get_default_options()
 
 
 @cmd.callback()
@@ -73,6 +77,14 @@ def main_callback(  # pylint: disable=R0913
             help="The maximum size (in bytes) of data to be allowed in the clipboard history",
         ),
     ] = global_options.max_item_size_in_bytes,
+    max_total_size: Annotated[
+        int,
+        typer.Option(
+            "--max-total-size",
+            "-t",
+            help="The maximum size (in bytes) of all data in the clipboard history",
+        ),
+    ] = global_options.max_total_size_in_bytes,
     verbose: Annotated[
         bool, typer.Option("--verbose", "-v", is_flag=True, help="Enable verbose mode")
     ] = global_options.verbose,
@@ -85,6 +97,49 @@ def main_callback(  # pylint: disable=R0913
     text_encoding: Annotated[
         str, typer.Option("--encoding", "-e", help="The text encoding to use")
     ] = global_options.text_encoding,
+    compression: Annotated[
+        str,
+        typer.Option(
+            help="The codec used to compress large items: zlib, lzma or none"
+        ),
+    ] = global_options.compression,
+    compression_level: Annotated[
+        int,
+        typer.Option(help="The compression level, from 0 (fastest) to 9 (smallest)"),
+    ] = global_options.compression_level,
+    compression_threshold: Annotated[
+        int,
+        typer.Option(help="The minimum size (in bytes) of the items to compress"),
+    ] = global_options.compression_threshold_in_bytes,
+    blob_threshold: Annotated[
+        int,
+        typer.Option(
+            help="The minimum size (in bytes) of the binary items stored in"
+            " their own file, or 0 to keep all items in the database"
+        ),
+    ] = global_options.blob_threshold_in_bytes,
+    synchronous: Annotated[
+        str,
+        typer.Option(
+            help="When changes are flushed to the disk:"
+            " OFF, NORMAL, FULL (safest on power loss) or EXTRA"
+        ),
+    ] = global_options.synchronous,
+    busy_timeout: Annotated[
+        float,
+        typer.Option(
+            help="How long (in seconds) to wait for other copyt processes"
+            " to release the history"
+        ),
+    ] = global_options.busy_timeout_in_seconds,
+    profile: Annotated[
+        bool,
+        typer.Option(
+            "--profile",
+            is_flag=True,
+            help="Show the time and memory spent in each phase as JSON on stderr",
+        ),
+    ] = global_options.profile,
 ):
     """
     Setup global options
@@ -93,9 +148,29 @@ def main_callback(  # pylint: disable=R0913
     global_options.json = json_output
     global_options.max_items = max_items
     global_options.max_item_size_in_bytes = max_item_size
+    global_options.max_total_size_in_bytes = max_total_size
     global_options.verbose = verbose
     global_options.cache_dir = cache_dir or global_options.cache_dir
     global_options.text_encoding = text_encoding
+    if compression != "none" and compression not in _compression.COMPRESSORS:
+        raise typer.BadParameter(
+            "must be zlib, lzma or none", param_hint="--compression"
+        )
+
+    global_options.compression = compression
+    global_options.compression_level = compression_level
+    global_options.compression_threshold_in_bytes = compression_threshold
+    global_options.blob_threshold_in_bytes = blob_threshold
+    if synchronous.upper() not in _db_manager.SYNCHRONOUS_LEVELS:
+        raise typer.BadParameter(
+            "must be OFF, NORMAL, FULL or EXTRA", param_hint="--synchronous"
+        )
+
+    global_options.synchronous = synchronous
+    global_options.busy_timeout_in_seconds = busy_timeout
+    global_options.profile = profile
+    if profile:
+        _trace.enable()
 
 
 @cmd.command(name="version")
@@ -113,179 +188,489 @@ def cmd_version():
     raise typer.Exit(0)
 
 
+def _open_api() -> api.API | _daemon.Client:
+    """
+    Connect to the daemon if it is running, or open the history directly.
+
+    :return: An API instance or a client for the daemon.
+    """
+
+    return _fast_path.open_api(global_options)
+
+
 @cmd.command(name="store")
-def cmd_store(data: Annotated[Optional[str], typer.Argument()] = None):
+def cmd_store(
+    data: Annotated[Optional[str], typer.Argument()] = None,
+    batch: Annotated[
+        bool,
+        typer.Option(
+            "--batch",
+            is_flag=True,
+            help="Store the NUL-delimited items read from stdin in a single transaction",
+        ),
+    ] = False,
+    file: Annotated[
+        Optional[pathlib.Path],
+        typer.Option(
+            "--file",
+            "-f",
+            exists=True,
+            dir_okay=False,
+            help="Store the content of a file",
+        ),
+    ] = None,
+):
     """
     Store something in the clipboard
     """
 
-    copyt_api = api.API(global_options)
+    if file is not None:
+        if data is not None or batch:
+            _fast_path.show_error(global_options, "--file cannot be used with data")
+            raise typer.Exit(10)
+
+        raise typer.Exit(_fast_path.store_file(global_options, str(file)))
+
+    if not batch:
+        raise typer.Exit(_fast_path.store(global_options, data))
 
-    # data from argument
     if data is not None:
-        copyt_api.store(data)
-        copyt_api.close(commit=True)
-        raise typer.Exit(0)
+        _fast_path.show_error(global_options, "--batch only reads items from stdin")
+        raise typer.Exit(10)
+
+    copyt_api = api.API(global_options)
+    try:
+        results = copyt_api.store_many(
+            helpers.decode_text(clip, global_options.text_encoding)
+            for clip in _watch.read_clips(
+                sys.stdin.buffer, "nul", global_options.max_item_size_in_bytes
+            )
+            if clip
+        )
+        copyt_api.commit()
+
+    except ValueError as e:  # an item is too large
+        _fast_path.show_error(global_options, str(e))
+        raise typer.Exit(10) from e
 
-    # data from stdin
-    if not sys.stdin.buffer.isatty():
-        stdin_data = sys.stdin.buffer.read()
-        if len(stdin_data) > 0:
-            # check if stdin data is text
-            try:
-                # if magic.from_buffer(stdin_data, mime=True).startswith("text/"):
-                stdin_data = stdin_data.decode(global_options.text_encoding)
+    finally:  # nothing is stored if any item cannot be stored
+        copyt_api.close()
 
-            except UnicodeDecodeError:  # data is not text
-                pass
+    for result in results:
+        _fast_path.show_store_result(global_options, result)
 
-            copyt_api.store(stdin_data)
-            copyt_api.close(commit=True)
-            raise typer.Exit(0)
+    raise typer.Exit(0)
+
+
+def _get_preview(data: ClipboardRecord) -> str:
+    """
+    Get what `list` shows for an item: a preview of text items,
+    and the description of other items.
+
+    :param ClipboardRecord data: The record of the item.
+    :return: The preview of the item.
+    """
+
+    return data.preview if data.preview is not None else data.description or ""
+
+
+def _get_record_fields(output_format: str, full: bool) -> list[str]:
+    """
+    Get the fields of the records needed by `_show_records`.
+
+    :param str output_format: The output format of the records.
+    :param bool full: Show the full content of the records in JSON output.
+    :return: The fields to load.
+    """
 
     if global_options.json:
-        print(json.dumps({"error": "Nothing to store"}))
+        return ["content"] if full else ["description", "preview"]
+
+    format_fields = {
+        field_name
+        for _, field_name, _, _ in string.Formatter().parse(output_format)
+        if field_name is not None
+    }
+    fields = ["mime", "description", "size", "preview"]
+    if "content_full" in format_fields:
+        # binary items only show their description
+        fields.append(_db_manager.TEXT_CONTENT_FIELD)
+
+    return fields
+
+
+def _get_json_item(item_id: int, data: ClipboardRecord, full: bool) -> list:
+    """
+    Get the JSON representation of a record in the output of `list`.
+
+    :param int item_id: The ID of the record.
+    :param ClipboardRecord data: The record.
+    :param bool full: Show the full content of the record instead of its preview.
+    :return: The ID and the timestamp and content of the record.
+    """
+
+    if not full:
+        content = _get_preview(data)
+
+    elif isinstance(data.content, str):
+        content = data.content
+
     else:
-        typer.echo("Nothing to store", err=True)
+        content = base64.b64encode(data.content).decode(global_options.text_encoding)
+
+    return [str(item_id), {"timestamp": data.timestamp.timestamp(), "content": content}]
 
-    raise typer.Exit(10)
+
+def _show_records(
+    copyt_api: api.API | _daemon.Client,
+    records: Iterable[tuple[int, ClipboardRecord]],
+    output_format: str,
+    full: bool,
+) -> None:
+    """
+    Show a list of records, as they are read from the history.
+
+    :param api.API | _daemon.Client copyt_api: The API the records are read from.
+    :param Iterable[tuple[int, ClipboardRecord]] records: The IDs and records to show.
+    :param str output_format: The output format of the records.
+    :param bool full: Show the full content of the records in JSON output.
+    """
+
+    if global_options.json:
+        # items are written as they are read so that the whole history
+        # is never in memory at once
+        sys.stdout.write("[")
+        for idx, (item_id, data) in enumerate(records):
+            if idx > 0:
+                sys.stdout.write(", ")
+
+            sys.stdout.write(json.dumps(_get_json_item(item_id, data, full)))
+
+        print("]")
+        return
+
+    for item_id, data in records:
+        mime = data.mime
+        if mime is None:
+            # records migrated from older versions may not have been identified yet
+            mime, description = helpers.sniff(
+                copyt_api.get_record_from_id(item_id).content
+            )
+            data = dataclasses.replace(data, description=description)
+
+        print(
+            # DOCS: document the behavior of this
+            output_format.format(
+                id=item_id,
+                kind=mime,
+                content=_get_preview(data),
+                content_full=data.content
+                if isinstance(data.content, str)
+                else _get_preview(data),
+                size=data.size,
+                timestamp=data.timestamp.timestamp(),
+            )
+        )
+
+
+def _parse_time(value: Optional[str], param_hint: str) -> Optional[datetime]:
+    """
+    Parse a point in time given as an option, see `helpers.parse_time`.
+
+    :param Optional[str] value: The value of the option.
+    :param str param_hint: The name of the option, shown in errors.
+    :return: The point in time, or None if the option is not set.
+    """
+
+    if value is None:
+        return None
+
+    try:
+        return helpers.parse_time(value)
+
+    except ValueError as e:
+        raise typer.BadParameter(
+            "must be a duration (e.g. 30m, 1h, 7d) or an ISO 8601 date and time",
+            param_hint=param_hint,
+        ) from e
 
 
 @cmd.command(name="list")
-def cmd_list(
+def cmd_list(  # pylint: disable=R0913
     output_format: Annotated[
         str,
         typer.Option(help="Set a custom format of the output"),
-    ] = "{id}\t{content}"
+    ] = "{id}\t{content}",
+    limit: Annotated[
+        Optional[int],
+        typer.Option(help="The maximum number of items to show"),
+    ] = None,
+    offset: Annotated[
+        int,
+        typer.Option(help="The number of items to skip"),
+    ] = 0,
+    reverse: Annotated[
+        bool,
+        typer.Option("--reverse", is_flag=True, help="Show the newest items first"),
+    ] = False,
+    full: Annotated[
+        bool,
+        typer.Option(
+            "--full",
+            is_flag=True,
+            help="Show the full content of the items in JSON output",
+        ),
+    ] = False,
+    fuzzy: Annotated[
+        Optional[str],
+        typer.Option(help="Only show the items matching a pattern, best first"),
+    ] = None,
+    since: Annotated[
+        Optional[str],
+        typer.Option(
+            help="Only show the items stored since a time: a duration"
+            " (e.g. 1h for the last hour) or an ISO 8601 date and time"
+        ),
+    ] = None,
+    until: Annotated[
+        Optional[str],
+        typer.Option(help="Only show the items stored before a time, like --since"),
+    ] = None,
+    since_id: Annotated[
+        Optional[int],
+        typer.Option(
+            help="Only show the items changed since a cursor (0 to start),"
+            " with the deleted items and the next cursor, in JSON"
+        ),
+    ] = None,
 ):
     """
     Get a list of all stored items
     """
 
-    copyt_api = api.API(global_options)
-    hist_list = copyt_api.get_history_list()
-    copyt_api.close()
-    if global_options.json:
-        print(
-            json.dumps(
-                [
-                    [
-                        item_id,
-                        {
-                            "timestamp": data.timestamp.timestamp(),
-                            "content": data.content
-                            if isinstance(data.content, str)
-                            else base64.b64encode(data.content).decode(
-                                global_options.text_encoding
-                            ),
-                        },
-                    ]
-                    for item_id, data in hist_list
-                ]
+    if since_id is not None:
+        if not global_options.json:
+            raise typer.BadParameter("requires --json", param_hint="--since-id")
+
+        if any((fuzzy, since, until, limit is not None, offset, reverse)):
+            raise typer.BadParameter(
+                "cannot be used with the other options of list",
+                param_hint="--since-id",
             )
-        )
+
+        _show_changes(since_id, output_format, full)
         raise typer.Exit(0)
 
-    for item_id, data in hist_list:
-        print(
-            # DOCS: document the behavior of this
-            output_format.format(
-                id=item_id,
-                kind=magic.from_buffer(data.content, mime=True),
-                content=magic.from_buffer(data.content)
-                if isinstance(data.content, bytes)
-                else data.content,
-                size=len(data.content),
-                timestamp=data.timestamp.timestamp,
+    since_time = _parse_time(since, "--since")
+    until_time = _parse_time(until, "--until")
+    if fuzzy is not None and (since_time or until_time):
+        raise typer.BadParameter(
+            "cannot be used with --since or --until", param_hint="--fuzzy"
+        )
+
+    with _trace.phase("list"):
+        copyt_api = _open_api()
+        fields = _get_record_fields(output_format, full)
+        if fuzzy is None:
+            records = copyt_api.iter_history(
+                limit, offset, reverse, fields, since_time, until_time
             )
+
+        else:
+            with _trace.phase("fuzzy find"):
+                records = copyt_api.fuzzy_find(
+                    fuzzy, None if limit is None else offset + limit, fields
+                )[offset:]
+
+            if reverse:
+                records.reverse()
+
+        # the records are read from the history as they are shown
+        with _trace.phase("output"):
+            _show_records(copyt_api, records, output_format, full)
+
+        copyt_api.close()
+    raise typer.Exit(0)
+
+
+def _show_changes(cursor: int, output_format: str, full: bool) -> None:
+    """
+    Show the changes of the history since a cursor, in JSON.
+
+    :param int cursor: The cursor of the previous changes.
+    :param str output_format: The output format of the records, used to
+        know which fields to load.
+    :param bool full: Show the full content of the records.
+    """
+
+    # the history is read directly, the daemon does not forward changes
+    copyt_api = api.API(global_options)
+    change_set = copyt_api.changes_since(
+        cursor, _get_record_fields(output_format, full)
+    )
+    copyt_api.close()
+    print(
+        json.dumps(
+            {
+                "cursor": change_set.cursor,
+                "reset": change_set.reset,
+                "items": [
+                    _get_json_item(item_id, data, full)
+                    for item_id, data in change_set.records
+                ],
+                "deleted": [str(item_id) for item_id in change_set.deleted],
+            }
         )
+    )
+
+
+@cmd.command(name="search")
+def cmd_search(
+    query: Annotated[str, typer.Argument(help="The words to search for")],
+    output_format: Annotated[
+        str,
+        typer.Option(help="Set a custom format of the output"),
+    ] = "{id}\t{content}",
+    limit: Annotated[
+        Optional[int],
+        typer.Option(help="The maximum number of items to show"),
+    ] = None,
+    full: Annotated[
+        bool,
+        typer.Option(
+            "--full",
+            is_flag=True,
+            help="Show the full content of the items in JSON output",
+        ),
+    ] = False,
+):
+    """
+    Search the text items, best matches first
+    """
 
+    with _trace.phase("search"):
+        copyt_api = _open_api()
+        with _trace.phase("output"):
+            _show_records(
+                copyt_api,
+                copyt_api.search(query, limit, _get_record_fields(output_format, full)),
+                output_format,
+                full,
+            )
+
+        copyt_api.close()
     raise typer.Exit(0)
 
 
-@cmd.command(name="get")
-def cmd_get(item_id: Annotated[Optional[str], typer.Argument()] = None):
+@cmd.command(name="backfill")
+def cmd_backfill(
+    workers: Annotated[
+        Optional[int],
+        typer.Option(help="The number of worker processes to use"),
+    ] = None
+):
     """
-    Get something from the clipboard
+    Identify the stored items that were migrated from older versions
     """
 
-    try:
-        user_input = helpers.get_input_from_arg_or_stdin(item_id)
-        if user_input is None:
-            if global_options.json:
-                print(json.dumps({"error": "No item ID specified"}))
+    copyt_api = api.API(global_options)
+    updated = copyt_api.backfill_metadata(workers)
+    copyt_api.close(commit=True)
+    if global_options.json:
+        print(json.dumps({"updated": updated}))
 
-            else:
-                typer.echo("No item ID specified", err=True)
+    else:
+        typer.echo(f"Updated {updated} items")
 
-            raise typer.Exit(10)
+    raise typer.Exit(0)
 
-        item_id_int = int(
-            user_input.decode(global_options.text_encoding)
-            if isinstance(user_input, bytes)
-            else user_input
+
+@cmd.command(name="watch")
+def cmd_watch(
+    framing: Annotated[
+        str,
+        typer.Option(
+            help="How the clips are delimited: `nul` (a NUL byte after each clip)"
+            " or `length` (the size of each clip and a newline before it)"
+        ),
+    ] = "nul",
+    commit_interval: Annotated[
+        float,
+        typer.Option(help="The maximum time (in seconds) before a clip is saved"),
+    ] = 1.0,
+):
+    """
+    Store a continuous stream of clips read from stdin
+    """
+
+    if framing not in _watch.DECODERS:
+        _fast_path.show_error(global_options, "Unknown framing")
+        raise typer.Exit(10)
+
+    copyt_api = api.API(global_options)
+    try:
+        _watch.watch(
+            copyt_api,
+            sys.stdin.buffer,
+            framing,
+            commit_interval,
+            lambda result: _fast_path.show_store_result(global_options, result),
+            lambda message: _fast_path.show_error(global_options, message),
         )
 
-        result = api.API(global_options).get_record_from_id(item_id_int)
-        if global_options.json:
-            print(
-                json.dumps(
-                    {
-                        "timestamp": result.timestamp.timestamp(),
-                        # DOCS: we should probably document that `get` shows
-                        # base64-encoded content if it's not a string
-                        "content": result.content
-                        if isinstance(result.content, str)
-                        else base64.b64encode(result.content).decode(
-                            global_options.text_encoding
-                        ),
-                    }
-                ),
-                end="",
-            )
-            raise typer.Exit(0)
+    finally:
+        copyt_api.close()
 
-        if isinstance(result.content, str):
-            sys.stdout.write(result.content)
-            sys.stdout.flush()
-            raise typer.Exit(0)
+    raise typer.Exit(0)
 
-        if sys.stdout.buffer.writable():
-            sys.stdout.buffer.write(result.content)
-            sys.stdout.buffer.flush()
-            raise typer.Exit(0)
 
-        typer.echo(
-            "The content of the item is not a string and stdout is not writable",
-            err=True,
-        )
-        raise typer.Exit(11)
+@cmd.command(name="serve")
+def cmd_serve():
+    """
+    Keep the history open and serve the other commands from a daemon
+    """
 
-    except ValueError as e:
+    socket_path = _daemon.get_socket_path(global_options.cache_dir)
+    copyt_api = api.API(global_options)
+    try:
+        server = _daemon.Server(socket_path, copyt_api)
+
+    except FileExistsError as e:
+        copyt_api.close()
         if global_options.json:
-            print(json.dumps({"error": "Invalid item ID"}))
+            print(json.dumps({"error": "The daemon is already running"}))
 
         else:
-            typer.echo("Invalid item ID", err=True)
+            typer.echo("The daemon is already running", err=True)
 
         raise typer.Exit(10) from e
 
-    except KeyError as e:
-        if global_options.json:
-            print(
-                json.dumps(
-                    {
-                        "error": "There are no records in history with the specified item ID"
-                    }
-                )
-            )
-        else:
-            typer.echo(
-                "There are no records in history with the specified item ID",
-                err=True,
-            )
+    # exit cleanly (and remove the socket) when the daemon is stopped
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    if global_options.verbose:
+        typer.echo(f"Listening on {socket_path}", err=True)
 
-        raise typer.Exit(10) from e
+    try:
+        server.serve_forever()
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        server.server_close()
+        with server.lock:  # wait for the request being handled
+            copyt_api.close(commit=True)
+
+    raise typer.Exit(0)
+
+
+@cmd.command(name="get")
+def cmd_get(item_id: Annotated[Optional[str], typer.Argument()] = None):
+    """
+    Get something from the clipboard
+    """
+
+    raise typer.Exit(_fast_path.get(global_options, item_id))
 
 
 @cmd.command(name="delete")
@@ -305,7 +690,7 @@ def cmd_delete(item_id: Annotated[Optional[str], typer.Argument()] = None):
 
             raise typer.Exit(10)
 
-        copyt_api = api.API(global_options)
+        copyt_api = _open_api()
         copyt_api.remove(
             int(
                 user_input.decode(global_options.text_encoding)
@@ -342,6 +727,33 @@ def cmd_delete(item_id: Annotated[Optional[str], typer.Argument()] = None):
         raise typer.Exit(10) from e
 
 
+@cmd.command(name="prune")
+def cmd_prune(
+    older_than: Annotated[
+        str,
+        typer.Option(
+            help="Remove the items older than a duration (e.g. 30d),"
+            " or stored before an ISO 8601 date and time"
+        ),
+    ],
+):
+    """
+    Remove the old items from the clipboard history
+    """
+
+    before = _parse_time(older_than, "--older-than")
+    copyt_api = api.API(global_options)
+    pruned = copyt_api.prune(before)
+    copyt_api.close(commit=True)
+    if global_options.json:
+        print(json.dumps({"pruned": pruned}))
+
+    else:
+        typer.echo(f"Removed {pruned} items")
+
+    raise typer.Exit(0)
+
+
 @cmd.command(name="wipe")
 def cmd_wipe():
     """
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import io
+import lzma
+import zlib
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional
+
+# The compression functions of each codec, which take the data and the level
+COMPRESSORS: dict[str, Callable[[bytes, int], bytes]] = {
+    "zlib": zlib.compress,
+    "lzma": lambda data, level: lzma.compress(data, preset=level),
+}
+DECOMPRESSORS: dict[str, Callable[[bytes], bytes]] = {
+    "zlib": zlib.decompress,
+    "lzma": lzma.decompress,
+}
+# The suffix of the codec of compressed text, which is encoded in UTF-8
+TEXT_SUFFIX = ":text"
+TEXT_ENCODING = "utf-8"
+# The size of the chunks read and produced by `DecompressingReader`
+CHUNK_SIZE = 1024 * 64
+# The signatures of formats that are already compressed
+COMPRESSED_SIGNATURES = (
+    b"\x89PNG",
+    b"\xff\xd8\xff",  # JPEG
+    b"GIF8",
+    b"PK\x03\x04",  # zip, and formats based on it
+    b"\x1f\x8b",  # gzip
+    b"BZh",
+    b"\xfd7zXZ\x00",
+    b"\x28\xb5\x2f\xfd",  # zstd
+    b"7z\xbc\xaf\x27\x1c",
+    b"OggS",
+    b"fLaC",
+    b"ID3",  # MP3
+)
+
+
+def is_compressed(data: bytes) -> bool:
+    """
+    Check the signature of data to see if it is already compressed.
+
+    :param bytes data: The data to check, or any bytes-like object.
+    :return: True if the data is in a compressed format.
+    """
+
+    head = bytes(data[:12])
+    return (
+        head.startswith(COMPRESSED_SIGNATURES)
+        or (head.startswith(b"RIFF") and head[8:12] == b"WEBP")
+        or head[4:8] == b"ftyp"  # MP4, HEIC and AVIF
+    )
+
+
+def compress(data: str | bytes, codec: str, level: int) -> Optional[tuple[bytes, str]]:
+    """
+    Compress data, unless it is already compressed.
+
+    :param str | bytes data: The data to compress.
+    :param str codec: The codec to use, see `COMPRESSORS`.
+    :param int level: The compression level, from 0 to 9.
+    :return: The compressed data and the codec to store with it,
+        or None if compressing the data does not make it smaller.
+    """
+
+    if isinstance(data, str):
+        raw = data.encode(TEXT_ENCODING)
+        codec_name = codec + TEXT_SUFFIX
+
+    elif is_compressed(data):
+        return None
+
+    else:
+        raw = data
+        codec_name = codec
+
+    compressed = COMPRESSORS[codec](raw, level)
+    if len(compressed) >= len(raw):
+        return None
+
+    return compressed, codec_name
+
+
+def decompress(content: bytes, codec: str) -> str | bytes:
+    """
+    Decompress data compressed with `compress`.
+
+    :param bytes content: The compressed data.
+    :param str codec: The codec returned by `compress`.
+    :return: The original data.
+    """
+
+    if codec.endswith(TEXT_SUFFIX):
+        codec = codec.removesuffix(TEXT_SUFFIX)
+        return DECOMPRESSORS[codec](content).decode(TEXT_ENCODING)
+
+    return DECOMPRESSORS[codec](content)
+
+
+def iter_decompress(chunks: Iterable[bytes], codec: str) -> Iterator[bytes]:
+    """
+    Decompress data compressed with `compress` chunk by chunk, producing
+    chunks of at most `CHUNK_SIZE` bytes.
+
+    :param Iterable[bytes] chunks: The chunks of the compressed data.
+    :param str codec: The codec returned by `compress`.
+    :return: The chunks of the original data, encoded in UTF-8 for text.
+    """
+
+    codec = codec.removesuffix(TEXT_SUFFIX)
+    if codec == "zlib":
+        zlib_decompressor = zlib.decompressobj()
+        for chunk in chunks:
+            while chunk:
+                yield zlib_decompressor.decompress(chunk, CHUNK_SIZE)
+                chunk = zlib_decompressor.unconsumed_tail
+
+        yield zlib_decompressor.flush()
+        return
+
+    lzma_decompressor = lzma.LZMADecompressor()
+    for chunk in chunks:
+        yield lzma_decompressor.decompress(chunk, CHUNK_SIZE)
+        while not lzma_decompressor.needs_input and not lzma_decompressor.eof:
+            yield lzma_decompressor.decompress(b"", CHUNK_SIZE)
+
+
+class DecompressingReader(io.RawIOBase):
+    """
+    A stream of the data decompressed from another stream,
+    to read large compressed items without loading all of them.
+    """
+
+    def __init__(self, raw: BinaryIO, codec: str):
+        """
+        :param BinaryIO raw: The stream of the compressed data, closed
+            with this stream.
+        :param str codec: The codec returned by `compress`.
+        """
+
+        super().__init__()
+        self._raw = raw
+        self._chunks = iter_decompress(iter(lambda: raw.read(CHUNK_SIZE), b""), codec)
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: bytearray | memoryview) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+
+            self._pending = chunk
+
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def close(self) -> None:
+        self._raw.close()
+        super().close()
+
+
+def stored_text(content: str | bytes, codec: Optional[str]) -> Optional[str]:
+    """
+    Get the text stored in a row, compressed or not. Registered as an
+    SQL function to index compressed text.
+
+    :param str | bytes content: The content column of the row.
+    :param Optional[str] codec: The codec column of the row.
+    :return: The text, or None if the row holds binary data.
+    """
+
+    if isinstance(content, str):
+        return content
+
+    if codec is not None and codec.endswith(TEXT_SUFFIX):
+        return decompress(content, codec)
+
+    return None
@@ -0,0 +1,541 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import dataclasses
+import io
+import json
+import os
+import pathlib
+import shutil
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+from datetime import datetime
+from typing import Any, BinaryIO, Iterable, Iterator, Optional
+
+from copyt import _record_format, helpers
+from copyt.models.clipboard_record import ClipboardRecord
+from copyt.models.global_options import GlobalOptions
+from copyt.models.store_result import StoreResult
+
+# The sizes of the JSON header and of the payload that follows it
+FRAME_HEADER = struct.Struct("!II")
+# The encoding of text sent over the socket
+WIRE_ENCODING = "utf-8"
+# The methods of the API that clients can call, and whether they modify the history
+METHODS = {
+    "store": True,
+    "remove": True,
+    "get_record_from_id": False,
+    "iter_history": False,
+    "search": False,
+    "fuzzy_find": False,
+}
+# The options of the client that apply to the items it stores
+FORWARDED_OPTIONS = ("max_items", "max_item_size_in_bytes", "max_total_size_in_bytes")
+# The arguments sent as timestamps, since JSON has no datetime type
+TIME_ARGUMENTS = ("since", "until")
+# The exceptions of the API that are raised again by the client
+FORWARDED_ERRORS = {"KeyError": KeyError, "ValueError": ValueError}
+# The time (in seconds) a client has to send its request
+REQUEST_TIMEOUT = 5
+# The size (in bytes) of the responses kept in memory while they are
+# prepared; larger responses are spooled to a temporary file
+RESPONSE_SPOOL_SIZE = 1024 * 1024 * 8
+
+
+class DaemonError(ConnectionError):
+    """
+    The connection to the daemon was lost before the end of a response.
+    """
+
+
+def get_socket_path(cache_dir: str | pathlib.Path) -> pathlib.Path:
+    """
+    Get the path of the socket of the daemon serving a history.
+    Each history file gets its own socket.
+
+    :param str | pathlib.Path cache_dir: The directory where the history is stored.
+    :return: The path of the socket.
+    """
+
+    cache_dir = pathlib.Path(cache_dir).absolute()
+    return pathlib.Path(
+        os.getenv("XDG_RUNTIME_DIR") or cache_dir,
+        f"copyt-{helpers.hash_path(cache_dir)}.sock",
+    )
+
+
+def _pack(header: dict, payload: bytes = b"") -> bytes:
+    """
+    Pack a frame: a JSON header followed by a binary payload.
+
+    :param dict header: The header of the frame.
+    :param bytes payload: The payload of the frame.
+    :return: The frame.
+    """
+
+    header_bytes = json.dumps(header).encode(WIRE_ENCODING)
+    return FRAME_HEADER.pack(len(header_bytes), len(payload)) + header_bytes + payload
+
+
+def _send(connection: socket.socket, header: dict, payload: bytes = b"") -> None:
+    """
+    Send a frame, see `_pack`.
+
+    :param socket.socket connection: The socket to write to.
+    :param dict header: The header of the frame.
+    :param bytes payload: The payload of the frame.
+    """
+
+    connection.sendall(_pack(header, payload))
+
+
+def _receive(stream: BinaryIO) -> Optional[tuple[dict, bytes]]:
+    """
+    Receive a frame sent with `_send`.
+
+    :param BinaryIO stream: The file-like object to read from.
+    :return: The header and payload of the frame, or None if the stream ended.
+    """
+
+    frame_header = stream.read(FRAME_HEADER.size)
+    if len(frame_header) < FRAME_HEADER.size:
+        return None
+
+    header_size, payload_size = FRAME_HEADER.unpack(frame_header)
+    header = stream.read(header_size)
+    payload = stream.read(payload_size)
+    if len(header) < header_size or len(payload) < payload_size:
+        return None
+
+    return json.loads(header.decode(WIRE_ENCODING)), payload
+
+
+def _encode_content(content: Optional[str | bytes]) -> tuple[Optional[str], bytes]:
+    """
+    Encode the content of a record to send it as a payload.
+
+    :param Optional[str | bytes] content: The content to encode.
+    :return: The type of the content and its encoded form.
+    """
+
+    if content is None:
+        return None, b""
+
+    if isinstance(content, str):
+        return "text", content.encode(WIRE_ENCODING)
+
+    return "bytes", content
+
+
+def _decode_content(content_type: Optional[str], data: bytes) -> Optional[str | bytes]:
+    """
+    Decode content encoded with `_encode_content`.
+
+    :param Optional[str] content_type: The type of the content.
+    :param bytes data: The encoded content.
+    :return: The content.
+    """
+
+    if content_type is None:
+        return None
+
+    return data.decode(WIRE_ENCODING) if content_type == "text" else data
+
+
+def _encode_record(item_id: int, record: ClipboardRecord) -> tuple[dict, bytes]:
+    """
+    Encode a record to send it in a frame. The record is sent in the
+    binary layout of `_record_format`, which is faster to encode and
+    decode than a JSON header.
+
+    :param int item_id: The ID of the record.
+    :param ClipboardRecord record: The record to encode.
+    :return: The header and payload of the frame.
+    """
+
+    return {"item_id": item_id}, _record_format.encode(record)
+
+
+def _decode_record(header: dict, payload: bytes) -> tuple[int, ClipboardRecord]:
+    """
+    Decode a record encoded with `_encode_record`.
+
+    :param dict header: The header of the frame.
+    :param bytes payload: The payload of the frame.
+    :return: The ID of the record and the record.
+    """
+
+    return header["item_id"], _record_format.decode(payload)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handle a single request, on the thread of its connection. The response
+    is prepared while holding the lock of the API, then sent once it is
+    released, so that a client reading it slowly does not block the others.
+    """
+
+    server: "Server"
+    timeout = REQUEST_TIMEOUT
+
+    def handle(self) -> None:
+        try:
+            request = _receive(self.rfile)
+            if request is None:  # the client only checked if the daemon is running
+                return
+
+            # the client may read the response as slowly as it needs, e.g.
+            # when its output is piped to a pager
+            self.connection.settimeout(None)
+            with tempfile.SpooledTemporaryFile(RESPONSE_SPOOL_SIZE) as response:
+                with self.server.lock:
+                    for header, payload in self._respond(*request):
+                        response.write(_pack(header, payload))
+
+                response.seek(0)
+                shutil.copyfileobj(response, self.wfile)
+
+        except OSError:  # the client disconnected or did not send its request
+            return
+
+    def _respond(self, header: dict, payload: bytes) -> Iterator[tuple[dict, bytes]]:
+        """
+        Get the frames of the response to a request. The last frame
+        either ends the response or describes an error of the API.
+
+        :param dict header: The header of the request.
+        :param bytes payload: The payload of the request.
+        :return: The headers and payloads of the frames.
+        """
+
+        try:
+            yield from self.server.call(header, payload)
+
+        except tuple(FORWARDED_ERRORS.values()) as e:
+            yield {"error": type(e).__name__, "args": list(e.args)}, b""
+            return
+
+        yield {"end": True}, b""
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serve an API instance over a Unix socket. Each connection is handled
+    by its own thread, and the API is used by one of them at a time
+    (see `lock`).
+    """
+
+    # a client that never reads its response does not keep the daemon running
+    daemon_threads = True
+
+    def __init__(self, socket_path: pathlib.Path, copyt_api: Any):
+        """
+        :param pathlib.Path socket_path: The path of the socket to listen on.
+        :param api.API copyt_api: The API to serve.
+        """
+
+        self.copyt_api = copyt_api
+        # held while the API is used, including to close it
+        self.lock = threading.Lock()
+        if socket_path.is_socket():
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                if connection.connect_ex(str(socket_path)) == 0:
+                    raise FileExistsError(
+                        f"A daemon is already listening on {socket_path}"
+                    )
+
+            socket_path.unlink()  # left behind by a daemon that crashed
+
+        os.makedirs(socket_path.parent, exist_ok=True)
+        super().__init__(str(socket_path), _RequestHandler)
+        os.chmod(socket_path, 0o600)
+
+    def server_close(self) -> None:
+        super().server_close()
+        pathlib.Path(self.server_address).unlink(missing_ok=True)
+
+    def _store(self, data: str | bytes, options: dict) -> StoreResult:
+        """
+        Store data with the options of the client.
+
+        :param str | bytes data: The data to store.
+        :param dict options: The values of the `FORWARDED_OPTIONS` of the client.
+        :return: The result of `API.store`.
+        """
+
+        server_options = self.copyt_api.global_options
+        self.copyt_api.global_options = dataclasses.replace(server_options, **options)
+        try:
+            return self.copyt_api.store(data)
+
+        finally:
+            self.copyt_api.global_options = server_options
+
+    def call(self, header: dict, payload: bytes) -> Iterator[tuple[dict, bytes]]:
+        """
+        Call a method of the API.
+
+        :param dict header: The method to call and its keyword arguments.
+        :param bytes payload: The data to store, for `store`.
+        :return: The headers and payloads of the frames of the result,
+            one frame per record.
+        """
+
+        method = header["method"]
+        if method not in METHODS:
+            raise ValueError(f"Unknown method: {method}")
+
+        kwargs = header.get("kwargs", {})
+        for argument in TIME_ARGUMENTS:
+            if kwargs.get(argument) is not None:
+                kwargs[argument] = datetime.fromtimestamp(kwargs[argument])
+
+        if method == "store":
+            result = self._store(
+                _decode_content(header["content_type"], payload),
+                {
+                    option: value
+                    for option, value in header.get("options", {}).items()
+                    if option in FORWARDED_OPTIONS
+                },
+            )
+
+        else:
+            result = getattr(self.copyt_api, method)(**kwargs)
+
+        if METHODS[method]:
+            self.copyt_api.commit()
+
+        if isinstance(result, StoreResult):
+            yield {"item_id": result.item_id, "duplicate": result.duplicate}, b""
+
+        elif isinstance(result, ClipboardRecord):
+            yield _encode_record(kwargs["item_id"], result)
+
+        elif result is not None:
+            for item_id, record in result:
+                yield _encode_record(item_id, record)
+
+
+class Client:
+    """
+    A client for the daemon, with the same methods as the API.
+    Each call uses its own connection.
+    """
+
+    def __init__(self, socket_path: pathlib.Path, global_options: GlobalOptions):
+        """
+        :param pathlib.Path socket_path: The path of the socket of the daemon.
+        :param GlobalOptions global_options: The options of the program.
+        """
+
+        self._socket_path = socket_path
+        self.global_options = global_options
+
+    def _call(
+        self, method: str, payload: bytes = b"", **header: Any
+    ) -> Iterator[tuple[dict, bytes]]:
+        """
+        Call a method of the API served by the daemon.
+
+        :param str method: The name of the method.
+        :param bytes payload: The payload of the request.
+        :return: The headers and payloads of the frames of the response.
+        """
+
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                connection.connect(str(self._socket_path))
+                _send(connection, {"method": method, **header}, payload)
+                with connection.makefile("rb") as stream:
+                    while (frame := _receive(stream)) is not None:
+                        response, response_payload = frame
+                        if "error" in response:
+                            raise FORWARDED_ERRORS[response["error"]](*response["args"])
+
+                        if response.get("end"):
+                            return
+
+                        yield response, response_payload
+
+        except OSError as e:  # e.g. the daemon was stopped
+            raise DaemonError("The connection to the daemon was lost") from e
+
+        raise DaemonError("The daemon closed the connection")
+
+    def commit(self) -> None:
+        """
+        Do nothing, the daemon commits after every change.
+        """
+
+    def close(self, commit: bool = False) -> None:  # pylint: disable=W0613
+        """
+        Do nothing, connections are closed after every call.
+        """
+
+    def store(
+        self, data: str | bytes, digest: Optional[bytes] = None  # pylint: disable=W0613
+    ) -> StoreResult:
+        """
+        See `API.store`. The limits of the client apply to the stored item,
+        which the daemon hashes itself.
+        """
+
+        content_type, payload = _encode_content(data)
+        ((response, _),) = self._call(
+            "store",
+            payload,
+            content_type=content_type,
+            options={
+                option: getattr(self.global_options, option)
+                for option in FORWARDED_OPTIONS
+            },
+        )
+        return StoreResult(item_id=response["item_id"], duplicate=response["duplicate"])
+
+    def remove(self, item_id: int) -> None:
+        """
+        See `API.remove`.
+        """
+
+        for _ in self._call("remove", kwargs={"item_id": item_id}):
+            pass
+
+    def get_record_from_id(
+        self, item_id: int, fields: Optional[Iterable[str]] = None
+    ) -> ClipboardRecord:
+        """
+        See `API.get_record_from_id`.
+        """
+
+        ((response, payload),) = self._call(
+            "get_record_from_id",
+            kwargs={
+                "item_id": item_id,
+                "fields": None if fields is None else list(fields),
+            },
+        )
+        return _decode_record(response, payload)[1]
+
+    def open_content(self, item_id: int) -> BinaryIO:
+        """
+        See `API.open_content`. The content is received in a single frame.
+        """
+
+        content = self.get_record_from_id(item_id, ("content",)).content
+        return io.BytesIO(
+            content.encode("utf-8") if isinstance(content, str) else content
+        )
+
+    def iter_history(  # pylint: disable=R0913
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        reverse: bool = False,
+        fields: Optional[Iterable[str]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Iterator[tuple[int, ClipboardRecord]]:
+        """
+        See `API.iter_history`.
+        """
+
+        for response, payload in self._call(
+            "iter_history",
+            kwargs={
+                "limit": limit,
+                "offset": offset,
+                "reverse": reverse,
+                "fields": None if fields is None else list(fields),
+                "since": None if since is None else since.timestamp(),
+                "until": None if until is None else until.timestamp(),
+            },
+        ):
+            yield _decode_record(response, payload)
+
+    def search(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> list[tuple[int, ClipboardRecord]]:
+        """
+        See `API.search`.
+        """
+
+        return [
+            _decode_record(response, payload)
+            for response, payload in self._call(
+                "search",
+                kwargs={
+                    "query": query,
+                    "limit": limit,
+                    "fields": None if fields is None else list(fields),
+                },
+            )
+        ]
+
+    def fuzzy_find(
+        self,
+        pattern: str,
+        limit: Optional[int] = None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> list[tuple[int, ClipboardRecord]]:
+        """
+        See `API.fuzzy_find`.
+        """
+
+        return [
+            _decode_record(response, payload)
+            for response, payload in self._call(
+                "fuzzy_find",
+                kwargs={
+                    "pattern": pattern,
+                    "limit": limit,
+                    "fields": None if fields is None else list(fields),
+                },
+            )
+        ]
+
+
+def connect(global_options: GlobalOptions) -> Optional[Client]:
+    """
+    Get a client for the daemon serving the history, if it is running.
+
+    :param GlobalOptions global_options: The options of the program.
+    :return: A client for the daemon, or None if it is not running.
+    """
+
+    socket_path = get_socket_path(global_options.cache_dir)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        if connection.connect_ex(str(socket_path)) != 0:
+            return None  # the daemon is not running or its socket is stale
+
+    return Client(socket_path, global_options)
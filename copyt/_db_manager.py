@@ -24,34 +24,607 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+# pylint: disable=C0302  # the schema upgrades are kept with the queries
+
+import hashlib
+import io
 import os
 import pathlib
+import sqlite3
+import time
 from datetime import datetime
+from typing import BinaryIO, Iterable, Iterator, Optional
 
-from sqlitedict import SqliteDict
-
+from copyt import _compression, _trace, helpers
+from copyt.models.change_set import ChangeSet
 from copyt.models.clipboard_record import ClipboardRecord
+from copyt.models.store_result import StoreResult
+
+# The optional fields of a `ClipboardRecord` that are stored in their own column
+RECORD_FIELDS = ("content", "mime", "description", "size", "preview")
+# The columns needed to create a `ClipboardRecord`, in order
+RECORD_COLUMNS = ", ".join(("timestamp",) + RECORD_FIELDS + ("codec", "blob"))
+# A field that loads the content of text items only, leaving it None for binary items
+TEXT_CONTENT_FIELD = "text_content"
+
+# How far below the retention limits the history goes after an eviction
+EVICTION_BATCH_RATIO = 0.05
+# The number of deleted items kept in the change log, or the number of
+# items in the history if it is larger; older cursors get the whole
+# history again
+CHANGE_LOG_TOMBSTONES = 1000
+# The values of `PRAGMA synchronous`, from the fastest to the most durable
+SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+# The directory of the external blob files, next to the database
+BLOB_DIR = "blobs"
+# The minimum age (in seconds) of the unreferenced blob files removed by `wipe`,
+# so that the files of items being stored by other processes are kept
+BLOB_GRACE_PERIOD = 60 * 60
 
 
-class DBManager:
+class DBManager:  # pylint: disable=R0902,R0904
     """
     This class handles all interactions with the database.
     """
 
-    def __init__(
+    def __init__(  # pylint: disable=R0913
         self,
         db_path: pathlib.Path,
         target: str = "clipboard",
         encoding: str = "utf-8",
+        codec: Optional[str] = None,
+        compression_level: int = 6,
+        compression_threshold: int = 0,
+        blob_threshold: Optional[int] = None,
+        synchronous: str = "NORMAL",
+        busy_timeout: float = 10.0,
     ):
+        """
+        :param pathlib.Path db_path: The path of the database.
+        :param str target: The name of the table of the records.
+        :param str encoding: The text encoding used to measure text items.
+        :param Optional[str] codec: The codec used to compress the content
+            of new items (see `_compression.COMPRESSORS`), or None.
+        :param int compression_level: The compression level, from 0 to 9.
+        :param int compression_threshold: The minimum size (in bytes) of the
+            items to compress.
+        :param Optional[int] blob_threshold: The minimum size (in bytes) of
+            the binary items stored in external files, or None.
+        :param str synchronous: When the database waits for the changes to
+            reach the disk (see `SYNCHRONOUS_LEVELS`).
+        :param float busy_timeout: How long (in seconds) to wait for other
+            processes to release the database.
+        """
+
+        if codec is not None and codec not in _compression.COMPRESSORS:
+            raise ValueError(f"Unknown compression codec: {codec}")
+
+        if synchronous.upper() not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Unknown synchronous level: {synchronous}")
+
         self._db_path = db_path
         self._target = target
         self.encoding = encoding
+        self.codec = codec
+        self.compression_level = compression_level
+        self.compression_threshold = compression_threshold
+        self.blob_threshold = blob_threshold
+        self._blob_dir = pathlib.Path(self._db_path.parent, BLOB_DIR)
+        # the blob files of the deleted items, removed on commit
+        self._released_blobs: set[str] = set()
+        # the blob files written since the last commit, removed on rollback
+        self._written_blobs: set[str] = set()
 
         os.makedirs(self._db_path.parent, exist_ok=True)
-        self._db = SqliteDict(
-            self._db_path, tablename=self._target, journal_mode="OFF", outer_stack=False
+        # SQLite retries locked operations until the timeout expires; the
+        # daemon uses the connection from the thread of each client, one
+        # at a time (see `_daemon.Server`)
+        self._db = sqlite3.connect(
+            self._db_path, timeout=busy_timeout, check_same_thread=False
+        )
+        # used by the full-text index to read compressed text
+        self._db.create_function(
+            "copyt_text", 2, _compression.stored_text, deterministic=True
         )
+        # Readers and writers do not block each other with a write-ahead log,
+        # and interrupted transactions are still rolled back. The mode is
+        # stored in the database, and switching to it needs an exclusive lock.
+        if self._db.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+            self._db.execute("PRAGMA journal_mode = WAL")
+
+        self._db.execute(f"PRAGMA synchronous = {synchronous.upper()}")
+        self._upgrade_schema()
+
+    @property
+    def _schema_upgrades(self) -> tuple:
+        """
+        The steps needed to bring the database to the latest schema.
+        The step at index `n` upgrades a database from version `n` to `n + 1`.
+        """
+
+        return (
+            self._create_table,
+            self._add_digest_column,
+            self._create_stats_table,
+            self._add_description_column,
+            self._add_preview_column,
+            self._create_fts_table,
+            self._add_codec_column,
+            self._add_blob_column,
+            self._add_timestamp_index,
+            self._create_changes_table,
+        )
+
+    def _create_table(self) -> None:
+        """
+        Schema version 1: one row per record, with the metadata in its own columns.
+        """
+
+        self._db.execute(f"""
+            CREATE TABLE "{self._target}" (
+                id INTEGER PRIMARY KEY,
+                timestamp REAL NOT NULL,
+                size INTEGER NOT NULL,
+                mime TEXT,
+                content BLOB NOT NULL
+            )
+            """)
+
+    def _add_digest_column(self) -> None:
+        """
+        Schema version 2: index records by the hash of their content.
+
+        Existing duplicates are dropped, keeping only the newest copy.
+        """
+
+        self._db.execute(f'ALTER TABLE "{self._target}" ADD COLUMN digest BLOB')
+
+        seen: dict[bytes, int] = {}
+        for item_id, content in self._db.execute(
+            f'SELECT id, content FROM "{self._target}" ORDER BY id'
+        ):
+            digest = self._digest_of(content)
+            if digest in seen:
+                self._db.execute(
+                    f'DELETE FROM "{self._target}" WHERE id = ?', (seen[digest],)
+                )
+
+            seen[digest] = item_id
+            self._db.execute(
+                f'UPDATE "{self._target}" SET digest = ? WHERE id = ?',
+                (digest, item_id),
+            )
+
+        self._db.execute(
+            f'CREATE UNIQUE INDEX "{self._target}_digest" ON "{self._target}" (digest)'
+        )
+
+    def _create_stats_table(self) -> None:
+        """
+        Schema version 3: keep the number and total size of the records
+        up to date with triggers so that retention checks are cheap.
+        """
+
+        self._db.execute(
+            f'CREATE TABLE "{self._target}_stats" (count INTEGER NOT NULL, bytes INTEGER NOT NULL)'
+        )
+        self._db.execute(
+            f'INSERT INTO "{self._target}_stats" (count, bytes)'
+            f' SELECT COUNT(*), TOTAL(size) FROM "{self._target}"'
+        )
+        self._db.execute(f"""
+            CREATE TRIGGER "{self._target}_stats_insert"
+            AFTER INSERT ON "{self._target}"
+            BEGIN
+                UPDATE "{self._target}_stats"
+                SET count = count + 1, bytes = bytes + NEW.size;
+            END
+            """)
+        self._db.execute(f"""
+            CREATE TRIGGER "{self._target}_stats_delete"
+            AFTER DELETE ON "{self._target}"
+            BEGIN
+                UPDATE "{self._target}_stats"
+                SET count = count - 1, bytes = bytes - OLD.size;
+            END
+            """)
+
+    def _add_description_column(self) -> None:
+        """
+        Schema version 4: store what libmagic says about the content.
+        """
+
+        self._db.execute(f'ALTER TABLE "{self._target}" ADD COLUMN description TEXT')
+
+    def _add_preview_column(self) -> None:
+        """
+        Schema version 5: store a short preview of text items
+        so that listing them does not need to read their content.
+        """
+
+        self._db.execute(f'ALTER TABLE "{self._target}" ADD COLUMN preview TEXT')
+        # the preview only depends on the start of the text
+        for item_id, head in self._db.execute(
+            f'SELECT id, substr(content, 1, 4000) FROM "{self._target}"'
+            " WHERE typeof(content) = 'text'"
+        ).fetchall():
+            self._db.execute(
+                f'UPDATE "{self._target}" SET preview = ? WHERE id = ?',
+                (helpers.make_preview(head), item_id),
+            )
+
+    def _create_fts_table(self) -> None:
+        """
+        Schema version 6: a full-text index of the text items.
+
+        The index is an external-content table, so the text is not stored
+        twice. Triggers keep it in sync when items are added, deleted or
+        moved to the top.
+        """
+
+        fts_table = f"{self._target}_fts"
+        self._db.execute(
+            f'CREATE VIRTUAL TABLE "{fts_table}" USING fts5(content,'
+            f" content='{self._target}', content_rowid='id', prefix='2 3')"
+        )
+        self._db.execute(
+            f'INSERT INTO "{fts_table}" (rowid, content)'
+            f' SELECT id, content FROM "{self._target}"'
+            " WHERE typeof(content) = 'text'"
+        )
+        self._db.execute(f"""
+            CREATE TRIGGER "{fts_table}_insert"
+            AFTER INSERT ON "{self._target}"
+            WHEN typeof(NEW.content) = 'text'
+            BEGIN
+                INSERT INTO "{fts_table}" (rowid, content)
+                VALUES (NEW.id, NEW.content);
+            END
+            """)
+        self._db.execute(f"""
+            CREATE TRIGGER "{fts_table}_delete"
+            AFTER DELETE ON "{self._target}"
+            WHEN typeof(OLD.content) = 'text'
+            BEGIN
+                INSERT INTO "{fts_table}" ("{fts_table}", rowid, content)
+                VALUES ('delete', OLD.id, OLD.content);
+            END
+            """)
+        self._db.execute(f"""
+            CREATE TRIGGER "{fts_table}_move"
+            AFTER UPDATE OF id ON "{self._target}"
+            WHEN typeof(OLD.content) = 'text'
+            BEGIN
+                INSERT INTO "{fts_table}" ("{fts_table}", rowid, content)
+                VALUES ('delete', OLD.id, OLD.content);
+                INSERT INTO "{fts_table}" (rowid, content)
+                VALUES (NEW.id, NEW.content);
+            END
+            """)
+
+    def _add_codec_column(self) -> None:
+        """
+        Schema version 7: store the codec of compressed content, and index
+        compressed text by reading it through the `copyt_text` function.
+        """
+
+        fts_table = f"{self._target}_fts"
+        self._db.execute(f'ALTER TABLE "{self._target}" ADD COLUMN codec TEXT')
+        for trigger in ("insert", "delete", "move"):
+            self._db.execute(f'DROP TRIGGER "{fts_table}_{trigger}"')
+
+        is_text = "typeof({0}.content) = 'text' OR {0}.codec LIKE '%{1}'"
+        self._db.execute(f"""
+            CREATE TRIGGER "{fts_table}_insert"
+            AFTER INSERT ON "{self._target}"
+            WHEN {is_text.format("NEW", _compression.TEXT_SUFFIX)}
+            BEGIN
+                INSERT INTO "{fts_table}" (rowid, content)
+                VALUES (NEW.id, copyt_text(NEW.content, NEW.codec));
+            END
+            """)
+        self._db.execute(f"""
+            CREATE TRIGGER "{fts_table}_delete"
+            AFTER DELETE ON "{self._target}"
+            WHEN {is_text.format("OLD", _compression.TEXT_SUFFIX)}
+            BEGIN
+                INSERT INTO "{fts_table}" ("{fts_table}", rowid, content)
+                VALUES ('delete', OLD.id, copyt_text(OLD.content, OLD.codec));
+            END
+            """)
+        self._db.execute(f"""
+            CREATE TRIGGER "{fts_table}_move"
+            AFTER UPDATE OF id ON "{self._target}"
+            WHEN {is_text.format("OLD", _compression.TEXT_SUFFIX)}
+            BEGIN
+                INSERT INTO "{fts_table}" ("{fts_table}", rowid, content)
+                VALUES ('delete', OLD.id, copyt_text(OLD.content, OLD.codec));
+                INSERT INTO "{fts_table}" (rowid, content)
+                VALUES (NEW.id, copyt_text(NEW.content, NEW.codec));
+            END
+            """)
+
+    def _add_blob_column(self) -> None:
+        """
+        Schema version 8: store large binary items in external files,
+        named after the digest of the item. The content of their rows
+        is left empty.
+        """
+
+        self._db.execute(f'ALTER TABLE "{self._target}" ADD COLUMN blob TEXT')
+
+    def _add_timestamp_index(self) -> None:
+        """
+        Schema version 9: index the records by timestamp, so that time
+        ranges are read and pruned without scanning the whole table.
+        """
+
+        self._db.execute(
+            f'CREATE INDEX "{self._target}_timestamp" ON "{self._target}" (timestamp)'
+        )
+
+    def _create_changes_table(self) -> None:
+        """
+        Schema version 10: a change log with the last change of each item,
+        numbered in sequence, so that readers can ask for the changes
+        since their last read. Triggers keep it up to date.
+
+        Deleted items are only remembered for a while: the sequence
+        number of the last forgotten change is kept in the stats table,
+        and readers that are behind it read the whole history again.
+        """
+
+        changes_table = f"{self._target}_changes"
+        self._db.execute(f"""
+            CREATE TABLE "{changes_table}" (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                item_id INTEGER NOT NULL UNIQUE,
+                deleted INTEGER NOT NULL
+            )
+            """)
+        self._db.execute(
+            f'CREATE INDEX "{changes_table}_deleted" ON "{changes_table}" (seq)'
+            " WHERE deleted"
+        )
+        self._db.execute(
+            f'ALTER TABLE "{self._target}_stats"'
+            " ADD COLUMN changes_horizon INTEGER NOT NULL DEFAULT 0"
+        )
+        self._db.execute(
+            f'INSERT INTO "{changes_table}" (item_id, deleted)'
+            f' SELECT id, 0 FROM "{self._target}" ORDER BY id'
+        )
+        # replacing the row of an item gives it the next sequence number
+        self._db.execute(f"""
+            CREATE TRIGGER "{changes_table}_insert"
+            AFTER INSERT ON "{self._target}"
+            BEGIN
+                INSERT OR REPLACE INTO "{changes_table}" (item_id, deleted)
+                VALUES (NEW.id, 0);
+            END
+            """)
+        self._db.execute(f"""
+            CREATE TRIGGER "{changes_table}_delete"
+            AFTER DELETE ON "{self._target}"
+            BEGIN
+                INSERT OR REPLACE INTO "{changes_table}" (item_id, deleted)
+                VALUES (OLD.id, 1);
+            END
+            """)
+        self._db.execute(f"""
+            CREATE TRIGGER "{changes_table}_move"
+            AFTER UPDATE OF id ON "{self._target}"
+            BEGIN
+                INSERT OR REPLACE INTO "{changes_table}" (item_id, deleted)
+                VALUES (OLD.id, 1);
+                INSERT OR REPLACE INTO "{changes_table}" (item_id, deleted)
+                VALUES (NEW.id, 0);
+            END
+            """)
+        self._db.execute(f"""
+            CREATE TRIGGER "{changes_table}_update"
+            AFTER UPDATE OF mime, description ON "{self._target}"
+            BEGIN
+                INSERT OR REPLACE INTO "{changes_table}" (item_id, deleted)
+                VALUES (NEW.id, 0);
+            END
+            """)
+
+    def _upgrade_schema(self) -> None:
+        """
+        Create the tables if needed and upgrade databases created by
+        older versions of copyt, including the old SqliteDict-based ones.
+        """
+
+        upgrades = self._schema_upgrades
+        if self._db.execute("PRAGMA user_version").fetchone()[0] == len(upgrades):
+            return
+
+        # The whole upgrade runs in one transaction, so that an interrupted
+        # upgrade leaves the database untouched. The version is read again
+        # once the database is locked, in case another process upgraded it.
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            version: int = self._db.execute("PRAGMA user_version").fetchone()[0]
+            legacy_table = f"{self._target}_sqlitedict"
+            has_legacy_table = version == 0 and [
+                column[1]
+                for column in self._db.execute(f'PRAGMA table_info("{self._target}")')
+            ] == ["key", "value"]
+
+            if has_legacy_table:
+                self._db.execute(
+                    f'ALTER TABLE "{self._target}" RENAME TO "{legacy_table}"'
+                )
+
+            with _trace.phase("upgrade schema"):
+                for upgrade in upgrades[version:]:
+                    upgrade()
+
+            if has_legacy_table:
+                with _trace.phase("unpickle"):
+                    self._migrate_from_sqlitedict(legacy_table)
+
+            self._db.execute(f"PRAGMA user_version = {len(upgrades)}")
+            self._db.commit()
+
+        except BaseException:
+            self._db.rollback()
+            raise
+
+    def _migrate_from_sqlitedict(self, legacy_table: str) -> None:
+        """
+        Move the pickled records of a SqliteDict table into the current table.
+
+        :param str legacy_table: The name of the SqliteDict table.
+        """
+
+        import pickle  # pylint: disable=C0415  # only needed once
+
+        for key, value in self._db.execute(
+            f'SELECT key, value FROM "{legacy_table}" ORDER BY CAST(key AS INTEGER)'
+        ):
+            record: ClipboardRecord = pickle.loads(bytes(value))
+            digest = self._digest_of(record.content)
+            # keep only the newest copy of duplicated records
+            self._db.execute(
+                f'DELETE FROM "{self._target}" WHERE digest = ?', (digest,)
+            )
+            self._insert(int(key), record.timestamp, record.content, digest)
+
+        self._db.execute(f'DROP TABLE "{legacy_table}"')
+
+    def _insert(
+        self, item_id: int, timestamp: datetime, data: str | bytes, digest: bytes
+    ) -> None:
+        """
+        Insert a row into the database.
+
+        :param int item_id: The ID of the item.
+        :param datetime timestamp: When the item was stored.
+        :param str | bytes data: The data to add.
+        :param bytes digest: The digest of the data.
+        """
+
+        size = self._size_of(data)
+        content: str | bytes = data
+        codec = None
+        if self.codec is not None and size >= self.compression_threshold:
+            compressed = _compression.compress(data, self.codec, self.compression_level)
+            if compressed is not None:
+                content, codec = compressed
+
+        blob = None
+        if (
+            self.blob_threshold is not None
+            and not isinstance(data, str)  # text stays in the full-text index
+            and len(content) >= self.blob_threshold
+        ):
+            blob = digest.hex()
+            self._write_blob(blob, content)
+            content = b""
+
+        self._db.execute(
+            f'INSERT INTO "{self._target}"'
+            " (id, timestamp, size, content, digest, preview, codec, blob)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                item_id,
+                timestamp.timestamp(),
+                size,
+                content,
+                digest,
+                helpers.make_preview(data) if isinstance(data, str) else None,
+                codec,
+                blob,
+            ),
+        )
+
+    def _get_blob_path(self, blob: str) -> pathlib.Path:
+        """
+        Get the path of a blob file.
+
+        :param str blob: The name of the blob.
+        :return: The path of the file.
+        """
+
+        return pathlib.Path(self._blob_dir, blob[:2], blob)
+
+    def _write_blob(self, blob: str, content: bytes) -> None:
+        """
+        Write a blob file. The file is replaced atomically, so that
+        readers never see a partial file.
+
+        :param str blob: The name of the blob.
+        :param bytes content: The content of the file.
+        """
+
+        path = self._get_blob_path(blob)
+        os.makedirs(path.parent, exist_ok=True)
+        temp_path = path.with_name(f"{blob}.{os.getpid()}.tmp")
+        temp_path.write_bytes(content)
+        os.replace(temp_path, path)
+        self._written_blobs.add(blob)
+
+    def _release_blobs(self, condition: str, parameters: tuple = ()) -> None:
+        """
+        Remember the blob files of the rows about to be deleted,
+        to remove them once the deletion is committed.
+
+        :param str condition: The SQL condition of the rows.
+        :param tuple parameters: The parameters of the condition.
+        """
+
+        self._released_blobs.update(
+            row[0]
+            for row in self._db.execute(
+                f'SELECT blob FROM "{self._target}"'
+                f" WHERE blob IS NOT NULL AND ({condition})",
+                parameters,
+            )
+        )
+
+    def _to_record(self, row: tuple) -> ClipboardRecord:
+        """
+        Create a record from a row with the columns in `RECORD_COLUMNS`.
+
+        :param tuple row: The row to convert.
+        :return: The clipboard record.
+        """
+
+        content = row[1] if row[7] is None else self._get_blob_path(row[7]).read_bytes()
+        return ClipboardRecord(
+            timestamp=datetime.fromtimestamp(row[0]),
+            content=(
+                content if row[6] is None else _compression.decompress(content, row[6])
+            ),
+            mime=row[2],
+            description=row[3],
+            size=row[4],
+            preview=row[5],
+        )
+
+    def _size_of(self, data: str | bytes) -> int:
+        """
+        Get the size of the data in bytes.
+
+        :param str | bytes data: The data to measure.
+        :return: The size of the data when stored.
+        """
+
+        return len(data.encode(self.encoding) if isinstance(data, str) else data)
+
+    def _digest_of(self, data: str | bytes) -> bytes:
+        """
+        Get the digest used to find duplicate records.
+
+        :param str | bytes data: The data to hash.
+        :return: The SHA-256 digest of the data.
+        """
+
+        return hashlib.sha256(
+            data.encode(self.encoding) if isinstance(data, str) else data
+        ).digest()
 
     @property
     def max_index(self) -> int:
@@ -59,48 +632,339 @@ class DBManager:
         Get the maximum index in the database.
         """
 
-        if len(tuple(self._db.keys())) > 0:  # type: ignore (we know keys are ints)
-            return max(map(int, self._db.keys()))  # type: ignore
+        return self._db.execute(
+            f'SELECT COALESCE(MAX(id), 0) FROM "{self._target}"'
+        ).fetchone()[0]
+
+    @property
+    def stats(self) -> tuple[int, int]:
+        """
+        Get the number of records and their total size in bytes.
+        """
+
+        return self._db.execute(
+            f'SELECT count, bytes FROM "{self._target}_stats"'
+        ).fetchone()
+
+    @property
+    def change_cursor(self) -> int:
+        """
+        The sequence number of the last change, see `changes_since`.
+        """
+
+        row = self._db.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = ?",
+            (f"{self._target}_changes",),
+        ).fetchone()
+        return 0 if row is None else row[0]
+
+    @property
+    def data_version(self) -> int:
+        """
+        A number that changes when another connection commits changes
+        to the database.
+        """
 
-        return 0
+        return self._db.execute("PRAGMA data_version").fetchone()[0]
 
     def commit(self) -> None:
         """
-        Commit changes to the database.
+        Commit changes to the database, and remove the blob files
+        of the deleted items.
         """
 
         self._db.commit()
+        self._written_blobs.clear()
+        for blob in self._released_blobs:
+            # the same item may have been stored again
+            if (
+                self._db.execute(
+                    f'SELECT 1 FROM "{self._target}" WHERE digest = ?',
+                    (bytes.fromhex(blob),),
+                ).fetchone()
+                is None
+            ):
+                self._get_blob_path(blob).unlink(missing_ok=True)
+
+        self._released_blobs.clear()
+
+    def rollback(self) -> None:
+        """
+        Roll back the changes to the database, and remove the blob files
+        of the items added since the last commit.
+        """
+
+        # removed while the database is still locked for writing, so that
+        # no other process can store the same item meanwhile; the blobs of
+        # the items deleted then added again are restored with their rows
+        for blob in self._written_blobs - self._released_blobs:
+            self._get_blob_path(blob).unlink(missing_ok=True)
+
+        self._db.rollback()
+        self._written_blobs.clear()
+        self._released_blobs.clear()
 
     def close(self) -> None:
         """
-        Close the database.
+        Close the database. Uncommitted changes are rolled back.
         """
 
+        if self._written_blobs:
+            self.rollback()
+
         self._db.close()
 
-    def add(self, data: str | bytes) -> int:
+    def _begin_write(self) -> None:
+        """
+        Start a write transaction, unless one is already started. The
+        database stays locked for writing until the transaction ends, so
+        what is read in it (e.g. the maximum index) cannot be changed by
+        other processes in the meantime.
+        """
+
+        if not self._db.in_transaction:
+            self._db.execute("BEGIN IMMEDIATE")
+
+    def add(self, data: str | bytes, digest: Optional[bytes] = None) -> StoreResult:
+        """
+        Add a new item to the database. If the same data is already
+        in the database, it is moved to the top instead. The ID of the
+        item is allocated in a write transaction (see `_begin_write`).
+
+        :param bytes data: The data to add.
+        :param Optional[bytes] digest: The digest of the data, if it is
+            already known.
+        :return: The ID of the item and whether it was a duplicate.
+        """
+
+        self._begin_write()
+        return self._add(data, self.max_index, digest)
+
+    def add_many(self, items: Iterable[str | bytes]) -> list[StoreResult]:
+        """
+        Add new items to the database, like `add`. The IDs of the items
+        are allocated from a single read of the maximum index.
+
+        :param Iterable[str | bytes] items: The data to add, oldest first.
+        :return: The IDs of the items and whether they were duplicates.
+        """
+
+        self._begin_write()
+        max_index = self.max_index
+        results = []
+        for data in items:
+            result = self._add(data, max_index)
+            max_index = result.item_id
+            results.append(result)
+
+        return results
+
+    def _add(
+        self, data: str | bytes, max_index: int, digest: Optional[bytes] = None
+    ) -> StoreResult:
         """
-        Add a new item to the database.
+        Add a new item to the database, see `add`.
 
         :param bytes data: The data to add.
-        :return: The ID of the item.
+        :param int max_index: The maximum index in the database.
+        :param Optional[bytes] digest: The digest of the data, if it is
+            already known.
+        :return: The ID of the item and whether it was a duplicate.
+        """
+
+        digest = digest or self._digest_of(data)
+        row = self._db.execute(
+            f'SELECT id FROM "{self._target}" WHERE digest = ?', (digest,)
+        ).fetchone()
+        if row is not None:
+            new_idx = row[0] if row[0] == max_index else max_index + 1
+            self._db.execute(
+                f'UPDATE "{self._target}" SET id = ?, timestamp = ? WHERE id = ?',
+                (new_idx, datetime.now().timestamp(), row[0]),
+            )
+
+            return StoreResult(item_id=new_idx, duplicate=True)
+
+        new_idx = max_index + 1
+        self._insert(new_idx, datetime.now(), data, digest)
+
+        return StoreResult(item_id=new_idx, duplicate=False)
+
+    def evict(self, max_items: int, max_bytes: int) -> int:
+        """
+        Delete the oldest records if the database holds more than `max_items`
+        records or more than `max_bytes` bytes. The newest record is never
+        deleted.
+
+        Records are evicted in batches: once a limit is exceeded, enough
+        records are deleted to go `EVICTION_BATCH_RATIO` below it, so that
+        the next stores do not have to evict anything.
+
+        :param int max_items: The maximum number of records to keep.
+        :param int max_bytes: The maximum total size of the records.
+        :return: The number of deleted records.
         """
 
-        # PERF: Deduplicate items
-        new_idx = self.max_index + 1
-        self._db[new_idx] = ClipboardRecord(timestamp=datetime.now(), content=data)
+        self._begin_write()
+        count, total_bytes = self.stats
+        if count <= max_items and total_bytes <= max_bytes:
+            return 0
 
-        return new_idx
+        target_items = max(max_items - int(max_items * EVICTION_BATCH_RATIO), 0)
+        target_bytes = max(max_bytes - int(max_bytes * EVICTION_BATCH_RATIO), 0)
+        last_evicted = None
+        for item_id, size in self._db.execute(
+            f'SELECT id, size FROM "{self._target}" ORDER BY id'
+        ):
+            if count <= target_items and total_bytes <= target_bytes:
+                break
 
-    def query(self, item_id: int) -> ClipboardRecord:
+            if count == 1:  # keep the newest record
+                break
+
+            last_evicted = item_id
+            count -= 1
+            total_bytes -= size
+
+        if last_evicted is None:
+            return 0
+
+        self._release_blobs("id <= ?", (last_evicted,))
+        evicted = self._db.execute(
+            f'DELETE FROM "{self._target}" WHERE id <= ?', (last_evicted,)
+        ).rowcount
+        self._trim_changes()
+        return evicted
+
+    def prune(self, before: datetime) -> int:
+        """
+        Delete the records stored before a point in time.
+
+        :param datetime before: The time before which records are deleted.
+        :return: The number of deleted records.
+        """
+
+        self._begin_write()
+        self._release_blobs("timestamp < ?", (before.timestamp(),))
+        pruned = self._db.execute(
+            f'DELETE FROM "{self._target}" WHERE timestamp < ?', (before.timestamp(),)
+        ).rowcount
+        self._trim_changes()
+        return pruned
+
+    def _trim_changes(self) -> None:
+        """
+        Forget the oldest deleted items of the change log once it holds
+        more than `CHANGE_LOG_TOMBSTONES` of them, or more than there are
+        items in the history, so that evicting a batch of items does not
+        make every reader read the whole history again.
+        """
+
+        changes_table = f"{self._target}_changes"
+        row = self._db.execute(
+            f'SELECT seq FROM "{changes_table}" WHERE deleted'
+            " ORDER BY seq DESC LIMIT 1 OFFSET ?",
+            (max(CHANGE_LOG_TOMBSTONES, self.stats[0]),),
+        ).fetchone()
+        if row is not None:
+            self._db.execute(
+                f'DELETE FROM "{changes_table}" WHERE deleted AND seq <= ?', row
+            )
+            self._db.execute(
+                f'UPDATE "{self._target}_stats" SET changes_horizon = ?', row
+            )
+
+    def set_metadata(self, item_id: int, mime: str, description: str) -> None:
+        """
+        Set the MIME type and description of an item.
+
+        :param int item_id: The ID of the item.
+        :param str mime: The MIME type of the content.
+        :param str description: The description of the content.
+        """
+
+        self._db.execute(
+            f'UPDATE "{self._target}" SET mime = ?, description = ? WHERE id = ?',
+            (mime, description, item_id),
+        )
+
+    def get_ids_without_metadata(self, min_id: int = 0) -> list[int]:
+        """
+        Get the IDs of the items without a MIME type.
+
+        :param int min_id: The smallest ID to return.
+        :return: A list of item IDs.
+        """
+
+        return [
+            row[0]
+            for row in self._db.execute(
+                f'SELECT id FROM "{self._target}"'
+                " WHERE mime IS NULL AND id >= ? ORDER BY id",
+                (min_id,),
+            )
+        ]
+
+    def query(
+        self, item_id: int, fields: Optional[Iterable[str]] = None
+    ) -> ClipboardRecord:
         """
         Search the database for an item using its ID.
 
         :param int id: The ID of the item.
+        :param Optional[Iterable[str]] fields: The fields of the record to load
+            (see `iter_records`).
         :return: The contents of the item.
         """
 
-        return self._db[item_id]  # type: ignore
+        row = self._db.execute(
+            f'SELECT {self._get_columns(fields)} FROM "{self._target}" WHERE id = ?',
+            (item_id,),
+        ).fetchone()
+        if row is None:
+            raise KeyError(item_id)
+
+        return self._to_record(row)
+
+    def open_content(self, item_id: int) -> BinaryIO:
+        """
+        Open the content of an item, to read it in chunks. It is read from
+        its blob file, or from the database with incremental blob I/O, and
+        decompressed as it is read.
+
+        :param int item_id: The ID of the item.
+        :return: A binary stream of the content, encoded in UTF-8 for text.
+        """
+
+        row = self._db.execute(
+            f'SELECT codec, blob FROM "{self._target}" WHERE id = ?', (item_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(item_id)
+
+        codec, blob = row
+        content: BinaryIO
+        if blob is None:
+            # the ID of the item is the rowid of its row
+            content = self._db.blobopen(  # a file-like sqlite3.Blob
+                self._target, "content", item_id, readonly=True
+            )
+
+        else:
+            try:
+                # pylint: disable-next=R1732  # closed by the caller
+                content = self._get_blob_path(blob).open("rb")
+
+            except FileNotFoundError as e:  # the item was just deleted
+                raise KeyError(item_id) from e
+
+        if codec is None:
+            return content
+
+        return io.BufferedReader(
+            _compression.DecompressingReader(content, codec),
+            _compression.CHUNK_SIZE,
+        )
 
     def delete(self, item_id: int) -> None:
         """
@@ -108,20 +972,227 @@ class DBManager:
         :param int id: The ID of the item.
         """
 
-        del self._db[item_id]
+        self._begin_write()
+        self._release_blobs("id = ?", (item_id,))
+        if (
+            self._db.execute(
+                f'DELETE FROM "{self._target}" WHERE id = ?', (item_id,)
+            ).rowcount
+            == 0
+        ):
+            raise KeyError(item_id)
+
+        self._trim_changes()
+
+    @staticmethod
+    def _get_columns(fields: Optional[Iterable[str]]) -> str:
+        """
+        Get the columns to select to load some fields of the records.
+
+        :param Optional[Iterable[str]] fields: The fields to load, or None for all.
+        :return: The columns, with NULL in place of the fields not to load.
+        """
+
+        if fields is None:
+            return RECORD_COLUMNS
+
+        fields = set(fields)
+        unknown_fields = fields.difference(RECORD_FIELDS + (TEXT_CONTENT_FIELD,))
+        if unknown_fields:
+            raise ValueError(f"Unknown record fields: {', '.join(unknown_fields)}")
+
+        columns = ["timestamp"]
+        for field in RECORD_FIELDS:
+            if field in fields:
+                columns.append(field)
 
-    def get_all(self) -> list[tuple[str, ClipboardRecord]]:
+            elif field == "content" and TEXT_CONTENT_FIELD in fields:
+                columns.append("copyt_text(content, codec)")
+
+            else:
+                columns.append("NULL")
+
+        # the codec and blob are only needed to read the content
+        columns.extend(("codec", "blob") if "content" in fields else ("NULL", "NULL"))
+        return ", ".join(columns)
+
+    @staticmethod
+    def _to_fts_query(query: str) -> str:
+        """
+        Convert a search query to an FTS5 query. Each word is matched
+        literally, and words ending with `*` match as prefixes.
+
+        :param str query: The search query.
+        :return: The FTS5 query.
+        """
+
+        terms = []
+        for word in query.split():
+            is_prefix = word.endswith("*") and len(word) > 1
+            word = word.rstrip("*") if is_prefix else word
+            escaped = word.replace('"', '""')
+            terms.append(f'"{escaped}"' + ("*" if is_prefix else ""))
+
+        return " ".join(terms)
+
+    def iter_records(  # pylint: disable=R0913
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        reverse: bool = False,
+        fields: Optional[Iterable[str]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        after_id: Optional[int] = None,
+    ) -> Iterator[tuple[int, ClipboardRecord]]:
+        """
+        Iterate over the items in the database, one row at a time.
+
+        :param Optional[int] limit: The maximum number of items to get.
+        :param int offset: The number of items to skip.
+        :param bool reverse: Start from the newest item instead of the oldest.
+        :param Optional[Iterable[str]] fields: The fields of the records to load
+            (see `RECORD_FIELDS` and `TEXT_CONTENT_FIELD`). Fields that are not
+            loaded are set to None.
+            All fields are loaded by default.
+        :param Optional[datetime] since: Only get the items stored at or after this time.
+        :param Optional[datetime] until: Only get the items stored before this time.
+        :param Optional[int] after_id: Only get the items after this ID, in the
+            order of the iteration, to read the history in pages by key.
+        :return: An iterator of the IDs and records of the items.
+        """
+
+        # time ranges are read from the timestamp index, and only the
+        # matching rows are sorted by ID
+        table = f'"{self._target}"'
+        conditions = []
+        parameters: list = []
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            parameters.append(since.timestamp())
+
+        if until is not None:
+            conditions.append("timestamp < ?")
+            parameters.append(until.timestamp())
+
+        if conditions:
+            table += f' INDEXED BY "{self._target}_timestamp"'
+
+        if after_id is not None:
+            conditions.append("id < ?" if reverse else "id > ?")
+            parameters.append(after_id)
+
+        for row in self._db.execute(
+            f"SELECT id, {self._get_columns(fields)} FROM {table}"
+            f" WHERE {' AND '.join(conditions) or 1}"
+            f" ORDER BY id {'DESC' if reverse else 'ASC'} LIMIT ? OFFSET ?",
+            (*parameters, -1 if limit is None else limit, offset),
+        ):
+            yield row[0], self._to_record(row[1:])
+
+    def search(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> Iterator[tuple[int, ClipboardRecord]]:
+        """
+        Search the text items using the full-text index, best matches first.
+
+        :param str query: The words to search for.
+        :param Optional[int] limit: The maximum number of items to get.
+        :param Optional[Iterable[str]] fields: The fields of the records to load
+            (see `iter_records`).
+        :return: An iterator of the IDs and records of the matching items.
+        """
+
+        fts_query = self._to_fts_query(query)
+        if not fts_query:
+            return
+
+        for row in self._db.execute(
+            f'SELECT id, {self._get_columns(fields)} FROM "{self._target}"'
+            f' JOIN (SELECT rowid AS match_id, rank FROM "{self._target}_fts"'
+            f' WHERE "{self._target}_fts" MATCH ? ORDER BY rank LIMIT ?)'
+            " ON id = match_id ORDER BY rank",
+            (fts_query, -1 if limit is None else limit),
+        ):
+            yield row[0], self._to_record(row[1:])
+
+    def changes_since(
+        self, cursor: int, fields: Optional[Iterable[str]] = None
+    ) -> ChangeSet:
+        """
+        Get the items added, updated or deleted since a cursor, in the
+        order of the changes. Only the changes since the cursor are read,
+        unless the change log does not go back that far.
+
+        :param int cursor: The cursor returned by the previous call, or 0.
+        :param Optional[Iterable[str]] fields: The fields of the records to load
+            (see `iter_records`).
+        :return: The changes, and the cursor of the next call.
+        """
+
+        # the cursor is read first, so that a change committed meanwhile
+        # is read again by the next call rather than missed
+        latest = self.change_cursor
+        horizon = self._db.execute(
+            f'SELECT changes_horizon FROM "{self._target}_stats"'
+        ).fetchone()[0]
+        if cursor < horizon or cursor > latest:
+            return ChangeSet(
+                cursor=latest,
+                reset=True,
+                records=list(self.iter_records(fields=fields)),
+                deleted=[],
+            )
+
+        records = []
+        deleted = []
+        for seq, item_id, is_deleted, *row in self._db.execute(
+            f"SELECT seq, item_id, deleted, {self._get_columns(fields)}"
+            f' FROM "{self._target}_changes"'
+            f' LEFT JOIN "{self._target}" ON id = item_id'
+            " WHERE seq > ? ORDER BY seq",
+            (cursor,),
+        ):
+            cursor = seq
+            if is_deleted:
+                deleted.append(item_id)
+
+            else:
+                records.append((item_id, self._to_record(row)))
+
+        return ChangeSet(cursor=cursor, reset=False, records=records, deleted=deleted)
+
+    def get_all(self) -> list[tuple[int, ClipboardRecord]]:
         """
         Get all items in the database.
 
         :return: A list of all items.
         """
 
-        return list(self._db.items())  # type: ignore
+        return list(self.iter_records())
 
     def wipe(self) -> None:
         """
-        Wipe the database contents.
+        Wipe the database contents. The blob files that are not used
+        by any item, e.g. left behind by a crash, are removed too.
         """
 
-        self._db.clear()
+        self._begin_write()
+        self._release_blobs("1")
+        self._db.execute(f'DELETE FROM "{self._target}"')
+        # every reader has to read the (empty) history again
+        self._db.execute(f'DELETE FROM "{self._target}_changes"')
+        self._db.execute(
+            f'UPDATE "{self._target}_stats" SET changes_horizon = ?',
+            (self.change_cursor,),
+        )
+        if self._blob_dir.is_dir():
+            expired = time.time() - BLOB_GRACE_PERIOD
+            self._released_blobs.update(
+                path.name
+                for path in self._blob_dir.glob("??/*")
+                if not path.name.endswith(".tmp") and path.stat().st_mtime < expired
+            )
@@ -0,0 +1,442 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import base64
+import errno
+import json
+import mmap
+import os
+import shutil
+import sys
+from typing import BinaryIO, Iterator, Optional
+
+from copyt import _compression, _daemon, _db_manager, _trace, api, helpers
+from copyt.models.clipboard_record import ClipboardRecord
+from copyt.models.global_options import GlobalOptions
+from copyt.models.store_result import StoreResult
+
+# The commands that can run without loading the full CLI
+COMMANDS = ("store", "get")
+# The global options understood by `parse_args`, and the fields they set
+OPTIONS = {
+    "--max-items": ("max_items", int),
+    "-m": ("max_items", int),
+    "--max-item-size": ("max_item_size_in_bytes", int),
+    "-s": ("max_item_size_in_bytes", int),
+    "--max-total-size": ("max_total_size_in_bytes", int),
+    "-t": ("max_total_size_in_bytes", int),
+    "--cache-dir": ("cache_dir", str),
+    "-c": ("cache_dir", str),
+    "--encoding": ("text_encoding", str),
+    "-e": ("text_encoding", str),
+    "--compression": ("compression", str),
+    "--compression-level": ("compression_level", int),
+    "--compression-threshold": ("compression_threshold_in_bytes", int),
+    "--blob-threshold": ("blob_threshold_in_bytes", int),
+    "--synchronous": ("synchronous", str),
+    "--busy-timeout": ("busy_timeout_in_seconds", float),
+}
+FLAGS = {
+    "--json": "json",
+    "-j": "json",
+    "--verbose": "verbose",
+    "-v": "verbose",
+    "--profile": "profile",
+}
+# The size of the chunks of binary content written by `get`
+COPY_CHUNK_SIZE = 1024 * 64
+# The size of the chunks encoded in base64, a multiple of 3 bytes
+# so that the encoded chunks can be joined
+BASE64_CHUNK_SIZE = 3 * 1024 * 16
+
+
+def show_error(global_options: GlobalOptions, message: str) -> None:
+    """
+    Show an error message, in JSON if JSON output is enabled.
+
+    :param GlobalOptions global_options: The options of the program.
+    :param str message: The error message.
+    """
+
+    if global_options.json:
+        print(json.dumps({"error": message}))
+
+    else:
+        print(message, file=sys.stderr)
+
+
+def open_api(global_options: GlobalOptions) -> api.API | _daemon.Client:
+    """
+    Connect to the daemon if it is running, or open the history directly.
+
+    :param GlobalOptions global_options: The options of the program.
+    :return: An API instance or a client for the daemon.
+    """
+
+    return _daemon.connect(global_options) or api.API(global_options)
+
+
+def show_store_result(global_options: GlobalOptions, result: StoreResult) -> None:
+    """
+    Show the ID of a stored item if JSON output or verbose mode is enabled.
+
+    :param GlobalOptions global_options: The options of the program.
+    :param StoreResult result: The result of the store operation.
+    """
+
+    if global_options.json:
+        print(json.dumps({"id": result.item_id, "duplicate": result.duplicate}))
+
+    elif global_options.verbose:
+        print(
+            f"{'Moved' if result.duplicate else 'Stored'} item {result.item_id}",
+            file=sys.stderr,
+        )
+
+
+def store(global_options: GlobalOptions, data: Optional[str] = None) -> int:
+    """
+    Store the argument, or the data read from stdin.
+
+    :param GlobalOptions global_options: The options of the program.
+    :param Optional[str] data: The data to store, or None to read stdin.
+    :return: The exit code of the command.
+    """
+
+    # data from argument
+    if data is not None:
+        copyt_api = open_api(global_options)
+        show_store_result(global_options, copyt_api.store(data))
+        copyt_api.close(commit=True)
+        return 0
+
+    # data from stdin
+    if not sys.stdin.buffer.isatty():
+        with _trace.phase("read input"):
+            try:
+                stdin_data, digest = helpers.read_stream(
+                    sys.stdin.buffer, global_options.max_item_size_in_bytes
+                )
+
+            except ValueError as e:  # the input is too large
+                show_error(global_options, str(e))
+                return 10
+
+        if len(stdin_data) > 0:
+            data = helpers.decode_text(stdin_data, global_options.text_encoding)
+            del stdin_data  # do not keep both the data and the text
+            copyt_api = open_api(global_options)
+            show_store_result(
+                global_options,
+                # text is hashed once encoded again, which may not give the
+                # same bytes as the input (e.g. with a byte order mark)
+                copyt_api.store(data, None if isinstance(data, str) else digest),
+            )
+            copyt_api.close(commit=True)
+            return 0
+
+    show_error(global_options, "Nothing to store")
+    return 10
+
+
+def store_file(global_options: GlobalOptions, path: str) -> int:
+    """
+    Store the content of a file. The file is mapped in memory instead
+    of being read, so binary files are stored without being copied.
+
+    :param GlobalOptions global_options: The options of the program.
+    :param str path: The path of the file.
+    :return: The exit code of the command.
+    """
+
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:  # empty files cannot be mapped
+            show_error(global_options, "Nothing to store")
+            return 10
+
+        if size > global_options.max_item_size_in_bytes:
+            show_error(
+                global_options,
+                "The size of the data is larger than the maximum allowed size",
+            )
+            return 10
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            copyt_api = open_api(global_options)
+            try:
+                show_store_result(
+                    global_options,
+                    copyt_api.store(
+                        helpers.decode_text(mapped, global_options.text_encoding)
+                    ),
+                )
+                copyt_api.commit()
+
+            finally:
+                copyt_api.close()
+
+    return 0
+
+
+def get(global_options: GlobalOptions, item_id: Optional[str] = None) -> int:
+    """
+    Write the content of an item to stdout.
+
+    :param GlobalOptions global_options: The options of the program.
+    :param Optional[str] item_id: The ID of the item, or None to read it from stdin.
+    :return: The exit code of the command.
+    """
+
+    user_input = helpers.get_input_from_arg_or_stdin(item_id)
+    if user_input is None:
+        show_error(global_options, "No item ID specified")
+        return 10
+
+    try:
+        item_id_int = int(
+            user_input.decode(global_options.text_encoding)
+            if isinstance(user_input, bytes)
+            else user_input
+        )
+
+    except ValueError:
+        show_error(global_options, "Invalid item ID")
+        return 10
+
+    copyt_api = open_api(global_options)
+    try:
+        # only the content of text items is loaded, binary content is streamed
+        with _trace.phase("query"):
+            result = copyt_api.get_record_from_id(
+                item_id_int, (_db_manager.TEXT_CONTENT_FIELD,)
+            )
+
+        with _trace.phase("output"):
+            if result.content is not None:
+                return _write_text(global_options, result)
+
+            with copyt_api.open_content(item_id_int) as content:
+                return _write_binary(global_options, result, content)
+
+    except KeyError:
+        show_error(
+            global_options, "There are no records in history with the specified item ID"
+        )
+        return 10
+
+    finally:
+        copyt_api.close()
+
+
+def _write_text(global_options: GlobalOptions, result: ClipboardRecord) -> int:
+    """
+    Write the content of a text record to stdout.
+
+    :param GlobalOptions global_options: The options of the program.
+    :param ClipboardRecord result: The record to write.
+    :return: The exit code of the command.
+    """
+
+    if global_options.json:
+        print(
+            json.dumps(
+                {"timestamp": result.timestamp.timestamp(), "content": result.content}
+            ),
+            end="",
+        )
+        return 0
+
+    sys.stdout.write(result.content)
+    sys.stdout.flush()
+    return 0
+
+
+def _write_binary(
+    global_options: GlobalOptions, result: ClipboardRecord, content: BinaryIO
+) -> int:
+    """
+    Write the content of a binary record to stdout, in chunks.
+
+    :param GlobalOptions global_options: The options of the program.
+    :param ClipboardRecord result: The record to write.
+    :param BinaryIO content: The content of the record, see `API.open_content`.
+    :return: The exit code of the command.
+    """
+
+    if global_options.json:
+        # DOCS: we should probably document that `get` shows
+        # base64-encoded content if it's not a string
+        sys.stdout.write(
+            f'{{"timestamp": {json.dumps(result.timestamp.timestamp())}, "content": "'
+        )
+        for chunk in _iter_base64(content):
+            sys.stdout.write(chunk)
+
+        sys.stdout.write('"}')
+        sys.stdout.flush()
+        return 0
+
+    if sys.stdout.buffer.writable():
+        sys.stdout.flush()
+        _copy_content(content, sys.stdout.buffer)
+        return 0
+
+    print(
+        "The content of the item is not a string and stdout is not writable",
+        file=sys.stderr,
+    )
+    return 11
+
+
+def _iter_base64(content: BinaryIO) -> Iterator[str]:
+    """
+    Encode content in base64, chunk by chunk.
+
+    :param BinaryIO content: The content to encode.
+    :return: The chunks of the encoded content.
+    """
+
+    pending = b""
+    while chunk := content.read(BASE64_CHUNK_SIZE):
+        chunk = pending + chunk
+        size = len(chunk) - len(chunk) % 3
+        yield base64.b64encode(chunk[:size]).decode("ascii")
+        pending = chunk[size:]
+
+    yield base64.b64encode(pending).decode("ascii")
+
+
+def _copy_content(content: BinaryIO, output: BinaryIO) -> None:
+    """
+    Copy content to an output in chunks. The kernel copies it with
+    `os.sendfile` when both are files, e.g. from a blob file to a pipe.
+
+    :param BinaryIO content: The content to copy.
+    :param BinaryIO output: The output to write to.
+    """
+
+    try:
+        content_fd, output_fd = content.fileno(), output.fileno()
+
+    except (AttributeError, OSError):  # not files
+        shutil.copyfileobj(content, output, COPY_CHUNK_SIZE)
+        output.flush()
+        return
+
+    output.flush()
+    offset = 0
+    try:
+        while sent := os.sendfile(output_fd, content_fd, offset, COPY_CHUNK_SIZE):
+            offset += sent
+
+    except OSError as e:
+        # e.g. the output is opened in append mode
+        if offset > 0 or e.errno not in (errno.EINVAL, errno.ENOSYS):
+            raise
+
+        shutil.copyfileobj(content, output, COPY_CHUNK_SIZE)
+        output.flush()
+
+
+def parse_args(
+    argv: list[str],
+) -> Optional[tuple[GlobalOptions, str, Optional[str]]]:
+    """
+    Parse the command line of the commands in `COMMANDS`.
+
+    :param list[str] argv: The arguments of the program.
+    :return: The options, the command and its argument, or None if the
+        command line needs the full CLI (e.g. other commands or `--help`).
+    """
+
+    global_options = helpers.get_default_options()
+    args = iter(argv)
+    for arg in args:
+        name, has_value, value = (
+            arg.partition("=") if arg.startswith("--") else (arg, "", "")
+        )
+        if name in FLAGS and not has_value:
+            setattr(global_options, FLAGS[name], True)
+
+        elif name in OPTIONS:
+            field, field_type = OPTIONS[name]
+            if not has_value:
+                value = next(args, None)
+                if value is None:
+                    return None
+
+            try:
+                setattr(global_options, field, field_type(value))
+
+            except ValueError:
+                return None
+
+        elif arg in COMMANDS:
+            command_args = list(args)
+            if len(command_args) > 1 or any(a.startswith("-") for a in command_args):
+                return None
+
+            return global_options, arg, command_args[0] if command_args else None
+
+        else:
+            return None
+
+    return None
+
+
+def run(argv: list[str]) -> Optional[int]:
+    """
+    Run a command without loading the full CLI, if possible.
+
+    :param list[str] argv: The arguments of the program.
+    :return: The exit code of the command, or None if it needs the full CLI.
+    """
+
+    parsed = parse_args(argv)
+    if parsed is None:
+        return None
+
+    global_options, command, argument = parsed
+    if (
+        global_options.compression != "none"
+        and global_options.compression not in _compression.COMPRESSORS
+    ) or global_options.synchronous.upper() not in _db_manager.SYNCHRONOUS_LEVELS:
+        return None  # let the full CLI report the error
+
+    if global_options.profile:
+        _trace.enable()
+
+    with _trace.phase(command):
+        try:
+            if command == "store":
+                return store(global_options, argument)
+
+            return get(global_options, argument)
+
+        except _daemon.DaemonError as e:  # e.g. the daemon was stopped
+            show_error(global_options, str(e))
+            return 12
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from typing import Optional, Sequence
+
+# Score added for each matched character
+MATCH_SCORE = 1.0
+# Score added when a character directly follows the previous match
+CONSECUTIVE_BONUS = 4.0
+# Score added when a character starts a word
+WORD_START_BONUS = 3.0
+# Score removed for each skipped character between two matches (up to `MAX_GAP`)
+GAP_PENALTY = 0.5
+MAX_GAP = 4
+# Score added to the newest candidate; older candidates get proportionally less
+RECENCY_WEIGHT = 2.0
+
+
+def score(pattern: str, text: str) -> Optional[float]:
+    """
+    Score how well a text matches a pattern. The characters of the pattern
+    must appear in the text in the same order, but not necessarily next
+    to each other. Matching is case-insensitive unless the pattern has
+    uppercase characters.
+
+    :param str pattern: The pattern to look for.
+    :param str text: The text to look in.
+    :return: The score of the match, or None if the text does not match.
+    """
+
+    if pattern == pattern.lower():
+        text = text.lower()
+
+    result = 0.0
+    previous = -1
+    for char in pattern:
+        position = text.find(char, previous + 1)
+        if position == -1:
+            return None
+
+        result += MATCH_SCORE
+        if position == previous + 1 and previous != -1:
+            result += CONSECUTIVE_BONUS
+
+        elif position == 0 or not text[position - 1].isalnum():
+            result += WORD_START_BONUS
+
+        if previous != -1:
+            result -= min(position - previous - 1, MAX_GAP) * GAP_PENALTY
+
+        previous = position
+
+    return result
+
+
+class FuzzyMatcher:  # pylint: disable=R0903
+    """
+    Find the candidates matching a pattern, with incremental narrowing:
+    when a pattern extends the previous one, only the candidates that
+    matched the previous pattern are scored again.
+    """
+
+    def __init__(self, candidates: Sequence[str]):
+        """
+        :param Sequence[str] candidates: The texts to match, from oldest to newest.
+        """
+
+        self.candidates = candidates
+        self._last_pattern: Optional[str] = None
+        self._last_matches: Sequence[int] = range(len(candidates))
+
+    def find(self, pattern: str) -> list[tuple[int, float]]:
+        """
+        Find the candidates matching a pattern, best matches first.
+
+        :param str pattern: The pattern to look for.
+        :return: The indices of the matching candidates and their scores.
+        """
+
+        to_score: Sequence[int] = range(len(self.candidates))
+        if self._last_pattern is not None and pattern.startswith(self._last_pattern):
+            # a text matching a pattern also matches all of its prefixes
+            to_score = self._last_matches
+
+        recency_step = RECENCY_WEIGHT / max(len(self.candidates), 1)
+        matches = []
+        for idx in to_score:
+            result = score(pattern, self.candidates[idx])
+            if result is not None:
+                matches.append((idx, result + (idx + 1) * recency_step))
+
+        self._last_pattern = pattern
+        self._last_matches = [idx for idx, _ in matches]
+
+        return sorted(matches, key=lambda match: match[1], reverse=True)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from copyt.models.clipboard_record import ClipboardRecord
+
+# The estimated size (in bytes) of a record without its content and strings
+RECORD_OVERHEAD = 256
+
+
+def estimate_size(record: ClipboardRecord) -> int:
+    """
+    Estimate the memory used by a record.
+
+    :param ClipboardRecord record: The record.
+    :return: The estimated size of the record, in bytes.
+    """
+
+    return (
+        RECORD_OVERHEAD
+        + (0 if record.content is None else len(record.content))
+        + len(record.mime or "")
+        + len(record.description or "")
+        + len(record.preview or "")
+    )
+
+
+class RecordCache:
+    """
+    A least-recently-used cache of records, bounded by their estimated size.
+    Records are frozen, so they are shared with the callers without copies.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        :param int max_bytes: The maximum estimated size of the cached records.
+        """
+
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._records: OrderedDict[Hashable, tuple[ClipboardRecord, int]] = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def get(self, key: Hashable) -> Optional[ClipboardRecord]:
+        """
+        Get a record, and mark it as the most recently used.
+
+        :param Hashable key: The key of the record.
+        :return: The record, or None if it is not cached.
+        """
+
+        entry = self._records.get(key)
+        if entry is None:
+            return None
+
+        self._records.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: Hashable, record: ClipboardRecord) -> None:
+        """
+        Cache a record, evicting the least recently used ones if needed.
+        Records larger than the cache are not cached.
+
+        :param Hashable key: The key of the record.
+        :param ClipboardRecord record: The record.
+        """
+
+        size = estimate_size(record)
+        if size > self.max_bytes:
+            return
+
+        previous = self._records.pop(key, None)
+        if previous is not None:
+            self.size -= previous[1]
+
+        self._records[key] = (record, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted_size) = self._records.popitem(last=False)
+            self.size -= evicted_size
+
+    def clear(self) -> None:
+        """
+        Remove all records.
+        """
+
+        self._records.clear()
+        self.size = 0
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import dataclasses
+import struct
+from datetime import datetime
+
+from copyt.models.clipboard_record import ClipboardRecord
+
+# The version of the layout written by `encode`
+FORMAT_VERSION = 1
+# The version, the flags, the timestamp (in microseconds since the epoch),
+# the size, and the lengths of the MIME type, description, preview and content
+HEADER = struct.Struct("!BBqqIIIQ")
+# The flags of the header
+HAS_CONTENT = 1 << 0
+TEXT_CONTENT = 1 << 1  # the content is text, encoded in `ENCODING`
+HAS_MIME = 1 << 2
+HAS_DESCRIPTION = 1 << 3
+HAS_SIZE = 1 << 4
+HAS_PREVIEW = 1 << 5
+# The encoding of the text fields and of text content
+ENCODING = "utf-8"
+
+
+def encode(record: ClipboardRecord) -> bytes:
+    """
+    Encode a record: a fixed-size header, followed by the text fields
+    and by the raw content.
+
+    :param ClipboardRecord record: The record to encode.
+    :return: The encoded record.
+    """
+
+    flags = 0
+    texts = []
+    for flag, text in (
+        (HAS_MIME, record.mime),
+        (HAS_DESCRIPTION, record.description),
+        (HAS_PREVIEW, record.preview),
+    ):
+        if text is not None:
+            flags |= flag
+
+        texts.append(b"" if text is None else text.encode(ENCODING))
+
+    content = record.content
+    if content is not None:
+        flags |= HAS_CONTENT
+        if isinstance(content, str):
+            flags |= TEXT_CONTENT
+            content = content.encode(ENCODING)
+
+    if record.size is not None:
+        flags |= HAS_SIZE
+
+    header = HEADER.pack(
+        FORMAT_VERSION,
+        flags,
+        round(record.timestamp.timestamp() * 1_000_000),
+        record.size or 0,
+        *map(len, texts),
+        0 if content is None else len(content),
+    )
+    return b"".join((header, *texts, content or b""))
+
+
+def decode_metadata(
+    data: bytes | memoryview,
+) -> tuple[ClipboardRecord, int, slice]:
+    """
+    Decode the metadata of a record encoded with `encode`, without
+    reading its content.
+
+    :param bytes | memoryview data: The encoded record.
+    :return: The record without its content, the flags of the header,
+        and where the content is in the encoded record.
+    """
+
+    if len(data) < HEADER.size:
+        raise ValueError("The encoded record is truncated")
+
+    version, flags, microseconds, size, *text_sizes, content_size = HEADER.unpack_from(
+        data
+    )
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported record format version: {version}")
+
+    offset = HEADER.size
+    texts = []
+    for flag, text_size in zip((HAS_MIME, HAS_DESCRIPTION, HAS_PREVIEW), text_sizes):
+        texts.append(
+            str(data[offset : offset + text_size], ENCODING) if flags & flag else None
+        )
+        offset += text_size
+
+    if len(data) < offset + content_size:
+        raise ValueError("The encoded record is truncated")
+
+    seconds, microsecond = divmod(microseconds, 1_000_000)
+    record = ClipboardRecord(
+        timestamp=datetime.fromtimestamp(seconds).replace(microsecond=microsecond),
+        content=None,
+        mime=texts[0],
+        description=texts[1],
+        size=size if flags & HAS_SIZE else None,
+        preview=texts[2],
+    )
+    return record, flags, slice(offset, offset + content_size)
+
+
+def decode(data: bytes | memoryview) -> ClipboardRecord:
+    """
+    Decode a record encoded with `encode`.
+
+    :param bytes | memoryview data: The encoded record.
+    :return: The record.
+    """
+
+    record, flags, content_slice = decode_metadata(data)
+    if not flags & HAS_CONTENT:
+        return record
+
+    content = data[content_slice]
+    return dataclasses.replace(
+        record,
+        content=str(content, ENCODING) if flags & TEXT_CONTENT else bytes(content),
+    )
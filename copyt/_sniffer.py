@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import re
+import struct
+from typing import Callable, Optional
+
+# What is said about data that is not identified
+OCTET_STREAM = ("application/octet-stream", "data")
+# Text starting with these is left to libmagic, which knows about
+# scripts, XML and JSON
+DEFERRED_TEXT_PREFIXES = ("#!", "<?xml", "{", "[")
+# Text containing control characters other than BEL, BS, HT, LF, VT, FF,
+# CR and ESC is not plain text, like in libmagic
+NON_TEXT_CHARACTERS = re.compile("[\x00-\x06\x0e-\x1a\x1c-\x1f\x7f]")
+# The tags which make a text an HTML document, looked for in `HTML_SEARCH_SIZE`
+# characters
+HTML_MARKERS = re.compile(
+    r"<!doctype html|<(?:head|title|html|script|style|table)[ >]|<a href=",
+    re.IGNORECASE,
+)
+HTML_SEARCH_SIZE = 4096
+# Lines longer than this are reported in the description of text
+MAX_LINE_LENGTH = 300
+
+# The colors of PNG images, by color type
+PNG_COLORS = {
+    0: " grayscale",
+    2: "/color RGB",
+    3: " colormap",
+    4: " gray+alpha",
+    6: "/color RGBA",
+}
+# The compression processes of JPEG images, by start-of-frame marker
+JPEG_PROCESSES = {0xC0: "baseline", 0xC1: "extended sequential", 0xC2: "progressive"}
+
+
+def _sniff_png(head: bytes) -> Optional[tuple[str, str]]:
+    """
+    Identify a PNG image from its header chunk.
+
+    :param bytes head: The start of the data.
+    :return: The MIME type and description, or None if it is not a PNG image.
+    """
+
+    if len(head) < 29 or head[12:16] != b"IHDR":
+        return None
+
+    width, height, depth, color, _, _, interlace = struct.unpack(
+        ">IIBBBBB", head[16:29]
+    )
+    return "image/png", (
+        f"PNG image data, {width} x {height}, {depth}-bit{PNG_COLORS.get(color, '')},"
+        f" {'interlaced' if interlace else 'non-interlaced'}"
+    )
+
+
+def _sniff_jpeg(head: bytes) -> Optional[tuple[str, str]]:
+    """
+    Identify a JPEG image from the segments before its start-of-frame segment.
+
+    :param bytes head: The start of the data.
+    :return: The MIME type and description, or None if it is not a JPEG image.
+    """
+
+    details = []
+    offset = 2
+    while offset + 4 <= len(head) and head[offset] == 0xFF:
+        marker = head[offset + 1]
+        (length,) = struct.unpack(">H", head[offset + 2 : offset + 4])
+        segment = head[offset + 4 : offset + 2 + length]
+        if marker == 0xE0 and segment.startswith(b"JFIF\x00") and len(segment) >= 7:
+            details.append(f"JFIF standard {segment[5]}.{segment[6]:02d}")
+
+        elif marker in JPEG_PROCESSES and len(segment) >= 6:
+            precision, height, width, components = struct.unpack(">BHHB", segment[:6])
+            details += [
+                JPEG_PROCESSES[marker],
+                f"precision {precision}",
+                f"{width}x{height}",
+                f"components {components}",
+            ]
+            return "image/jpeg", ", ".join(["JPEG image data"] + details)
+
+        offset += 2 + length
+
+    return None
+
+
+def _sniff_gif(head: bytes) -> Optional[tuple[str, str]]:
+    """
+    Identify a GIF image from its header.
+
+    :param bytes head: The start of the data.
+    :return: The MIME type and description, or None if it is not a GIF image.
+    """
+
+    if len(head) < 10 or head[3:6] not in (b"87a", b"89a"):
+        return None
+
+    width, height = struct.unpack("<HH", head[6:10])
+    return "image/gif", (
+        f"GIF image data, version {head[3:6].decode()}, {width} x {height}"
+    )
+
+
+def _sniff_webp(head: bytes) -> Optional[tuple[str, str]]:
+    """
+    Identify a WebP image from its first chunk.
+
+    :param bytes head: The start of the data.
+    :return: The MIME type and description, or None if it is not a WebP image.
+    """
+
+    if len(head) < 30 or head[8:12] != b"WEBP":
+        return None
+
+    chunk = head[12:16]
+    if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", head[26:30])
+        width, height = width & 0x3FFF, height & 0x3FFF
+
+    elif chunk == b"VP8L" and head[20] == 0x2F:
+        (bits,) = struct.unpack("<I", head[21:25])
+        width, height = (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+
+    elif chunk == b"VP8X":
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+
+    else:
+        return None
+
+    return "image/webp", f"RIFF (little-endian) data, Web/P image, {width}x{height}"
+
+
+def _sniff_pdf(head: bytes) -> Optional[tuple[str, str]]:
+    """
+    Identify a PDF document from its header.
+
+    :param bytes head: The start of the data.
+    :return: The MIME type and description, or None if it is not a PDF document.
+    """
+
+    version = re.match(rb"%PDF-(\d\.\d)", head)
+    if version is None:
+        return None
+
+    return "application/pdf", f"PDF document, version {version[1].decode()}"
+
+
+# The functions identifying binary data, by signature
+SIGNATURES: dict[bytes, Callable[[bytes], Optional[tuple[str, str]]]] = {
+    b"\x89PNG\r\n\x1a\n": _sniff_png,
+    b"\xff\xd8\xff": _sniff_jpeg,
+    b"GIF8": _sniff_gif,
+    b"RIFF": _sniff_webp,
+    b"%PDF-": _sniff_pdf,
+}
+
+
+def describe_text(text: str) -> tuple[str, str]:
+    """
+    Describe plain text, or HTML, the way libmagic does.
+
+    :param str text: The start of the text.
+    :return: The MIME type and description of the text.
+    """
+
+    if text.startswith("\ufeff"):
+        encoding = "Unicode text, UTF-8 (with BOM) text"
+
+    else:
+        encoding = "ASCII text" if text.isascii() else "Unicode text, UTF-8 text"
+
+    details = [encoding]
+    longest_line = max(map(len, text.splitlines()), default=0)
+    if longest_line > MAX_LINE_LENGTH:
+        details.append(f"with very long lines ({longest_line})")
+
+    crlf = text.count("\r\n")
+    terminators = [
+        name
+        for name, count in (
+            ("CRLF", crlf),
+            ("CR", text.count("\r") - crlf),
+            ("LF", text.count("\n") - crlf),
+        )
+        if count > 0
+    ]
+    if not terminators:
+        details.append("with no line terminators")
+
+    elif terminators != ["LF"]:
+        details.append(f"with {', '.join(terminators)} line terminators")
+
+    if "\x1b" in text:
+        details.append("with escape sequences")
+
+    if "\b" in text:
+        details.append("with overstriking")
+
+    if HTML_MARKERS.search(text, 0, HTML_SEARCH_SIZE):
+        return "text/html", "HTML document, " + ", ".join(details)
+
+    return "text/plain", ", ".join(details)
+
+
+def sniff(head: str | bytes) -> Optional[tuple[str, str]]:
+    """
+    Identify the most common types of clipboard content (plain text, HTML,
+    PNG, JPEG, GIF, WebP and PDF) from their signature, without libmagic.
+    The dimensions of images are read from their headers.
+
+    :param str | bytes head: The start of the data.
+    :return: The MIME type and description of the data, or None if
+        it is not one of these types.
+    """
+
+    if isinstance(head, str):
+        if head.startswith("%PDF-"):
+            return _sniff_pdf(head[:16].encode())
+
+        if head.lstrip().startswith(
+            DEFERRED_TEXT_PREFIXES
+        ) or NON_TEXT_CHARACTERS.search(head):
+            return None
+
+        return describe_text(head)
+
+    for signature, sniff_signature in SIGNATURES.items():
+        if head.startswith(signature):
+            return sniff_signature(head)
+
+    return None
+
+
+def guess(head: str | bytes) -> tuple[str, str]:
+    """
+    Identify data that `sniff` does not know about, when libmagic is
+    not available.
+
+    :param str | bytes head: The start of the data.
+    :return: The MIME type and description of the data.
+    """
+
+    if isinstance(head, str) and not NON_TEXT_CHARACTERS.search(head):
+        return describe_text(head)
+
+    return OCTET_STREAM
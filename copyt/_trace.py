@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import atexit
+import json
+import sys
+import time
+from typing import Any, Optional
+
+# The environment variable enabling tracing: `1` or `stderr` to print the
+# phases on stderr, or the path of a file to append them to
+TRACE_VARIABLE = "COPYT_TRACE"
+# The values of `TRACE_VARIABLE` leaving tracing disabled
+DISABLED_VALUES = ("", "0", "false")
+# When the program started, roughly: when this module was first imported
+STARTED = time.perf_counter()
+
+
+class _NullPhase:
+    """
+    The phase used when tracing is disabled, which does nothing.
+    """
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *_: Any) -> None:
+        pass
+
+
+class _Phase:
+    """
+    A traced phase, which records its wall time and memory allocations.
+    """
+
+    def __init__(self, tracer: "_Tracer", name: str):
+        """
+        :param _Tracer tracer: The tracer recording the phase.
+        :param str name: The name of the phase.
+        """
+
+        self._tracer = tracer
+        self._name = name
+
+    def __enter__(self) -> None:
+        self._tracer.start_phase(self._name)
+
+    def __exit__(self, *_: Any) -> None:
+        self._tracer.end_phase()
+
+
+class _Tracer:
+    """
+    Record the phases of the program, and report them when it exits.
+    """
+
+    def __init__(self, output: str):
+        """
+        :param str output: `stderr`, or the path of the file to append to.
+        """
+
+        import tracemalloc  # pylint: disable=C0415  # only needed when tracing
+
+        self._tracemalloc = tracemalloc
+        self._output = output
+        self._phases: list[dict] = []
+        # the name, start time, allocated memory and peak memory of
+        # the phases being run, outermost first
+        self._stack: list[list] = []
+        tracemalloc.start()
+
+    def start_phase(self, name: str) -> None:
+        """
+        Start a phase, within the current one.
+
+        :param str name: The name of the phase.
+        """
+
+        current, peak = self._tracemalloc.get_traced_memory()
+        if self._stack:
+            self._stack[-1][3] = max(self._stack[-1][3], peak)
+            name = f"{self._stack[-1][0]}/{name}"
+
+        self._tracemalloc.reset_peak()
+        self._stack.append([name, time.perf_counter(), current, current])
+
+    def end_phase(self) -> None:
+        """
+        End the current phase and record it.
+        """
+
+        end = time.perf_counter()
+        current, peak = self._tracemalloc.get_traced_memory()
+        name, start, allocated, phase_peak = self._stack.pop()
+        peak = max(peak, phase_peak)
+        if self._stack:
+            self._stack[-1][3] = max(self._stack[-1][3], peak)
+
+        self._phases.append(
+            {
+                "phase": name,
+                "started_at_in_seconds": start - STARTED,
+                "wall_time_in_seconds": end - start,
+                "allocated_in_bytes": current - allocated,
+                "peak_memory_in_bytes": peak,
+            }
+        )
+
+    def report(self) -> None:
+        """
+        Print the phases as JSON on stderr, or append them to the output file.
+        """
+
+        report = json.dumps(
+            {
+                "argv": sys.argv,
+                "wall_time_in_seconds": time.perf_counter() - STARTED,
+                "peak_memory_in_bytes": self._tracemalloc.get_traced_memory()[1],
+                # phases are recorded when they end, show them as they started
+                "phases": sorted(
+                    self._phases, key=lambda phase: phase["started_at_in_seconds"]
+                ),
+            }
+        )
+        if self._output == "stderr":
+            print(report, file=sys.stderr)
+
+        else:
+            with open(self._output, "a", encoding="utf-8") as log_file:
+                log_file.write(report + "\n")
+
+
+_NULL_PHASE = _NullPhase()
+_tracer: Optional[_Tracer] = None
+
+
+def enable(output: str = "stderr") -> None:
+    """
+    Enable tracing. Memory allocations are only traced from now on.
+
+    :param str output: `stderr`, or the path of the file to append the
+        phases to when the program exits.
+    """
+
+    global _tracer  # pylint: disable=W0603
+
+    if _tracer is None:
+        _tracer = _Tracer("stderr" if output in ("1", "stderr") else output)
+        atexit.register(_tracer.report)
+
+
+def get_output(value: Optional[str]) -> Optional[str]:
+    """
+    Get where to report the phases from the value of `TRACE_VARIABLE`.
+
+    :param Optional[str] value: The value of the variable, if it is set.
+    :return: `stderr`, the path of the file to append to, or None if
+        tracing is disabled.
+    """
+
+    if value is None or value.strip().lower() in DISABLED_VALUES:
+        return None
+
+    return "stderr" if value in ("1", "stderr") else value
+
+
+def phase(name: str) -> _Phase | _NullPhase:
+    """
+    Trace a phase of the program, in a `with` statement. Nothing is
+    recorded if tracing is disabled.
+
+    :param str name: The name of the phase.
+    :return: The context manager of the phase.
+    """
+
+    if _tracer is None:
+        return _NULL_PHASE
+
+    return _Phase(_tracer, name)
@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import io
+import os
+import select
+import signal
+import sys
+import time
+from typing import BinaryIO, Callable, Iterator, Optional
+
+from copyt import api, helpers
+from copyt.models.store_result import StoreResult
+
+# The maximum number of bytes read from the stream at once
+CHUNK_SIZE = 1024 * 64
+# The maximum length of the size of a clip in the `length` framing,
+# newline included
+MAX_SIZE_LENGTH = 21
+TOO_LARGE_MESSAGE = "The size of the data is larger than the maximum allowed size"
+INVALID_SIZE_MESSAGE = "Invalid clip size in the stream"
+
+
+class NulDecoder:
+    """
+    Split a stream into clips separated by NUL bytes. Clips larger than
+    the maximum size are skipped as they are read, without buffering them.
+    """
+
+    def __init__(self, max_size: int, on_error: Callable[[str], None]):
+        """
+        :param int max_size: The maximum size (in bytes) of a clip.
+        :param Callable[[str], None] on_error: Called with the reason a clip
+            was skipped.
+        """
+
+        self._max_size = max_size
+        self._on_error = on_error
+        self._buffer = bytearray()
+        # whether the rest of the current clip is skipped
+        self._skipping = False
+
+    def _fits(self, size: int) -> bool:
+        """
+        Check that the current clip still fits in the maximum size once
+        more bytes are added to it, or start skipping it.
+
+        :param int size: The number of bytes to add.
+        :return: Whether the bytes can be added.
+        """
+
+        if self._skipping:
+            return False
+
+        if len(self._buffer) + size > self._max_size:
+            self._on_error(TOO_LARGE_MESSAGE)
+            self._skipping = True
+            self._buffer = bytearray()
+            return False
+
+        return True
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        """
+        Read a chunk of the stream.
+
+        :param bytes chunk: The chunk to read.
+        :return: The clips completed by the chunk.
+        """
+
+        *ends, rest = chunk.split(b"\0")
+        clips = []
+        for end in ends:
+            if self._fits(len(end)):
+                clips.append(bytes(self._buffer + end))
+
+            self._buffer = bytearray()
+            self._skipping = False
+
+        if self._fits(len(rest)):
+            self._buffer += rest
+
+        return clips
+
+    def finish(self) -> list[bytes]:
+        """
+        Read the end of the stream.
+
+        :return: The last clip, if it was not followed by a NUL byte.
+        """
+
+        clips = [bytes(self._buffer)] if self._buffer else []
+        self._buffer = bytearray()
+        self._skipping = False
+        return clips
+
+
+class LengthPrefixedDecoder:
+    """
+    Split a stream into clips, each preceded by its size in bytes
+    written as a decimal number and a newline. Clips larger than the
+    maximum size are skipped as they are read, without buffering them,
+    and invalid sizes are skipped up to the next newline.
+    """
+
+    def __init__(self, max_size: int, on_error: Callable[[str], None]):
+        """
+        :param int max_size: The maximum size (in bytes) of a clip.
+        :param Callable[[str], None] on_error: Called with the reason a clip
+            was skipped.
+        """
+
+        self._max_size = max_size
+        self._on_error = on_error
+        self._buffer = bytearray()
+        # the number of bytes left of the clip being skipped
+        self._skipped = 0
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        """
+        Read a chunk of the stream.
+
+        :param bytes chunk: The chunk to read.
+        :return: The clips completed by the chunk.
+        """
+
+        if self._skipped:
+            skipped = min(self._skipped, len(chunk))
+            self._skipped -= skipped
+            chunk = chunk[skipped:]
+
+        self._buffer += chunk
+        clips = []
+        offset = 0
+        while True:
+            newline = self._buffer.find(b"\n", offset, offset + MAX_SIZE_LENGTH)
+            if newline == -1:
+                if len(self._buffer) - offset < MAX_SIZE_LENGTH:
+                    break  # wait for the rest of the size
+
+                self._on_error(INVALID_SIZE_MESSAGE)
+                newline = self._buffer.find(b"\n", offset)
+                offset = len(self._buffer) if newline == -1 else newline + 1
+                continue
+
+            start = newline + 1
+            try:
+                size = int(self._buffer[offset:newline])
+                if size < 0:
+                    raise ValueError(size)
+
+            except ValueError:
+                self._on_error(INVALID_SIZE_MESSAGE)
+                offset = start
+                continue
+
+            if size > self._max_size:
+                self._on_error(TOO_LARGE_MESSAGE)
+                self._skipped = max(0, start + size - len(self._buffer))
+                offset = min(start + size, len(self._buffer))
+                continue
+
+            if len(self._buffer) < start + size:
+                break
+
+            clips.append(bytes(self._buffer[start : start + size]))
+            offset = start + size
+
+        del self._buffer[:offset]
+        return clips
+
+    def finish(self) -> list[bytes]:
+        """
+        Read the end of the stream.
+
+        :return: Nothing, an unfinished clip is dropped.
+        """
+
+        self._buffer = bytearray()
+        self._skipped = 0
+        return []
+
+
+DECODERS = {"nul": NulDecoder, "length": LengthPrefixedDecoder}
+
+
+def _read_chunk(stream: BinaryIO, timeout: Optional[float]) -> Optional[bytes]:
+    """
+    Read the data available in a stream, waiting for it if needed.
+
+    :param BinaryIO stream: The stream to read.
+    :param Optional[float] timeout: The maximum time to wait, or None to
+        wait until data is available.
+    :return: The data read (empty at the end of the stream),
+        or None if the timeout expired.
+    """
+
+    try:
+        fd = stream.fileno()
+
+    except (AttributeError, io.UnsupportedOperation):  # e.g. an in-memory stream
+        return stream.read1(CHUNK_SIZE)
+
+    if timeout is not None and not select.select([fd], [], [], timeout)[0]:
+        return None
+
+    return os.read(fd, CHUNK_SIZE)
+
+
+def _raise_error(message: str) -> None:
+    """
+    Raise the error of a decoder.
+
+    :param str message: The error message.
+    """
+
+    raise ValueError(message)
+
+
+def read_clips(stream: BinaryIO, framing: str, max_size: int) -> Iterator[bytes]:
+    """
+    Read the clips of a stream until it ends.
+
+    :param BinaryIO stream: The stream to read.
+    :param str framing: How the clips are delimited, see `DECODERS`.
+    :param int max_size: The maximum size (in bytes) of a clip.
+    :return: The clips.
+    :raises ValueError: If a clip is too large or the stream is invalid.
+    """
+
+    decoder = DECODERS[framing](max_size, _raise_error)
+    while chunk := _read_chunk(stream, None):
+        yield from decoder.feed(chunk)
+
+    yield from decoder.finish()
+
+
+def watch(  # pylint: disable=R0913
+    copyt_api: api.API,
+    stream: BinaryIO,
+    framing: str,
+    commit_interval: float,
+    on_store: Callable[[StoreResult], None],
+    on_error: Callable[[str], None],
+) -> None:
+    """
+    Store the clips read from a stream until it ends or SIGTERM is received.
+    SIGTERM is only handled while waiting for the stream, so that the
+    clips stored so far can be committed.
+
+    :param api.API copyt_api: The API to store the clips with.
+    :param BinaryIO stream: The stream to read.
+    :param str framing: How the clips are delimited, see `DECODERS`.
+    :param float commit_interval: The maximum time (in seconds) a stored
+        clip stays uncommitted.
+    :param Callable[[StoreResult], None] on_store: Called with the result of each store.
+    :param Callable[[str], None] on_error: Called with the reason a clip
+        was not stored, or was skipped (e.g. an invalid size in the stream).
+    """
+
+    decoder = DECODERS[framing](
+        copyt_api.global_options.max_item_size_in_bytes, on_error
+    )
+
+    def store(clips: list[bytes]) -> int:
+        stored = 0
+        for clip in clips:
+            if not clip:
+                continue
+
+            try:
+                on_store(
+                    copyt_api.store(
+                        helpers.decode_text(
+                            clip, copyt_api.global_options.text_encoding
+                        )
+                    )
+                )
+                stored += 1
+
+            except ValueError as e:  # e.g. the clip is too large
+                on_error(str(e))
+
+        return stored
+
+    previous_handler = signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    uncommitted = 0
+    last_commit = time.monotonic()
+    try:
+        while True:
+            timeout = (
+                max(0, last_commit + commit_interval - time.monotonic())
+                if uncommitted
+                else None
+            )
+            chunk = _read_chunk(stream, timeout)
+            signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGTERM})
+            if chunk == b"":
+                uncommitted += store(decoder.finish())
+                break
+
+            if chunk is not None:
+                uncommitted += store(decoder.feed(chunk))
+
+            if uncommitted and time.monotonic() - last_commit >= commit_interval:
+                copyt_api.commit()
+                uncommitted = 0
+                last_commit = time.monotonic()
+
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGTERM})
+
+    finally:
+        copyt_api.commit()
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGTERM})
+        signal.signal(signal.SIGTERM, previous_handler)
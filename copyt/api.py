@@ -25,15 +25,30 @@ SOFTWARE.
 """
 
 import pathlib
+from datetime import datetime
+from typing import BinaryIO, Iterable, Iterator, Optional
 
-from copyt import _db_manager
+from copyt import _db_manager, _fuzzy, _record_cache, _trace, helpers
+from copyt.models.change_set import ChangeSet
 from copyt.models.clipboard_record import ClipboardRecord
 from copyt.models.global_options import GlobalOptions
+from copyt.models.store_result import StoreResult
 
+# The number of items sent to the worker processes at a time by `_sniff_items`,
+# which identifies fewer items in-process
+BACKFILL_BATCH_SIZE = 64
+# The fields of the records kept in memory by `fuzzy_find`
+FUZZY_FIELDS = ("mime", "description", "size", "preview")
 
-class API:
+
+class API:  # pylint: disable=R0902
     """
     The API for working with copyt
+
+    Set `record_cache_size_in_bytes` in the options to keep the records read
+    by `get_record_from_id` and `get_history_list` in memory, for programs
+    that read them repeatedly. The cache is emptied when the history is
+    changed, by this instance or by another process.
     """
 
     def __init__(
@@ -45,7 +60,35 @@ class API:
         """
 
         self.global_options = global_options
-        self.db_manager = _db_manager.DBManager(self.history_file)
+        with _trace.phase("open history"):
+            self.db_manager = _db_manager.DBManager(
+                self.history_file,
+                encoding=self.global_options.text_encoding,
+                codec=(
+                    None
+                    if self.global_options.compression == "none"
+                    else self.global_options.compression
+                ),
+                compression_level=self.global_options.compression_level,
+                compression_threshold=self.global_options.compression_threshold_in_bytes,
+                blob_threshold=self.global_options.blob_threshold_in_bytes or None,
+                synchronous=self.global_options.synchronous,
+                busy_timeout=self.global_options.busy_timeout_in_seconds,
+            )
+
+        # the records and matcher used by `fuzzy_find`, built on first use
+        self._fuzzy_records: list[tuple[int, ClipboardRecord]] = []
+        self._fuzzy_matcher: Optional[_fuzzy.FuzzyMatcher] = None
+        self._fuzzy_data_version: Optional[int] = None
+        # the records read by `get_record_from_id` and `get_history_list`,
+        # and the IDs of the whole history, if it was read since it changed
+        self._record_cache = (
+            _record_cache.RecordCache(self.global_options.record_cache_size_in_bytes)
+            if self.global_options.record_cache_size_in_bytes > 0
+            else None
+        )
+        self._record_cache_data_version: Optional[int] = None
+        self._history_ids: Optional[list[int]] = None
 
     @property
     def history_file(self) -> pathlib.Path:
@@ -60,7 +103,8 @@ class API:
         Commit changes to the database.
         """
 
-        self.db_manager.commit()
+        with _trace.phase("commit"):
+            self.db_manager.commit()
 
     def close(self, commit: bool = False) -> None:
         """
@@ -72,12 +116,89 @@ class API:
 
         self.db_manager.close()
 
-    def store(self, data: str | bytes) -> int:
+    def _forget_records(self) -> None:
+        """
+        Forget the records kept in memory, after the history is changed.
+        """
+
+        self._fuzzy_matcher = None
+        self._history_ids = None
+        if self._record_cache is not None:
+            self._record_cache.clear()
+
+    def _get_record_cache(self) -> Optional[_record_cache.RecordCache]:
+        """
+        Get the record cache, emptied first if another process changed
+        the history since it was filled.
+
+        :return: The record cache, or None if it is disabled.
+        """
+
+        if self._record_cache is not None:
+            data_version = self.db_manager.data_version
+            if data_version != self._record_cache_data_version:
+                self._forget_records()
+                self._record_cache_data_version = data_version
+
+        return self._record_cache
+
+    def store(self, data: str | bytes, digest: Optional[bytes] = None) -> StoreResult:
         """
-        Store data to history.
+        Store data to history. Storing data that is already in the
+        history moves the existing item to the top.
 
-        :param str | bytes data: The data to store.
-        :return: The ID of the item.
+        :param str | bytes data: The data to store, or any bytes-like object.
+        :param Optional[bytes] digest: The SHA-256 digest of binary data,
+            if it is already known.
+        :return: The ID of the item and whether it was already stored.
+        """
+
+        with _trace.phase("add"):
+            result = self.db_manager.add(self._check_size(data), digest)
+
+        if not result.duplicate:
+            with _trace.phase("sniff"):
+                metadata = helpers.sniff(data)
+
+            self.db_manager.set_metadata(result.item_id, *metadata)
+
+        with _trace.phase("evict"):
+            self.db_manager.evict(
+                self.global_options.max_items,
+                self.global_options.max_total_size_in_bytes,
+            )
+
+        self._forget_records()
+
+        return result
+
+    def store_many(self, items: Iterable[str | bytes]) -> list[StoreResult]:
+        """
+        Store many items to history, like `store`, in a single transaction.
+        The history is trimmed once, before identifying the new items
+        (on a pool of worker processes for large batches).
+
+        :param Iterable[str | bytes] items: The data to store, oldest first.
+        :return: The IDs of the items and whether they were already stored.
+        """
+
+        first_id = self.db_manager.max_index + 1
+        results = self.db_manager.add_many(self._check_size(data) for data in items)
+        self.db_manager.evict(
+            self.global_options.max_items,
+            self.global_options.max_total_size_in_bytes,
+        )
+        self._sniff_items(self.db_manager.get_ids_without_metadata(first_id))
+        self._forget_records()
+
+        return results
+
+    def _check_size(self, data: str | bytes) -> str | bytes:
+        """
+        Check that data is not larger than the maximum item size.
+
+        :param str | bytes data: The data to check.
+        :return: The data.
         """
 
         if len(data) > self.global_options.max_item_size_in_bytes:
@@ -85,7 +206,7 @@ class API:
                 "The size of the data is larger than the maximum allowed size"
             )
 
-        return self.db_manager.add(data)
+        return data
 
     def remove(self, item_id: int) -> None:
         """
@@ -95,6 +216,7 @@ class API:
         """
 
         self.db_manager.delete(item_id)
+        self._forget_records()
 
     def remove_last(self) -> None:
         """
@@ -102,6 +224,19 @@ class API:
         """
 
         self.db_manager.delete(self.db_manager.max_index)
+        self._forget_records()
+
+    def prune(self, before: datetime) -> int:
+        """
+        Remove the items stored before a point in time.
+
+        :param datetime before: The time before which items are removed.
+        :return: The number of removed items.
+        """
+
+        pruned = self.db_manager.prune(before)
+        self._forget_records()
+        return pruned
 
     def wipe(self) -> None:
         """
@@ -109,19 +244,227 @@ class API:
         """
 
         self.db_manager.wipe()
+        self._forget_records()
+
+    def iter_history(  # pylint: disable=R0913
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        reverse: bool = False,
+        fields: Optional[Iterable[str]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Iterator[tuple[int, ClipboardRecord]]:
+        """
+        Iterate over the items in the history without loading them all at once.
+
+        :param Optional[int] limit: The maximum number of items to get.
+        :param int offset: The number of items to skip.
+        :param bool reverse: Start from the newest item instead of the oldest.
+        :param Optional[Iterable[str]] fields: The fields of the records to load.
+            Fields that are not loaded are set to None. All fields are loaded
+            by default; leave out `content` to avoid reading the items' data.
+        :param Optional[datetime] since: Only get the items stored at or after this time.
+        :param Optional[datetime] until: Only get the items stored before this time.
+        """
+
+        return self.db_manager.iter_records(
+            limit, offset, reverse, fields, since, until
+        )
 
-    def get_history_list(self) -> list[tuple[str, ClipboardRecord]]:
+    def changes_since(
+        self, cursor: int, fields: Optional[Iterable[str]] = None
+    ) -> ChangeSet:
+        """
+        Get the items added, updated or deleted since a cursor, for programs
+        that keep a copy of the history up to date. Reading the changes
+        costs as much as the changes, not as the whole history.
+
+        :param int cursor: The cursor of the previous changes, or 0 to start.
+        :param Optional[Iterable[str]] fields: The fields of the records to load
+            (see `iter_history`).
+        :return: The changes, and the cursor of the next call. If the cursor
+            is too old, the changes are the whole history.
+        """
+
+        return self.db_manager.changes_since(cursor, fields)
+
+    def search(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> Iterator[tuple[int, ClipboardRecord]]:
+        """
+        Search the text items in the history, best matches first.
+        Words ending with `*` match as prefixes.
+
+        :param str query: The words to search for.
+        :param Optional[int] limit: The maximum number of items to get.
+        :param Optional[Iterable[str]] fields: The fields of the records to load
+            (see `iter_history`).
+        """
+
+        return self.db_manager.search(query, limit, fields)
+
+    def fuzzy_find(
+        self,
+        pattern: str,
+        limit: Optional[int] = None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> list[tuple[int, ClipboardRecord]]:
+        """
+        Find the items whose preview (or description, for binary items)
+        fuzzy-matches a pattern. Recent items are ranked higher.
+
+        The previews are loaded on the first call. When a pattern extends
+        the previous one, only the previous matches are checked again,
+        so calling this on every keystroke of a picker is cheap.
+
+        :param str pattern: The pattern to look for.
+        :param Optional[int] limit: The maximum number of items to get.
+        :param Optional[Iterable[str]] fields: The fields of the records to load
+            (see `iter_history`). The content is only read for the returned items.
+        """
+
+        # rebuild the matcher if another process changed the history
+        data_version = self.db_manager.data_version
+        if self._fuzzy_matcher is None or data_version != self._fuzzy_data_version:
+            self._fuzzy_records = list(self.iter_history(fields=FUZZY_FIELDS))
+            self._fuzzy_matcher = _fuzzy.FuzzyMatcher(
+                [
+                    (
+                        record.preview
+                        if record.preview is not None
+                        else record.description or ""
+                    )
+                    for _, record in self._fuzzy_records
+                ]
+            )
+            self._fuzzy_data_version = data_version
+
+        results: list[tuple[int, ClipboardRecord]] = []
+        for idx, _ in self._fuzzy_matcher.find(pattern):
+            if limit is not None and len(results) >= limit:
+                break
+
+            item_id, record = self._fuzzy_records[idx]
+            if fields is None or not set(fields).issubset(FUZZY_FIELDS):
+                try:
+                    record = self.db_manager.query(item_id, fields)
+
+                except KeyError:  # deleted since the matcher was built
+                    continue
+
+            results.append((item_id, record))
+
+        return results
+
+    def get_history_list(self) -> list[tuple[int, ClipboardRecord]]:
         """
         Get a list of all items in the history.
         """
 
-        return self.db_manager.get_all()
+        record_cache = self._get_record_cache()
+        if record_cache is None:
+            return self.db_manager.get_all()
 
-    def get_record_from_id(self, item_id: int) -> ClipboardRecord:
+        if self._history_ids is not None:
+            history = []
+            for item_id in self._history_ids:
+                record = record_cache.get((item_id, None))
+                if record is None:  # evicted, read the history again
+                    break
+
+                history.append((item_id, record))
+
+            else:
+                return history
+
+        history = self.db_manager.get_all()
+        for item_id, record in history:
+            record_cache.put((item_id, None), record)
+
+        self._history_ids = [item_id for item_id, _ in history]
+        return history
+
+    def backfill_metadata(self, workers: Optional[int] = None) -> int:
+        """
+        Identify the items stored without a MIME type and description,
+        e.g. the ones migrated from older versions of copyt.
+        libmagic is run on a pool of worker processes.
+
+        :param Optional[int] workers: The number of worker processes to use.
+        :return: The number of updated items.
+        """
+
+        ids = self.db_manager.get_ids_without_metadata()
+        self._sniff_items(ids, workers)
+        self._forget_records()
+        return len(ids)
+
+    def _sniff_items(self, ids: list[int], workers: Optional[int] = None) -> None:
+        """
+        Set the MIME type and description of items. libmagic is run on a
+        pool of worker processes if there are enough items.
+
+        :param list[int] ids: The IDs of the items.
+        :param Optional[int] workers: The number of worker processes to use.
+        """
+
+        if len(ids) <= BACKFILL_BATCH_SIZE:  # not worth starting the workers
+            for item_id in ids:
+                content = self.db_manager.query(item_id, ("content",)).content
+                self.db_manager.set_metadata(item_id, *helpers.sniff(content))
+
+            return
+
+        # pylint: disable-next=C0415  # slow to import, and rarely needed
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # send the contents to the workers in batches to bound memory usage
+            for start in range(0, len(ids), BACKFILL_BATCH_SIZE):
+                batch = ids[start : start + BACKFILL_BATCH_SIZE]
+                contents = (
+                    self.db_manager.query(item_id, ("content",)).content
+                    for item_id in batch
+                )
+                for item_id, metadata in zip(
+                    batch, executor.map(helpers.sniff, contents)
+                ):
+                    self.db_manager.set_metadata(item_id, *metadata)
+
+    def get_record_from_id(
+        self, item_id: int, fields: Optional[Iterable[str]] = None
+    ) -> ClipboardRecord:
         """
         Get a record from an ID.
 
         :param int item_id: The ID of the item to get.
+        :param Optional[Iterable[str]] fields: The fields of the record to load
+            (see `iter_history`).
+        """
+
+        record_cache = self._get_record_cache()
+        if record_cache is None:
+            return self.db_manager.query(item_id, fields)
+
+        key = (item_id, None if fields is None else tuple(fields))
+        record = record_cache.get(key)
+        if record is None:
+            record = self.db_manager.query(item_id, key[1])
+            record_cache.put(key, record)
+
+        return record
+
+    def open_content(self, item_id: int) -> BinaryIO:
+        """
+        Open the content of an item, to read it in chunks instead of
+        loading all of it.
+
+        :param int item_id: The ID of the item.
+        :return: A binary stream of the content, encoded in UTF-8 for text.
         """
 
-        return self.db_manager.query(item_id)
+        return self.db_manager.open_content(item_id)
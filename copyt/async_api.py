@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterable, Optional, TypeVar
+
+from copyt import api
+from copyt.models.clipboard_record import ClipboardRecord
+from copyt.models.global_options import GlobalOptions
+from copyt.models.store_result import StoreResult
+
+# The number of records read at a time by `AsyncAPI.iter_history`
+HISTORY_BATCH_SIZE = 64
+
+T = TypeVar("T")
+
+
+def _store(copyt_api: api.API, data: str | bytes) -> StoreResult:
+    """
+    Store data to history and commit it.
+
+    :param api.API copyt_api: The API instance.
+    :param str | bytes data: The data to store.
+    :return: The ID of the item and whether it was already stored.
+    """
+
+    result = copyt_api.store(data)
+    copyt_api.commit()
+    return result
+
+
+def _remove(copyt_api: api.API, item_id: int) -> None:
+    """
+    Remove an item from the history and commit it.
+
+    :param api.API copyt_api: The API instance.
+    :param int item_id: The ID of the item to remove.
+    """
+
+    copyt_api.remove(item_id)
+    copyt_api.commit()
+
+
+def _read_batch(  # pylint: disable=R0913
+    copyt_api: api.API,
+    limit: int,
+    offset: int,
+    reverse: bool,
+    fields: Optional[tuple[str, ...]],
+    after_id: Optional[int],
+) -> list[tuple[int, ClipboardRecord]]:
+    """
+    Read a batch of records from the history.
+
+    :param api.API copyt_api: The API instance.
+    :param int limit: The maximum number of items to get.
+    :param int offset: The number of items to skip.
+    :param bool reverse: Start from the newest item instead of the oldest.
+    :param Optional[tuple[str, ...]] fields: The fields of the records to load.
+    :param Optional[int] after_id: The ID of the last item of the previous batch.
+    :return: The IDs and records of the items.
+    """
+
+    return list(
+        copyt_api.db_manager.iter_records(
+            limit, offset, reverse, fields, after_id=after_id
+        )
+    )
+
+
+class AsyncAPI:
+    """
+    The API for working with copyt from asyncio programs, e.g. pickers
+    and status bars. The history is opened on a worker thread, where
+    the calls run one at a time, so the event loop is never blocked
+    and a single database connection is reused.
+
+    Changes are committed after each call, so that other copyt processes
+    see them at once.
+    """
+
+    def __init__(self, global_options: GlobalOptions):
+        """
+        :param GlobalOptions global_options: The options of the program.
+        """
+
+        self.global_options = global_options
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="copyt-api"
+        )
+        # opened by the worker thread on the first call, since SQLite
+        # connections can only be used by the thread that opened them
+        self._api: Optional[api.API] = None
+
+    async def __aenter__(self) -> "AsyncAPI":
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        await self.close()
+
+    def _get_api(self) -> api.API:
+        """
+        Get the API, opening the history if needed. Only called by the worker.
+
+        :return: The API instance.
+        """
+
+        if self._api is None:
+            self._api = api.API(self.global_options)
+
+        return self._api
+
+    async def _call(self, function: Callable[..., T], *args: Any) -> T:
+        """
+        Run a function on the worker thread.
+
+        :param Callable[..., T] function: The function to run, given the
+            API instance and `args`.
+        :return: The result of the function.
+        """
+
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, lambda: function(self._get_api(), *args)
+        )
+
+    async def store(self, data: str | bytes) -> StoreResult:
+        """
+        Store data to history, see `API.store`.
+
+        :param str | bytes data: The data to store.
+        :return: The ID of the item and whether it was already stored.
+        """
+
+        return await self._call(_store, data)
+
+    async def remove(self, item_id: int) -> None:
+        """
+        Remove an item from the history.
+
+        :param int item_id: The ID of the item to remove.
+        """
+
+        await self._call(_remove, item_id)
+
+    async def get_record_from_id(
+        self, item_id: int, fields: Optional[Iterable[str]] = None
+    ) -> ClipboardRecord:
+        """
+        Get a record from an ID, see `API.get_record_from_id`.
+
+        :param int item_id: The ID of the item to get.
+        :param Optional[Iterable[str]] fields: The fields of the record to load.
+        """
+
+        return await self._call(
+            api.API.get_record_from_id,
+            item_id,
+            None if fields is None else tuple(fields),
+        )
+
+    async def iter_history(
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        reverse: bool = False,
+        fields: Optional[Iterable[str]] = None,
+    ) -> AsyncIterator[tuple[int, ClipboardRecord]]:
+        """
+        Iterate over the items in the history, see `API.iter_history`.
+        The records are read `HISTORY_BATCH_SIZE` at a time, so that the
+        other calls can run between the batches of large histories. Each
+        batch starts after the ID of the last item read, so that it is
+        found with the index of the IDs whatever its position.
+
+        :param Optional[int] limit: The maximum number of items to get.
+        :param int offset: The number of items to skip.
+        :param bool reverse: Start from the newest item instead of the oldest.
+        :param Optional[Iterable[str]] fields: The fields of the records to load.
+        """
+
+        fields = None if fields is None else tuple(fields)
+        after_id = None
+        while limit is None or limit > 0:
+            batch_size = (
+                HISTORY_BATCH_SIZE if limit is None else min(limit, HISTORY_BATCH_SIZE)
+            )
+            batch = await self._call(
+                _read_batch, batch_size, offset, reverse, fields, after_id
+            )
+            for item in batch:
+                yield item
+
+            if len(batch) < batch_size:
+                return
+
+            # the offset only applies to the first batch
+            offset = 0
+            after_id = batch[-1][0]
+            if limit is not None:
+                limit -= batch_size
+
+    async def close(self) -> None:
+        """
+        Commit the changes and close the history.
+        """
+
+        if self._api is not None:
+            await self._call(api.API.close, True)
+            self._api = None
+
+        self._executor.shutdown()
@@ -24,9 +24,28 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import hashlib
+import os
 import pathlib
 import sys
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import BinaryIO, Optional
+
+from copyt import _sniffer, _trace
+from copyt.models.global_options import GlobalOptions
+
+# The size of the chunks read from stdin
+READ_CHUNK_SIZE = 1024 * 64
+# How much of the data is used to identify its type
+SNIFF_SIZE = 1024 * 1024
+# The units of the durations understood by `parse_duration`, in seconds
+DURATION_UNITS = {
+    "s": 1,
+    "m": 60,
+    "h": 60 * 60,
+    "d": 60 * 60 * 24,
+    "w": 60 * 60 * 24 * 7,
+}
 
 
 def get_program_cache_dir(cache_dir: str | pathlib.Path) -> pathlib.Path:
@@ -40,6 +59,25 @@ def get_program_cache_dir(cache_dir: str | pathlib.Path) -> pathlib.Path:
     return pathlib.Path(cache_dir, "copyt")
 
 
+def get_default_options() -> GlobalOptions:
+    """
+    Get the options used when they are not set on the command line.
+
+    :return: The default options of the program.
+    """
+
+    return GlobalOptions(
+        json=False,
+        max_items=750,
+        max_item_size_in_bytes=1024 * 1024 * 5,  # 5MB
+        verbose=False,
+        cache_dir=get_program_cache_dir(
+            os.getenv("XDG_CACHE_HOME") or pathlib.Path(pathlib.Path.home(), ".cache")
+        ),
+        text_encoding="utf-8",
+    )
+
+
 def get_input_from_arg_or_stdin(arg: Optional[str] = None) -> str | bytes | None:
     """
     Get input from argument or stdin. Argument takes precedence over stdin.
@@ -56,3 +94,146 @@ def get_input_from_arg_or_stdin(arg: Optional[str] = None) -> str | bytes | None
             return stdin_data
 
     return None
+
+
+def read_stream(stream: BinaryIO, max_size: int) -> tuple[bytearray, bytes]:
+    """
+    Read a stream in chunks, hashing them as they are read. Reading stops
+    as soon as the data is larger than `max_size`, so that a large input
+    is refused before it fills the memory.
+
+    :param BinaryIO stream: The stream to read.
+    :param int max_size: The maximum size (in bytes) of the data.
+    :return: The data and its SHA-256 digest.
+    """
+
+    data = bytearray()
+    digest = hashlib.sha256()
+    while chunk := stream.read(READ_CHUNK_SIZE):
+        if len(data) + len(chunk) > max_size:
+            raise ValueError(
+                "The size of the data is larger than the maximum allowed size"
+            )
+
+        digest.update(chunk)
+        data += chunk
+
+    return data, digest.digest()
+
+
+def decode_text(data: bytes | bytearray, encoding: str) -> str | bytes | bytearray:
+    """
+    Decode data if it is text.
+
+    :param bytes | bytearray data: The data to decode, or any bytes-like object.
+    :param str encoding: The text encoding to use.
+    :return: The decoded text, or the data if it is not text.
+    """
+
+    try:
+        return str(data, encoding)
+
+    except UnicodeDecodeError:  # data is not text
+        return data
+
+
+def sniff(data: str | bytes) -> tuple[str, str]:
+    """
+    Identify the type of the data. The most common types are identified
+    from their signature, and libmagic is only used for the other types,
+    if it is installed. Only the first `SNIFF_SIZE` bytes (or characters)
+    are looked at.
+
+    :param str | bytes data: The data to identify, or any bytes-like object.
+    :return: The MIME type and a human-readable description of the data.
+    """
+
+    head = data[:SNIFF_SIZE]
+    if not isinstance(head, str):
+        head = bytes(head)
+
+    result = _sniffer.sniff(head)
+    if result is not None:
+        return result
+
+    with _trace.phase("libmagic"):
+        try:
+            import magic  # pylint: disable=C0415  # loading libmagic is slow
+
+        except ImportError:  # python-magic is optional
+            return _sniffer.guess(head)
+
+        return magic.from_buffer(head, mime=True), magic.from_buffer(head)
+
+
+def make_preview(text: str, length: int = 100) -> str:
+    """
+    Make a one-line preview of a text: the first non-blank line,
+    with its whitespace collapsed and truncated to `length` characters.
+
+    :param str text: The text to preview.
+    :param int length: The maximum length of the preview.
+    :return: The preview of the text.
+    """
+
+    # only look at the start of the text, it may be several megabytes long
+    head = text[: length * 40].lstrip()
+    preview = " ".join(head.split("\n", 1)[0].split())
+    if len(preview) > length:
+        return preview[: length - 1] + "…"
+
+    return preview
+
+
+def hash_path(path: str | pathlib.Path) -> str:
+    """
+    Get a short, filename-safe identifier of a path.
+
+    :param str | pathlib.Path path: The path to identify.
+    :return: The first 12 characters of the SHA-1 hash of the path.
+    """
+
+    return hashlib.sha1(str(path).encode()).hexdigest()[:12]
+
+
+def parse_duration(text: str) -> timedelta:
+    """
+    Parse a duration, e.g. `90s`, `15m`, `1.5h`, `30d` or `2w`.
+
+    :param str text: The duration to parse.
+    :return: The duration.
+    :raises ValueError: If the duration is invalid.
+    """
+
+    unit = DURATION_UNITS.get(text[-1:])
+    try:
+        if unit is None:
+            raise ValueError
+
+        return timedelta(seconds=float(text[:-1]) * unit)
+
+    except (ValueError, OverflowError):
+        raise ValueError(f"Invalid duration: {text}") from None
+
+
+def parse_time(text: str) -> datetime:
+    """
+    Parse a point in time: a duration before now (e.g. `1h` for an hour
+    ago), or an ISO 8601 date and time (e.g. `2023-05-01T12:00`).
+
+    :param str text: The point in time to parse.
+    :return: The point in time.
+    :raises ValueError: If the point in time is invalid.
+    """
+
+    try:
+        return datetime.now() - parse_duration(text)
+
+    except (ValueError, OverflowError):
+        pass
+
+    try:
+        return datetime.fromisoformat(text)
+
+    except ValueError:
+        raise ValueError(f"Invalid time: {text}") from None
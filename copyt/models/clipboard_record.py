@@ -24,15 +24,29 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from datetime import datetime
+from typing import Optional
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ClipboardRecord:
     """
     A record of a clipboard item.
     """
 
     timestamp: datetime
-    content: str | bytes
+    content: Optional[str | bytes]  # None if the content was not loaded
+    mime: Optional[str] = None
+    description: Optional[str] = None  # what libmagic says about the content
+    size: Optional[int] = None  # the size of the content in bytes
+    preview: Optional[str] = None  # the first line of text content
+
+    def __getstate__(self) -> dict:
+        return {field.name: getattr(self, field.name) for field in fields(self)}
+
+    def __setstate__(self, state: dict) -> None:
+        # records pickled by older versions of copyt (e.g. in SqliteDict
+        # histories) may not have all the fields
+        for field in fields(self):
+            object.__setattr__(self, field.name, state.get(field.name, field.default))
@@ -29,7 +29,7 @@ from dataclasses import dataclass
 
 
 @dataclass
-class GlobalOptions:
+class GlobalOptions:  # pylint: disable=R0902
     """
     Global options for the program
     """
@@ -41,3 +41,12 @@ class GlobalOptions:
     cache_dir: str | pathlib.Path
 
     text_encoding: str
+    max_total_size_in_bytes: int = 1024 * 1024 * 500  # 500MB
+    compression: str = "zlib"  # or "lzma", or "none"
+    compression_level: int = 6
+    compression_threshold_in_bytes: int = 1024 * 4  # 4KB
+    blob_threshold_in_bytes: int = 1024 * 100  # 100KB, or 0 to disable
+    synchronous: str = "NORMAL"  # or "OFF", "FULL" or "EXTRA"
+    busy_timeout_in_seconds: float = 10.0
+    profile: bool = False
+    record_cache_size_in_bytes: int = 0  # 0 to disable, see `API`
@@ -0,0 +1,462 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import dataclasses
+import hashlib
+import os
+import shutil
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from copyt import _cli_handler, _db_manager, _fuzzy, _record_cache, api
+from copyt.models.clipboard_record import ClipboardRecord
+
+CACHE_PATH = "./tests_data/copyt-api"
+
+
+@pytest.fixture(name="copyt_api")
+def fixture_copyt_api():
+    """
+    An API instance using an empty history
+    """
+
+    shutil.rmtree(CACHE_PATH, ignore_errors=True)
+    copyt_api = api.API(
+        dataclasses.replace(_cli_handler.global_options, cache_dir=CACHE_PATH)
+    )
+    yield copyt_api
+    copyt_api.close()
+    shutil.rmtree(CACHE_PATH, ignore_errors=True)
+
+
+def test_api_fuzzy_find_narrowing(copyt_api: api.API, monkeypatch):
+    """
+    Extending a pattern only scores the previous matches again
+    """
+
+    for data in ("copy it", "clipboard manager", "cliphist", "wl-copy", "xyz"):
+        copyt_api.store(data)
+
+    scored = []
+    score = _fuzzy.score
+
+    def counting_score(pattern: str, text: str):
+        scored.append(text)
+        return score(pattern, text)
+
+    monkeypatch.setattr(_fuzzy, "score", counting_score)
+
+    assert [item_id for item_id, _ in copyt_api.fuzzy_find("c")] == [4, 3, 2, 1]
+    assert len(scored) == 5
+
+    scored.clear()
+    assert [item_id for item_id, _ in copyt_api.fuzzy_find("cli")] == [3, 2]
+    assert len(scored) == 4
+
+    scored.clear()
+    assert [item_id for item_id, _ in copyt_api.fuzzy_find("wl")] == [4]
+    assert len(scored) == 5
+
+    # the matcher is rebuilt after the history changes
+    copyt_api.store("wlroots")
+    assert [item_id for item_id, _ in copyt_api.fuzzy_find("wl")] == [6, 4]
+
+
+def test_api_iter_history_text_content(copyt_api: api.API):
+    """
+    Only the content of text items is loaded with the `text_content` field
+    """
+
+    copyt_api.store("foo")
+    copyt_api.store(b"\x89PNG\r\n\x1a\n")
+
+    assert [
+        record.content for _, record in copyt_api.iter_history(fields=("text_content",))
+    ] == ["foo", None]
+
+
+def test_api_fuzzy_find_other_connection(copyt_api: api.API):
+    """
+    The fuzzy matcher sees the changes committed by other processes
+    """
+
+    for data in ("copy it", "clipboard manager", "cliphist"):
+        copyt_api.store(data)
+
+    copyt_api.db_manager.commit()
+    assert [item_id for item_id, _ in copyt_api.fuzzy_find("clip")] == [3, 2]
+
+    other_api = api.API(copyt_api.global_options)
+    other_api.remove(2)
+    other_api.store("clipped")
+    other_api.close(commit=True)
+
+    assert [
+        (item_id, record.content) for item_id, record in copyt_api.fuzzy_find("clip")
+    ] == [(4, "clipped"), (3, "cliphist")]
+
+
+def test_api_record_cache(copyt_api: api.API, monkeypatch):
+    """
+    Cached records are read once, until the history changes
+    """
+
+    copyt_api.close()
+    copyt_api = api.API(
+        dataclasses.replace(copyt_api.global_options, record_cache_size_in_bytes=4096)
+    )
+    for data in ("foo", "bar", "baz"):
+        copyt_api.store(data)
+
+    copyt_api.commit()
+    queries = []
+    query, get_all = copyt_api.db_manager.query, copyt_api.db_manager.get_all
+    monkeypatch.setattr(
+        copyt_api.db_manager,
+        "query",
+        lambda *args: queries.append(args) or query(*args),
+    )
+    monkeypatch.setattr(
+        copyt_api.db_manager, "get_all", lambda: queries.append(()) or get_all()
+    )
+
+    record = copyt_api.get_record_from_id(2)
+    assert copyt_api.get_record_from_id(2) is record
+    assert copyt_api.get_record_from_id(2, ["mime"]).content is None
+    history = copyt_api.get_history_list()
+    assert copyt_api.get_history_list() == history
+    assert len(queries) == 3
+
+    # changes made by this instance
+    copyt_api.store("bat")
+    assert [record.content for _, record in copyt_api.get_history_list()] == [
+        "foo",
+        "bar",
+        "baz",
+        "bat",
+    ]
+    copyt_api.commit()
+
+    # changes committed by other processes
+    other_api = api.API(copyt_api.global_options)
+    other_api.remove(2)
+    other_api.close(commit=True)
+    with pytest.raises(KeyError):
+        copyt_api.get_record_from_id(2)
+
+    assert [item_id for item_id, _ in copyt_api.get_history_list()] == [1, 3, 4]
+    copyt_api.close()
+
+
+def test_api_record_cache_eviction():
+    """
+    The least recently used records are evicted once the cache is full
+    """
+
+    records = [
+        ClipboardRecord(timestamp=datetime.now(), content="x" * 100) for _ in range(3)
+    ]
+    size = _record_cache.estimate_size(records[0])
+    record_cache = _record_cache.RecordCache(size * 2)
+    record_cache.put(1, records[0])
+    record_cache.put(2, records[1])
+    assert record_cache.get(1) is records[0]
+
+    record_cache.put(3, records[2])
+    assert record_cache.get(2) is None
+    assert record_cache.get(1) is records[0]
+    assert record_cache.get(3) is records[2]
+    assert record_cache.size == size * 2
+
+    # records larger than the cache are not cached
+    record_cache.put(
+        4, ClipboardRecord(timestamp=datetime.now(), content="x" * size * 2)
+    )
+    assert record_cache.get(4) is None
+    assert len(record_cache) == 2
+
+
+def test_api_store_many(copyt_api: api.API):
+    """
+    Storing a batch of items gives the same history as storing them one by one
+    """
+
+    items = ["foo", "bar", b"\x89PNG\r\n\x1a\n", "foo", "baz", "baz", "bar"]
+    results = copyt_api.store_many(items)
+    history = [
+        (item_id, record.content, record.mime)
+        for item_id, record in copyt_api.iter_history()
+    ]
+    copyt_api.wipe()
+
+    assert results == [copyt_api.store(data) for data in items]
+    assert history == [
+        (item_id, record.content, record.mime)
+        for item_id, record in copyt_api.iter_history()
+    ]
+
+
+def test_api_compression(copyt_api: api.API):
+    """
+    Large items are compressed, unless they are already compressed
+    """
+
+    log = "".join(f"INFO line {idx}: nothing happened\n" for idx in range(1000))
+    bitmap = b"BM" + bytes(64 * 1024)
+    png = b"\x89PNG\r\n\x1a\n" + bytes(64 * 1024)
+    for data in (log, bitmap, png, "short"):
+        copyt_api.store(data)
+
+    copyt_api.commit()
+    with sqlite3.connect(copyt_api.history_file) as conn:
+        assert conn.execute("SELECT codec FROM clipboard ORDER BY id").fetchall() == [
+            ("zlib:text",),
+            ("zlib",),
+            (None,),
+            (None,),
+        ]
+
+    assert copyt_api.get_record_from_id(1).content == log
+    assert copyt_api.get_record_from_id(2).content == bitmap
+    assert [
+        record.content for _, record in copyt_api.iter_history(fields=("text_content",))
+    ] == [log, None, None, "short"]
+
+    # compressed text is indexed too
+    assert [item_id for item_id, _ in copyt_api.search("line 999")] == [1]
+    copyt_api.store(log)
+    assert [item_id for item_id, _ in copyt_api.search("line 999")] == [5]
+    copyt_api.remove(5)
+    assert not list(copyt_api.search("line 999"))
+
+
+def test_api_time_range(copyt_api: api.API):
+    """
+    Items are listed and pruned by the time they were stored
+    """
+
+    now = datetime.now()
+    blob_dir = copyt_api.history_file.parent / "blobs"
+    items = [b"\x89PNG\r\n\x1a\n" + bytes(200 * 1024), "foo", "bar", "baz"]
+    for age, data in zip((48, 12, 2, 0), items):
+        item_id = copyt_api.store(data).item_id
+        copyt_api.db_manager._db.execute(  # pylint: disable=W0212
+            "UPDATE clipboard SET timestamp = ? WHERE id = ?",
+            ((now - timedelta(hours=age)).timestamp(), item_id),
+        )
+
+    copyt_api.commit()
+    assert [
+        item_id
+        for item_id, _ in copyt_api.iter_history(since=now - timedelta(hours=24))
+    ] == [2, 3, 4]
+    assert [
+        record.content
+        for _, record in copyt_api.iter_history(
+            limit=1,
+            reverse=True,
+            since=now - timedelta(hours=24),
+            until=now - timedelta(hours=1),
+        )
+    ] == ["bar"]
+
+    assert copyt_api.prune(now - timedelta(hours=6)) == 2
+    copyt_api.commit()
+    assert [item_id for item_id, _ in copyt_api.iter_history()] == [3, 4]
+    assert not list(blob_dir.glob("??/*"))
+
+
+def test_api_changes_since(copyt_api: api.API, monkeypatch):
+    """
+    Only the changes since a cursor are read, until the change log is trimmed
+    """
+
+    for data in ("foo", "bar", "baz"):
+        copyt_api.store(data)
+
+    changes = copyt_api.changes_since(0)
+    assert [item_id for item_id, _ in changes.records] == [1, 2, 3]
+    assert not changes.reset
+    cursor = changes.cursor
+    assert copyt_api.changes_since(cursor).records == []
+    assert copyt_api.changes_since(cursor).cursor == cursor
+
+    copyt_api.store("qux")
+    copyt_api.remove(2)
+    copyt_api.store("foo")  # moved to the top
+    copyt_api.commit()
+    changes = copyt_api.changes_since(cursor, ["content"])
+    assert [(item_id, record.content) for item_id, record in changes.records] == [
+        (4, "qux"),
+        (5, "foo"),
+    ]
+    assert changes.deleted == [2, 1]
+    cursor = changes.cursor
+
+    # changes committed by other processes
+    other_api = api.API(copyt_api.global_options)
+    other_api.store("bat")
+    other_api.close(commit=True)
+    changes = copyt_api.changes_since(cursor)
+    assert [item_id for item_id, _ in changes.records] == [6]
+    cursor = changes.cursor
+
+    # readers behind the oldest deleted item read the whole history again
+    monkeypatch.setattr(_db_manager, "CHANGE_LOG_TOMBSTONES", 1)
+    for item_id in (3, 4, 5):
+        copyt_api.remove(item_id)
+
+    changes = copyt_api.changes_since(cursor)
+    assert changes.reset
+    assert [item_id for item_id, _ in changes.records] == [6]
+    assert not changes.deleted
+
+    copyt_api.wipe()
+    changes = copyt_api.changes_since(changes.cursor)
+    assert changes.reset
+    assert not changes.records
+    copyt_api.store("foo")
+    changes = copyt_api.changes_since(changes.cursor)
+    assert not changes.reset
+    assert [item_id for item_id, _ in changes.records] == [1]
+
+
+def test_api_blobs(copyt_api: api.API):
+    """
+    Large binary items are stored in their own file, removed with the item
+    """
+
+    blob_dir = copyt_api.history_file.parent / "blobs"
+    png = b"\x89PNG\r\n\x1a\n" + bytes(200 * 1024)
+    bitmap = b"BM" + os.urandom(200 * 1024)  # incompressible
+    text = "x" * 200 * 1024
+    for data in (png, bitmap, text):
+        copyt_api.store(data)
+
+    copyt_api.commit()
+    assert sorted(path.name for path in blob_dir.glob("??/*")) == sorted(
+        hashlib.sha256(data).hexdigest() for data in (png, bitmap)
+    )
+    assert copyt_api.get_record_from_id(1).content == png
+    assert copyt_api.get_record_from_id(2).content == bitmap
+    assert copyt_api.get_record_from_id(3).content == text
+
+    # storing the same item again moves it, and keeps its file
+    copyt_api.store(png)
+    copyt_api.commit()
+    assert copyt_api.get_record_from_id(4).content == png
+    assert len(list(blob_dir.glob("??/*"))) == 2
+
+    copyt_api.remove(2)
+    copyt_api.commit()
+    assert len(list(blob_dir.glob("??/*"))) == 1
+
+    copyt_api.global_options.max_items = 1
+    copyt_api.store("foo")
+    copyt_api.commit()
+    assert not list(blob_dir.glob("??/*"))
+
+    # wipe removes the files left behind, once they are old enough
+    copyt_api.global_options.max_items = 750
+    copyt_api.store(bitmap)
+    orphan = blob_dir / "00" / ("00" * 32)
+    orphan.parent.mkdir(exist_ok=True)
+    orphan.write_bytes(b"")
+    os.utime(orphan, (0, 0))
+    copyt_api.wipe()
+    copyt_api.commit()
+    assert not list(blob_dir.glob("??/*"))
+
+
+def test_api_blobs_rollback(copyt_api: api.API):
+    """
+    The files of the items stored in a transaction are removed if it is
+    rolled back, or if the history is closed without committing it
+    """
+
+    blob_dir = copyt_api.history_file.parent / "blobs"
+    png = b"\x89PNG\r\n\x1a\n" + bytes(200 * 1024)
+    bitmap = b"BM" + os.urandom(200 * 1024)
+    png_blob = [hashlib.sha256(png).hexdigest()]
+    copyt_api.store(png)
+    copyt_api.commit()
+
+    copyt_api.global_options.max_item_size_in_bytes = 300 * 1024
+    with pytest.raises(ValueError):
+        copyt_api.store_many([bitmap, bytes(400 * 1024)])
+
+    copyt_api.db_manager.rollback()
+    assert [path.name for path in blob_dir.glob("??/*")] == png_blob
+
+    # the file of an item removed then stored again is restored with it
+    copyt_api.remove(1)
+    copyt_api.store(png)
+    copyt_api.db_manager.rollback()
+    assert [path.name for path in blob_dir.glob("??/*")] == png_blob
+    assert copyt_api.get_record_from_id(1).content == png
+
+    other_api = api.API(copyt_api.global_options)
+    other_api.store(bitmap)
+    other_api.close()
+    assert [path.name for path in blob_dir.glob("??/*")] == png_blob
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib", "lzma"])
+def test_api_open_content(copyt_api: api.API, compression: str):
+    """
+    The content of items can be read in chunks, wherever it is stored
+    """
+
+    copyt_api.close()
+    copyt_api = api.API(
+        dataclasses.replace(copyt_api.global_options, compression=compression)
+    )
+    items = [
+        "foo" * 100000,
+        bytes(range(256)) * 4000,  # stored in a blob file
+        b"BM" + bytes(1000),
+        b"\x89PNG\r\n\x1a\n",
+    ]
+    for data in items:
+        copyt_api.store(data)
+
+    for item_id, data in enumerate(items, 1):
+        with copyt_api.open_content(item_id) as content:
+            chunks = []
+            while chunk := content.read(4096):
+                chunks.append(chunk)
+
+        assert max(len(chunk) for chunk in chunks) <= 4096
+        assert b"".join(chunks) == (
+            data.encode("utf-8") if isinstance(data, str) else data
+        )
+
+    with pytest.raises(KeyError):
+        copyt_api.open_content(5)
+
+    copyt_api.close()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import dataclasses
+import shutil
+import threading
+
+import pytest
+
+from copyt import _cli_handler, api, async_api
+
+CACHE_PATH = "./tests_data/copyt-async-api"
+
+
+@pytest.fixture(name="global_options")
+def fixture_global_options():
+    """
+    The options of an empty history
+    """
+
+    shutil.rmtree(CACHE_PATH, ignore_errors=True)
+    yield dataclasses.replace(_cli_handler.global_options, cache_dir=CACHE_PATH)
+    shutil.rmtree(CACHE_PATH, ignore_errors=True)
+
+
+def test_async_api(global_options, monkeypatch):
+    """
+    The async API stores, gets, lists and removes items
+    """
+
+    monkeypatch.setattr(async_api, "HISTORY_BATCH_SIZE", 3)
+
+    async def run():
+        async with async_api.AsyncAPI(global_options) as copyt_api:
+            for idx in range(10):
+                assert (await copyt_api.store(f"item {idx}")).item_id == idx + 1
+
+            record = await copyt_api.get_record_from_id(2)
+            assert record.content == "item 1"
+
+            await copyt_api.remove(2)
+            with pytest.raises(KeyError):
+                await copyt_api.get_record_from_id(2)
+
+            assert [
+                item_id async for item_id, _ in copyt_api.iter_history(limit=7)
+            ] == [1, 3, 4, 5, 6, 7, 8]
+            assert [
+                record.content
+                async for _, record in copyt_api.iter_history(
+                    offset=6, reverse=True, fields=["content"]
+                )
+            ] == ["item 3", "item 2", "item 0"]
+
+    asyncio.run(run())
+
+    # the changes were committed
+    copyt_api = api.API(global_options)
+    assert len(list(copyt_api.iter_history())) == 9
+    copyt_api.close()
+
+
+def test_async_api_concurrent(global_options, monkeypatch):
+    """
+    Concurrent calls run one at a time on a single worker thread,
+    without blocking the event loop
+    """
+
+    threads = set()
+    store = api.API.store
+
+    def tracking_store(self, data, digest=None):
+        threads.add(threading.get_ident())
+        return store(self, data, digest)
+
+    monkeypatch.setattr(api.API, "store", tracking_store)
+    monkeypatch.setattr(async_api, "HISTORY_BATCH_SIZE", 10)
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        async with async_api.AsyncAPI(global_options) as copyt_api:
+            results = await asyncio.gather(
+                *(copyt_api.store(f"item {idx}") for idx in range(50))
+            )
+            assert sorted(result.item_id for result in results) == list(range(1, 51))
+
+            ticker = asyncio.create_task(tick())
+            await asyncio.sleep(0)
+            count = 0
+            async for _ in copyt_api.iter_history():
+                count += 1
+
+            ticker.cancel()
+            assert count == 50
+            assert ticks > 1
+
+    asyncio.run(run())
+    assert len(threads) == 1
+    assert threading.get_ident() not in threads
+
+
+def test_async_api_iter_history_changed(global_options, monkeypatch):
+    """
+    The items removed between two batches do not shift the next batches
+    """
+
+    monkeypatch.setattr(async_api, "HISTORY_BATCH_SIZE", 3)
+
+    async def run():
+        async with async_api.AsyncAPI(global_options) as copyt_api:
+            for idx in range(9):
+                await copyt_api.store(f"item {idx}")
+
+            for reverse in (False, True):
+                expected = [item_id async for item_id, _ in copyt_api.iter_history()]
+                item_ids = []
+                async for item_id, _ in copyt_api.iter_history(reverse=reverse):
+                    item_ids.append(item_id)
+                    if len(item_ids) == 3:  # remove the items already read
+                        for removed_id in item_ids[:2]:
+                            await copyt_api.remove(removed_id)
+
+                assert sorted(item_ids) == expected
+
+    asyncio.run(run())
@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import dataclasses
+import glob
+import itertools
+import pathlib
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tracemalloc
+from typing import Any, Callable, Iterator
+
+import pytest
+
+from copyt import _cli_handler, api
+
+CACHE_PATH = "./tests_data/copyt-benchmarks"
+TEMPLATE_PATH = "./tests_data/copyt-benchmarks-{size}"
+
+# The number of items in the synthetic histories; the large ones take
+# minutes to build, and only run with `pytest --run-benchmarks`
+HISTORY_SIZES = [
+    750,
+    pytest.param(10_000, marks=pytest.mark.large_history),
+    pytest.param(100_000, marks=pytest.mark.large_history),
+]
+# The images spread over each history
+IMAGE_FILES = sorted(glob.glob("./tests_data/assets/*.jpg"))
+IMAGE_ITEMS = 12
+# The fields loaded by `copyt list`
+LIST_FIELDS = ("mime", "description", "size", "preview")
+BENCHMARK_ROUNDS = 5
+# Run copyt, then report its peak memory usage (in kilobytes) on stderr
+STARTUP_SCRIPT = """
+import resource, sys
+from copyt import __main__
+try:
+    __main__.main()
+finally:
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, file=sys.stderr)
+"""
+
+# A large text item and an uncompressed image
+LOG = "".join(
+    f"2023-01-01 00:00:{idx % 60:02} INFO worker {idx % 8}: processed job {idx}\n"
+    for idx in range(20000)
+)
+BITMAP = b"BM" + bytes(range(256)) * 4 * 1024
+
+
+@pytest.fixture(name="benchmark_api")
+def fixture_benchmark_api(request):
+    """
+    An API instance using an empty history and the codec of the test
+    """
+
+    shutil.rmtree(CACHE_PATH, ignore_errors=True)
+    copyt_api = api.API(
+        dataclasses.replace(
+            _cli_handler.global_options,
+            cache_dir=CACHE_PATH,
+            compression=request.param,
+            blob_threshold_in_bytes=0,  # measure what is stored in the database
+        )
+    )
+    yield copyt_api
+    copyt_api.close()
+    shutil.rmtree(CACHE_PATH, ignore_errors=True)
+
+
+@pytest.mark.parametrize("benchmark_api", ["none", "zlib", "lzma"], indirect=True)
+@pytest.mark.parametrize("data", [LOG, BITMAP], ids=["text", "bitmap"])
+def test_benchmark_compression(benchmark, benchmark_api: api.API, data: str | bytes):
+    """
+    The time taken to store and get an item, and how much it was compressed
+    """
+
+    def store_and_get():
+        benchmark_api.wipe()
+        benchmark_api.store(data)
+        return benchmark_api.get_record_from_id(1).content
+
+    assert benchmark.pedantic(store_and_get, rounds=5) == data
+
+    benchmark_api.commit()
+    with sqlite3.connect(benchmark_api.history_file) as conn:
+        stored_size = conn.execute(
+            "SELECT length(CAST(content AS BLOB)) FROM clipboard"
+        ).fetchone()[0]
+
+    benchmark.extra_info["ratio"] = stored_size / len(
+        data.encode() if isinstance(data, str) else data
+    )
+
+
+def make_history(size: int) -> Iterator[str | bytes]:
+    """
+    Make the items of a synthetic history: log lines and snippets of text
+    of various lengths, with `IMAGE_ITEMS` images spread over them.
+
+    :param int size: The number of items.
+    :return: The items, oldest first.
+    """
+
+    images = [pathlib.Path(path).read_bytes() for path in IMAGE_FILES]
+    image_step = size // IMAGE_ITEMS
+    for idx in range(size):
+        if images and idx % image_step == image_step // 2:
+            # decoders ignore trailing bytes, which make every image unique
+            yield images[idx // image_step % len(images)] + idx.to_bytes(4, "big")
+
+        else:
+            yield f"{idx:06} INFO worker {idx % 8}: processed job\n" + (
+                "lorem ipsum dolor sit amet " * (idx % 40)
+            )
+
+
+def get_options(cache_dir: str, size: int) -> Any:
+    """
+    Get the options of a history of `size` items that is never trimmed
+    by its size.
+
+    :param str cache_dir: The directory of the history.
+    :param int size: The number of items in the history.
+    :return: The options.
+    """
+
+    return dataclasses.replace(
+        _cli_handler.global_options,
+        cache_dir=cache_dir,
+        max_items=size,
+        max_total_size_in_bytes=1024**4,
+    )
+
+
+def record_peak_memory(benchmark, function: Callable[[], Any]) -> None:
+    """
+    Run a function once more while tracing memory allocations, and add
+    the peak memory usage to the results of the benchmark.
+
+    :param benchmark: The benchmark fixture.
+    :param Callable[[], Any] function: The benchmarked function.
+    """
+
+    tracemalloc.start()
+    try:
+        function()
+        benchmark.extra_info["peak_memory_in_bytes"] = tracemalloc.get_traced_memory()[
+            1
+        ]
+
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.fixture(name="history_template", scope="module", params=HISTORY_SIZES)
+def fixture_history_template(request):
+    """
+    A synthetic history, built once and copied by `history_api`
+    """
+
+    size = request.param
+    path = TEMPLATE_PATH.format(size=size)
+    shutil.rmtree(path, ignore_errors=True)
+    copyt_api = api.API(get_options(path, size))
+    copyt_api.store_many(make_history(size))
+    copyt_api.close(commit=True)
+    yield path, size
+    shutil.rmtree(path, ignore_errors=True)
+
+
+@pytest.fixture(name="history_api")
+def fixture_history_api(benchmark, history_template):
+    """
+    An API instance using a copy of a synthetic history, and its size
+    """
+
+    template_path, size = history_template
+    shutil.rmtree(CACHE_PATH, ignore_errors=True)
+    shutil.copytree(template_path, CACHE_PATH)
+    copyt_api = api.API(get_options(CACHE_PATH, size))
+    benchmark.extra_info["history_size"] = size
+    yield copyt_api, size
+    copyt_api.close()
+    shutil.rmtree(CACHE_PATH, ignore_errors=True)
+
+
+@pytest.mark.benchmark(group="store")
+def test_benchmark_store(benchmark, history_api):
+    """
+    The time taken to store a new item in a full history
+    """
+
+    copyt_api, _ = history_api
+    items = (f"new item {idx}" for idx in itertools.count())
+
+    def store():
+        copyt_api.store(next(items))
+        copyt_api.commit()
+
+    benchmark.pedantic(store, rounds=BENCHMARK_ROUNDS * 4)
+    record_peak_memory(benchmark, store)
+
+
+@pytest.mark.benchmark(group="list")
+@pytest.mark.parametrize("method", ["iter_history", "get_history_list"])
+def test_benchmark_list(benchmark, history_api, method: str):
+    """
+    The time taken to read the whole history, with the fields shown by
+    `copyt list`, or with all of them
+    """
+
+    copyt_api, size = history_api
+
+    def read_history():
+        if method == "iter_history":
+            return sum(1 for _ in copyt_api.iter_history(fields=LIST_FIELDS))
+
+        return len(copyt_api.get_history_list())
+
+    assert benchmark.pedantic(read_history, rounds=BENCHMARK_ROUNDS) == size
+    record_peak_memory(benchmark, read_history)
+
+
+@pytest.mark.benchmark(group="get")
+@pytest.mark.parametrize("kind", ["text", "image"])
+def test_benchmark_get(benchmark, history_api, kind: str):
+    """
+    The time taken to get the record of an item in the middle of the history
+    """
+
+    if kind == "image" and not IMAGE_FILES:
+        pytest.skip("No image assets")
+
+    copyt_api, size = history_api
+    image_step = size // IMAGE_ITEMS
+    # see `make_history`; the IDs start at 1, and images are followed by text
+    image_id = size // 2 // image_step * image_step + image_step // 2 + 1
+    item_id = image_id if kind == "image" else image_id + 1
+
+    record = benchmark.pedantic(
+        copyt_api.get_record_from_id, (item_id,), rounds=BENCHMARK_ROUNDS * 4
+    )
+    assert isinstance(record.content, bytes if kind == "image" else str)
+    record_peak_memory(benchmark, lambda: copyt_api.get_record_from_id(item_id))
+
+
+@pytest.mark.benchmark(group="remove")
+def test_benchmark_remove(benchmark, history_api):
+    """
+    The time taken to remove an item from the middle of the history
+    """
+
+    copyt_api, size = history_api
+    item_ids = itertools.count(size // 3)
+
+    def remove():
+        copyt_api.remove(next(item_ids))
+        copyt_api.commit()
+
+    benchmark.pedantic(remove, rounds=BENCHMARK_ROUNDS * 4)
+    record_peak_memory(benchmark, remove)
+
+
+@pytest.mark.benchmark(group="prune")
+def test_benchmark_prune(benchmark, history_api):
+    """
+    The time taken to prune the oldest hundredth of the history
+    """
+
+    copyt_api, size = history_api
+    step = size // 100
+    timestamps = iter(
+        [record.timestamp for _, record in copyt_api.iter_history(fields=())][
+            step::step
+        ]
+    )
+
+    calls = 0
+
+    def prune():
+        nonlocal calls
+        copyt_api.prune(next(timestamps))
+        copyt_api.commit()
+        calls += 1
+
+    benchmark.pedantic(prune, rounds=BENCHMARK_ROUNDS * 4)
+    record_peak_memory(benchmark, prune)
+    # each call removes another hundredth, however many rounds were run
+    assert len(list(copyt_api.iter_history(fields=()))) == size - step * calls
+
+
+@pytest.mark.benchmark(group="changes")
+def test_benchmark_changes(benchmark, history_api):
+    """
+    The time taken to poll the changes after storing an item
+    """
+
+    copyt_api, _ = history_api
+    items = (f"new item {idx}" for idx in itertools.count())
+    cursor = copyt_api.changes_since(0, LIST_FIELDS).cursor
+
+    def store():
+        copyt_api.store(next(items))
+        copyt_api.commit()
+
+    def poll():
+        nonlocal cursor
+        changes = copyt_api.changes_since(cursor, LIST_FIELDS)
+        cursor = changes.cursor
+        return changes
+
+    changes = benchmark.pedantic(poll, setup=store, rounds=BENCHMARK_ROUNDS * 4)
+    assert len(changes.records) == 1
+    store()
+    record_peak_memory(benchmark, poll)
+
+
+@pytest.mark.benchmark(group="startup")
+@pytest.mark.parametrize(
+    "args", [["get", "1"], ["list", "--limit", "10"]], ids=["get", "list"]
+)
+def test_benchmark_startup(benchmark, history_api, args: list[str]):
+    """
+    The time taken by a cold start of the CLI, and its peak memory usage
+    """
+
+    copyt_api, size = history_api
+    copyt_api.close()
+
+    def run() -> subprocess.CompletedProcess:
+        return subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT, "--cache-dir", CACHE_PATH]
+            + ["--max-items", str(size), *args],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            check=True,
+        )
+
+    process = benchmark.pedantic(run, rounds=BENCHMARK_ROUNDS)
+    benchmark.extra_info["peak_rss_in_kilobytes"] = int(process.stderr)
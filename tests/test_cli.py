@@ -24,17 +24,28 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+# pylint: disable=C0302  # one test per behavior of the CLI
+
+import base64
+import io
 import json
 import os
+import pathlib
 import pickle
 import shutil
 import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime
 from typing import Any
 
 from typer.testing import CliRunner
 
+from copyt import _db_manager
 from copyt import info as copyt_info
 from copyt._cli_handler import cmd
+from copyt.models.clipboard_record import ClipboardRecord
 
 ENCODING = "utf-8"
 CACHE_PATH = "./tests_data/copyt"
@@ -47,6 +58,20 @@ IMAGE_FILES = [
     "./tests_data/assets/lighted-match.jpg",
 ]
 
+# The wall time (in seconds) and number of imported modules allowed
+# for a cold start of `store` or `get`
+STARTUP_TIME_BUDGET = 0.5
+STARTUP_MODULES_BUDGET = 200
+# Run copyt, then report its exit code and imported modules on stderr
+STARTUP_SCRIPT = """
+import json, sys
+from copyt import __main__
+try:
+    __main__.main()
+except SystemExit as e:
+    print(json.dumps({"code": e.code, "modules": list(sys.modules)}), file=sys.stderr)
+"""
+
 cmd_runner = CliRunner()
 
 
@@ -68,12 +93,22 @@ def encode(data: Any):
     return sqlite3.Binary(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
 
 
-def decode(data: Any):
+def create_sqlitedict_history(contents: list[str | bytes]):
     """
-    How sqlitedict decodes data
+    Create a history file like the ones from the old SqliteDict backend
     """
 
-    return pickle.loads(bytes(data))
+    os.makedirs(CACHE_PATH)
+    with sqlite3.connect(DB_FILE) as conn:
+        conn.execute('CREATE TABLE "clipboard" (key TEXT PRIMARY KEY, value BLOB)')
+        for idx, data in enumerate(contents):
+            conn.execute(
+                'INSERT INTO "clipboard" (key, value) VALUES (?, ?)',
+                (
+                    idx + 1,
+                    encode(ClipboardRecord(timestamp=datetime.now(), content=data)),
+                ),
+            )
 
 
 def test_cli_version():
@@ -115,10 +150,10 @@ def test_cli_store_text_arg():
     with sqlite3.connect(DB_FILE) as conn:
         cur = conn.cursor()
         result = cur.execute(
-            "SELECT value FROM clipboard WHERE key = ?", ("1",)
+            "SELECT content FROM clipboard WHERE id = ?", (1,)
         ).fetchone()
 
-        assert decode(result[0]).content == test_data
+        assert result[0] == test_data
 
     cleanup_tests_data()
 
@@ -138,10 +173,10 @@ def test_cli_store_text_stdin():
     with sqlite3.connect(DB_FILE) as conn:
         cur = conn.cursor()
         result = cur.execute(
-            "SELECT value FROM clipboard WHERE key = ?", ("1",)
+            "SELECT content FROM clipboard WHERE id = ?", (1,)
         ).fetchone()
 
-        assert decode(result[0]).content == test_data
+        assert result[0] == test_data
 
     cleanup_tests_data()
 
@@ -162,10 +197,10 @@ def test_cli_store_image_stdin():
     with sqlite3.connect(DB_FILE) as conn:
         cur = conn.cursor()
         result = cur.execute(
-            "SELECT value FROM clipboard WHERE key = ?", ("1",)
+            "SELECT content FROM clipboard WHERE id = ?", (1,)
         ).fetchone()
 
-        assert decode(result[0]).content == test_data
+        assert result[0] == test_data
 
     cleanup_tests_data()
 
@@ -184,12 +219,12 @@ def test_cli_store_multi_text_stdin():
 
     with sqlite3.connect(DB_FILE) as conn:
         cur = conn.cursor()
-        db_result = cur.execute("SELECT * FROM clipboard").fetchall()
+        db_result = cur.execute("SELECT content FROM clipboard ORDER BY id").fetchall()
 
     assert len(db_result) == len(TEST_TEXTS)
     for idx, db_result in enumerate(db_result):
         # checked in the order they were added
-        assert decode(db_result[1]).content == TEST_TEXTS[idx]
+        assert db_result[0] == TEST_TEXTS[idx]
 
     cleanup_tests_data()
 
@@ -209,13 +244,13 @@ def test_cli_store_multi_image_stdin():
 
     with sqlite3.connect(DB_FILE) as conn:
         cur = conn.cursor()
-        db_result = cur.execute("SELECT * FROM clipboard").fetchall()
+        db_result = cur.execute("SELECT content FROM clipboard ORDER BY id").fetchall()
 
     assert len(db_result) == len(IMAGE_FILES)
     for idx, db_result in enumerate(db_result):
         # checked in the order they were added
         with open(IMAGE_FILES[idx], "rb") as f:
-            assert decode(db_result[1]).content == f.read()
+            assert db_result[0] == f.read()
 
     cleanup_tests_data()
 
@@ -404,3 +439,663 @@ def test_cli_list_text_arg_json():
         assert TEST_TEXTS[idx] == data[1]["content"]
 
     cleanup_tests_data()
+
+
+def test_cli_list_migrated_sqlitedict():
+    """
+    List records from a history file created with the old SqliteDict backend
+    """
+
+    cleanup_tests_data()
+    create_sqlitedict_history(TEST_TEXTS)
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "list"])
+
+    expected_output = ""
+    for idx, data in enumerate(TEST_TEXTS):
+        expected_output += f"{idx + 1}\t{data}\n"
+
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == expected_output
+
+    with sqlite3.connect(DB_FILE) as conn:
+        tables = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        ).fetchall()
+        sizes = conn.execute("SELECT size FROM clipboard ORDER BY id").fetchall()
+
+    assert ("clipboard_sqlitedict",) not in tables
+    assert sizes == [(len(data),) for data in TEST_TEXTS]
+
+    cleanup_tests_data()
+
+
+def test_cli_store_duplicate_text_arg():
+    """
+    Storing the same text again moves it to the top of the history
+    """
+
+    cleanup_tests_data()
+    outputs = []
+    for data in ("foo", "bar", "foo", "foo"):
+        cmd_result = cmd_runner.invoke(
+            cmd, ["--cache-dir", CACHE_PATH, "--json", "store", data]
+        )
+        assert cmd_result.exit_code == 0
+        outputs.append(json.loads(cmd_result.output))
+
+    assert outputs == [
+        {"id": 1, "duplicate": False},
+        {"id": 2, "duplicate": False},
+        {"id": 3, "duplicate": True},
+        {"id": 3, "duplicate": True},
+    ]
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "list"])
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == "2\tbar\n3\tfoo\n"
+
+    cleanup_tests_data()
+
+
+def test_cli_store_max_items():
+    """
+    Only the newest items are kept when there are more than `--max-items`
+    """
+
+    cleanup_tests_data()
+    for data in TEST_TEXTS:
+        cmd_result = cmd_runner.invoke(
+            cmd, ["--cache-dir", CACHE_PATH, "--max-items", "5", "store", data]
+        )
+        assert cmd_result.exit_code == 0
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "list"])
+
+    expected_output = ""
+    for idx, data in enumerate(TEST_TEXTS[5:], start=6):
+        expected_output += f"{idx}\t{data}\n"
+
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == expected_output
+
+    cleanup_tests_data()
+
+
+def test_cli_store_max_total_size():
+    """
+    The oldest items are evicted when the history is larger than `--max-total-size`
+    """
+
+    cleanup_tests_data()
+    for data in ("foo", "bar", "baz", "bat"):
+        cmd_result = cmd_runner.invoke(
+            cmd, ["--cache-dir", CACHE_PATH, "--max-total-size", "10", "store", data]
+        )
+        assert cmd_result.exit_code == 0
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "list"])
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == "2\tbar\n3\tbaz\n4\tbat\n"
+
+    cleanup_tests_data()
+
+
+def test_cli_store_metadata():
+    """
+    The MIME type and description of items are saved when they are stored
+    """
+
+    cleanup_tests_data()
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "store", "foo"])
+    assert cmd_result.exit_code == 0
+
+    with sqlite3.connect(DB_FILE) as conn:
+        result = conn.execute(
+            "SELECT mime, description FROM clipboard WHERE id = ?", (1,)
+        ).fetchone()
+
+    assert result == ("text/plain", "ASCII text, with no line terminators")
+
+    cmd_result = cmd_runner.invoke(
+        cmd, ["--cache-dir", CACHE_PATH, "list", "--output-format", "{id}\t{kind}"]
+    )
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == "1\ttext/plain\n"
+
+    cleanup_tests_data()
+
+
+def test_cli_backfill_migrated_sqlitedict():
+    """
+    Identify the items migrated from the old SqliteDict backend
+    """
+
+    cleanup_tests_data()
+    create_sqlitedict_history(TEST_TEXTS)
+
+    cmd_result = cmd_runner.invoke(
+        cmd, ["--cache-dir", CACHE_PATH, "--json", "backfill", "--workers", "2"]
+    )
+    assert cmd_result.exit_code == 0
+    assert json.loads(cmd_result.output) == {"updated": len(TEST_TEXTS)}
+
+    with sqlite3.connect(DB_FILE) as conn:
+        result = conn.execute("SELECT DISTINCT mime FROM clipboard").fetchall()
+
+    assert result == [("text/plain",)]
+
+    cleanup_tests_data()
+
+
+def test_cli_list_paged():
+    """
+    List a page of the history, starting from the newest items
+    """
+
+    cleanup_tests_data()
+    for data in TEST_TEXTS:
+        cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "store", data])
+        assert cmd_result.exit_code == 0
+
+    cmd_result = cmd_runner.invoke(
+        cmd,
+        [
+            "--cache-dir",
+            CACHE_PATH,
+            "list",
+            "--reverse",
+            "--limit",
+            "3",
+            "--offset",
+            "2",
+            "--output-format",
+            "{id}\t{size}\t{content}",
+        ],
+    )
+
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == "8\t3\trat\n7\t3\tsat\n6\t3\tmat\n"
+
+    cmd_result = cmd_runner.invoke(
+        cmd, ["--cache-dir", CACHE_PATH, "--json", "list", "--limit", "2"]
+    )
+
+    assert cmd_result.exit_code == 0
+    assert [item[1]["content"] for item in json.loads(cmd_result.output)] == [
+        "foo",
+        "bar",
+    ]
+
+    cleanup_tests_data()
+
+
+def test_cli_list_preview():
+    """
+    List previews of multi-line text, and the full text on request
+    """
+
+    test_data = "\n  first   line\nsecond line\n" + "x" * 200
+
+    cleanup_tests_data()
+    for data in (test_data, "y" * 200):
+        cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "store", data])
+        assert cmd_result.exit_code == 0
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "list"])
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == f"1\tfirst line\n2\t{'y' * 99}…\n"
+
+    cmd_result = cmd_runner.invoke(
+        cmd,
+        [
+            "--cache-dir",
+            CACHE_PATH,
+            "list",
+            "--limit",
+            "1",
+            "--output-format",
+            "{content_full}",
+        ],
+    )
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == test_data + "\n"
+
+    cmd_result = cmd_runner.invoke(
+        cmd, ["--cache-dir", CACHE_PATH, "--json", "list", "--full"]
+    )
+    assert cmd_result.exit_code == 0
+    assert json.loads(cmd_result.output)[0][1]["content"] == test_data
+
+    cleanup_tests_data()
+
+
+def test_cli_search():
+    """
+    Search the text items, including deleted and moved ones
+    """
+
+    cleanup_tests_data()
+    for data in (
+        "the quick brown fox",
+        "a lazy dog",
+        "quick quick quick",
+        "foxes and dogs",
+    ):
+        cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "store", data])
+        assert cmd_result.exit_code == 0
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "search", "quick"])
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == "3\tquick quick quick\n1\tthe quick brown fox\n"
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "search", "fox*"])
+    assert cmd_result.exit_code == 0
+    assert sorted(cmd_result.output.splitlines()) == [
+        "1\tthe quick brown fox",
+        "4\tfoxes and dogs",
+    ]
+
+    # move item 1 to the top and delete item 3
+    assert (
+        cmd_runner.invoke(
+            cmd, ["--cache-dir", CACHE_PATH, "store", "the quick brown fox"]
+        ).exit_code
+        == 0
+    )
+    assert (
+        cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "delete", "3"]).exit_code
+        == 0
+    )
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "search", "quick"])
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == "5\tthe quick brown fox\n"
+
+    assert cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "wipe"]).exit_code == 0
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "search", "dog*"])
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == ""
+
+    cleanup_tests_data()
+
+
+def test_cli_list_fuzzy():
+    """
+    List the items matching a fuzzy pattern, best matches first
+    """
+
+    cleanup_tests_data()
+    for data in ("copy it", "clipboard manager", "cliphist", "wl-copy"):
+        cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "store", data])
+        assert cmd_result.exit_code == 0
+
+    cmd_result = cmd_runner.invoke(
+        cmd, ["--cache-dir", CACHE_PATH, "list", "--fuzzy", "clp"]
+    )
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == "3\tcliphist\n2\tclipboard manager\n"
+
+    cmd_result = cmd_runner.invoke(
+        cmd, ["--cache-dir", CACHE_PATH, "list", "--fuzzy", "cpy", "--limit", "1"]
+    )
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == "4\twl-copy\n"
+
+    cleanup_tests_data()
+
+
+def test_cli_list_interrupted_migration(monkeypatch):
+    """
+    An interrupted schema upgrade leaves the history file untouched
+    """
+
+    def interrupted_upgrade(_):
+        raise RuntimeError("interrupted")
+
+    cleanup_tests_data()
+    create_sqlitedict_history(TEST_TEXTS)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(_db_manager.DBManager, "_create_stats_table", interrupted_upgrade)
+        cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "list"])
+        assert isinstance(cmd_result.exception, RuntimeError)
+
+    with sqlite3.connect(DB_FILE) as conn:
+        tables = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        ).fetchall()
+
+    assert tables == [("clipboard",)]
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "list"])
+
+    expected_output = ""
+    for idx, data in enumerate(TEST_TEXTS):
+        expected_output += f"{idx + 1}\t{data}\n"
+
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == expected_output
+
+    cleanup_tests_data()
+
+
+def test_cli_startup_budget():
+    """
+    `store` and `get` start quickly, without loading the full CLI
+    """
+
+    cleanup_tests_data()
+    for args in (["store", "foo"], ["get", "1"]):
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT, "--cache-dir", CACHE_PATH, *args],
+            capture_output=True,
+            check=True,
+        )
+        elapsed = time.perf_counter() - start
+        result = json.loads(process.stderr)
+
+        assert result["code"] == 0
+        assert elapsed < STARTUP_TIME_BUDGET
+        assert len(result["modules"]) < STARTUP_MODULES_BUDGET
+        for module in ("typer", "click", "rich"):
+            assert module not in result["modules"]
+
+    # libmagic is only needed to store items
+    assert "magic" not in result["modules"]
+    assert process.stdout == b"foo"
+
+    cleanup_tests_data()
+
+
+def test_cli_store_batch():
+    """
+    Store the NUL-delimited items read from stdin
+    """
+
+    cleanup_tests_data()
+    cmd_result = cmd_runner.invoke(
+        cmd,
+        ["--cache-dir", CACHE_PATH, "--json", "--max-items", "3", "store", "--batch"],
+        input=b"foo\0bar\0\x89PNG\r\n\x1a\n\xff\0foo\0baz\0",
+    )
+    assert cmd_result.exit_code == 0
+    assert [json.loads(line) for line in cmd_result.output.splitlines()] == [
+        {"id": 1, "duplicate": False},
+        {"id": 2, "duplicate": False},
+        {"id": 3, "duplicate": False},
+        {"id": 4, "duplicate": True},
+        {"id": 5, "duplicate": False},
+    ]
+
+    cmd_result = cmd_runner.invoke(
+        cmd, ["--cache-dir", CACHE_PATH, "list", "--output-format", "{id} {kind}"]
+    )
+    assert (
+        cmd_result.output == "3 application/octet-stream\n4 text/plain\n5 text/plain\n"
+    )
+
+    # nothing is stored if an item is too large
+    cmd_result = cmd_runner.invoke(
+        cmd,
+        ["--cache-dir", CACHE_PATH, "--json", "--max-item-size", "3"]
+        + ["--blob-threshold", "1", "store", "--batch"],
+        input=b"\xff\xfe\xfd\0quux\0",
+    )
+    assert cmd_result.exit_code == 10
+    assert json.loads(cmd_result.output) == {
+        "error": "The size of the data is larger than the maximum allowed size"
+    }
+    # including the file of the first item
+    assert not list(pathlib.Path(CACHE_PATH, "blobs").glob("??/*"))
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "list"])
+    assert cmd_result.output == "3\tdata\n4\tfoo\n5\tbaz\n"
+
+    cleanup_tests_data()
+
+
+class EndlessZeros(io.RawIOBase):
+    """
+    An endless stream of zeros, which counts the bytes read from it
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        buffer[:] = bytes(len(buffer))
+        self.bytes_read += len(buffer)
+        return len(buffer)
+
+
+def test_cli_store_stdin_too_large():
+    """
+    Reading stdin stops as soon as the data is larger than `--max-item-size`
+    """
+
+    cleanup_tests_data()
+    stream = EndlessZeros()
+    cmd_result = cmd_runner.invoke(
+        cmd,
+        ["--cache-dir", CACHE_PATH, "--json", "--max-item-size", "1000000", "store"],
+        input=io.BufferedReader(stream),
+    )
+    assert cmd_result.exit_code == 10
+    assert json.loads(cmd_result.output) == {
+        "error": "The size of the data is larger than the maximum allowed size"
+    }
+    assert stream.bytes_read < 1100000
+
+    cmd_result = cmd_runner.invoke(
+        cmd,
+        ["--cache-dir", CACHE_PATH, "--max-item-size", "3", "store"],
+        input="quux",
+    )
+    assert cmd_result.exit_code == 10
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "list"])
+    assert cmd_result.output == ""
+
+    # without loading the full CLI
+    process = subprocess.run(
+        [sys.executable, "-m", "copyt", "--cache-dir", CACHE_PATH]
+        + ["--max-item-size", "3", "store"],
+        input=b"quux",
+        capture_output=True,
+        check=False,
+    )
+    assert process.returncode == 10
+    assert (
+        process.stderr
+        == b"The size of the data is larger than the maximum allowed size\n"
+    )
+
+    cleanup_tests_data()
+
+
+def test_cli_store_file():
+    """
+    Store the content of files
+    """
+
+    cleanup_tests_data()
+    os.makedirs(CACHE_PATH)
+    text_file = os.path.join(CACHE_PATH, "foo.txt")
+    binary_file = os.path.join(CACHE_PATH, "foo.bin")
+    empty_file = os.path.join(CACHE_PATH, "empty")
+    binary_data = b"\x89PNG\r\n\x1a\n" + os.urandom(200 * 1024)
+    with open(text_file, "w", encoding=ENCODING) as f:
+        f.write("foo bar")
+
+    with open(binary_file, "wb") as f:
+        f.write(binary_data)
+
+    with open(empty_file, "wb"):
+        pass
+
+    for path in (text_file, binary_file, text_file):
+        cmd_result = cmd_runner.invoke(
+            cmd, ["--cache-dir", CACHE_PATH, "--json", "store", "--file", path]
+        )
+        assert cmd_result.exit_code == 0
+
+    assert json.loads(cmd_result.output) == {"id": 3, "duplicate": True}
+
+    cmd_result = cmd_runner.invoke(
+        cmd, ["--cache-dir", CACHE_PATH, "list", "--output-format", "{id} {kind}"]
+    )
+    assert cmd_result.output == "2 application/octet-stream\n3 text/plain\n"
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "get", "2"])
+    assert cmd_result.stdout_bytes == binary_data
+
+    cmd_result = cmd_runner.invoke(
+        cmd, ["--cache-dir", CACHE_PATH, "store", "--file", empty_file]
+    )
+    assert cmd_result.exit_code == 10
+
+    cmd_result = cmd_runner.invoke(
+        cmd,
+        ["--cache-dir", CACHE_PATH, "--json", "--max-item-size", "3"]
+        + ["store", "-f", text_file],
+    )
+    assert cmd_result.exit_code == 10
+    assert json.loads(cmd_result.output) == {
+        "error": "The size of the data is larger than the maximum allowed size"
+    }
+
+    cleanup_tests_data()
+
+
+def test_cli_get_binary_streamed():
+    """
+    Get binary items stored in a blob file or in the database, compressed or not
+    """
+
+    cleanup_tests_data()
+    items = [
+        b"\x89PNG\r\n\x1a\n" + os.urandom(200 * 1024),  # stored in a blob file
+        b"BM\xff" + bytes(100 * 1024),  # compressed
+        b"\xff\x00\x01",
+    ]
+    for data in items:
+        cmd_result = cmd_runner.invoke(
+            cmd, ["--cache-dir", CACHE_PATH, "store"], input=data
+        )
+        assert cmd_result.exit_code == 0
+
+    output_file = os.path.join(CACHE_PATH, "output")
+    for idx, data in enumerate(items, 1):
+        cmd_result = cmd_runner.invoke(
+            cmd, ["--cache-dir", CACHE_PATH, "get", str(idx)]
+        )
+        assert cmd_result.stdout_bytes == data
+
+        cmd_result = cmd_runner.invoke(
+            cmd, ["--cache-dir", CACHE_PATH, "--json", "get", str(idx)]
+        )
+        assert base64.b64decode(json.loads(cmd_result.output)["content"]) == data
+
+        # written by the kernel, when both are files
+        with open(output_file, "wb") as f:
+            subprocess.run(
+                [sys.executable, "-m", "copyt", "--cache-dir", CACHE_PATH, "get"]
+                + [str(idx)],
+                stdout=f,
+                check=True,
+            )
+
+        with open(output_file, "rb") as f:
+            assert f.read() == data
+
+    cleanup_tests_data()
+
+
+def test_cli_time_range():
+    """
+    List the items of a time range, and prune the old items
+    """
+
+    cleanup_tests_data()
+    now = time.time()
+    for data, age in (("foo", 40 * 86400), ("bar", 7200), ("baz", 1800), ("bat", 0)):
+        cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "store", data])
+        assert cmd_result.exit_code == 0
+        with sqlite3.connect(DB_FILE) as conn:
+            conn.execute(
+                "UPDATE clipboard SET timestamp = ? WHERE preview = ?",
+                (now - age, data),
+            )
+
+    for args, expected_output in (
+        (["--since", "1h"], "3\tbaz\n4\tbat\n"),
+        (["--until", "1h"], "1\tfoo\n2\tbar\n"),
+        (["--since", "3h", "--until", "1h", "--reverse"], "2\tbar\n"),
+        (["--since", datetime.fromtimestamp(now - 1).isoformat()], "4\tbat\n"),
+    ):
+        cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "list", *args])
+        assert cmd_result.exit_code == 0
+        assert cmd_result.output == expected_output
+
+    cmd_result = cmd_runner.invoke(
+        cmd, ["--cache-dir", CACHE_PATH, "list", "--since", "yesterday"]
+    )
+    assert cmd_result.exit_code == 2
+
+    cmd_result = cmd_runner.invoke(
+        cmd, ["--cache-dir", CACHE_PATH, "prune", "--older-than", "30d"]
+    )
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == "Removed 1 items\n"
+
+    cmd_result = cmd_runner.invoke(
+        cmd, ["--cache-dir", CACHE_PATH, "--json", "prune", "--older-than", "30d"]
+    )
+    assert json.loads(cmd_result.output) == {"pruned": 0}
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "list"])
+    assert cmd_result.output == "2\tbar\n3\tbaz\n4\tbat\n"
+
+    cleanup_tests_data()
+
+
+def test_cli_list_since_id():
+    """
+    List the changes since a cursor
+    """
+
+    cleanup_tests_data()
+    for data in ("foo", "bar"):
+        cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "store", data])
+
+    cmd_result = cmd_runner.invoke(
+        cmd, ["--cache-dir", CACHE_PATH, "--json", "list", "--since-id", "0"]
+    )
+    changes = json.loads(cmd_result.output)
+    assert [item[0] for item in changes["items"]] == ["1", "2"]
+
+    cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "store", "baz"])
+    cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "delete", "1"])
+    cmd_result = cmd_runner.invoke(
+        cmd,
+        ["--cache-dir", CACHE_PATH, "--json", "list"]
+        + ["--since-id", str(changes["cursor"])],
+    )
+    changes = json.loads(cmd_result.output)
+    assert changes["items"][0][0] == "3"
+    assert changes["items"][0][1]["content"] == "baz"
+    assert changes["deleted"] == ["1"]
+    assert not changes["reset"]
+
+    cmd_result = cmd_runner.invoke(
+        cmd, ["--cache-dir", CACHE_PATH, "list", "--since-id", "0"]
+    )
+    assert cmd_result.exit_code == 2
+
+    cleanup_tests_data()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import sqlite3
+import subprocess
+import sys
+import time
+
+from tests.test_cli import CACHE_PATH, DB_FILE, cleanup_tests_data
+
+STRESS_PROCESSES = 8
+STRESS_STORES = 15  # per process
+# Each process stores its own items, and an item shared by all of them
+STRESS_SCRIPT = """
+import sys
+from copyt import _fast_path
+
+worker, stores, cache_dir = sys.argv[1:]
+argv = ["--cache-dir", cache_dir, "--max-items", "1000", "store"]
+for idx in range(int(stores)):
+    assert _fast_path.run(argv + [f"{worker}-{idx}"]) == 0
+
+assert _fast_path.run(argv + ["shared"]) == 0
+"""
+
+
+def test_concurrent_stores(record_property):
+    """
+    Concurrent `store` processes neither lose nor duplicate items
+    """
+
+    cleanup_tests_data()
+    start = time.perf_counter()
+    processes = [
+        subprocess.Popen(  # pylint: disable=R1732
+            [sys.executable, "-c", STRESS_SCRIPT]
+            + [str(worker), str(STRESS_STORES), CACHE_PATH],
+        )
+        for worker in range(STRESS_PROCESSES)
+    ]
+    assert [process.wait(timeout=120) for process in processes] == [0] * len(processes)
+    elapsed = time.perf_counter() - start
+
+    stores = STRESS_PROCESSES * (STRESS_STORES + 1)
+    record_property("stores_per_second", stores / elapsed)
+
+    with sqlite3.connect(DB_FILE) as conn:
+        rows = conn.execute("SELECT id, content FROM clipboard ORDER BY id").fetchall()
+
+    expected = {
+        f"{worker}-{idx}"
+        for worker in range(STRESS_PROCESSES)
+        for idx in range(STRESS_STORES)
+    }
+    assert sorted(content for _, content in rows) == sorted(expected | {"shared"})
+    # the IDs are allocated one after the other
+    assert [item_id for item_id, _ in rows][-1] <= stores
+
+    cleanup_tests_data()
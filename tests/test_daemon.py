@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import dataclasses
+import os
+import pathlib
+import queue
+import select
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from copyt import _cli_handler, _daemon, api
+from copyt._cli_handler import cmd
+from copyt.models.clipboard_record import ClipboardRecord
+from tests.test_cli import CACHE_PATH, cleanup_tests_data, cmd_runner
+
+
+@pytest.fixture(name="daemon_socket")
+def fixture_daemon_socket(monkeypatch):
+    """
+    A daemon serving an empty history from another thread
+    """
+
+    cleanup_tests_data()
+    monkeypatch.setenv("XDG_RUNTIME_DIR", os.path.abspath("./tests_data/runtime"))
+    socket_path = _daemon.get_socket_path(CACHE_PATH)
+    servers: queue.Queue = queue.Queue()
+
+    def run_daemon():
+        copyt_api = api.API(
+            dataclasses.replace(_cli_handler.global_options, cache_dir=CACHE_PATH)
+        )
+        server = _daemon.Server(socket_path, copyt_api)
+        servers.put(server)
+        server.serve_forever()
+        server.server_close()
+        copyt_api.close(commit=True)
+
+    daemon = threading.Thread(target=run_daemon)
+    daemon.start()
+    server = servers.get(timeout=5)
+    try:
+        yield socket_path
+
+    finally:
+        server.shutdown()
+        daemon.join(timeout=5)
+        cleanup_tests_data()
+
+
+def test_cli_daemon(daemon_socket: pathlib.Path):
+    """
+    Commands are forwarded to the daemon while it is running
+    """
+
+    # a client that keeps its connection open does not block the others
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as idle_client:
+        idle_client.connect(str(daemon_socket))
+        _daemon._send(idle_client, {"method": "iter_history"})  # pylint: disable=W0212
+        assert idle_client.recv(1024)
+
+        for data in ("foo", "bar", "baz", "bat"):
+            cmd_result = cmd_runner.invoke(
+                cmd, ["--cache-dir", CACHE_PATH, "--max-items", "3", "store", data]
+            )
+            assert cmd_result.exit_code == 0
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "list"])
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == "2\tbar\n3\tbaz\n4\tbat\n"
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "get", "3"])
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == "baz"
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "delete", "3"])
+    assert cmd_result.exit_code == 0
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "get", "3"])
+    assert cmd_result.exit_code == 10
+
+    cmd_result = cmd_runner.invoke(
+        cmd, ["--cache-dir", CACHE_PATH, "--max-item-size", "2", "store", "qux"]
+    )
+    assert isinstance(cmd_result.exception, ValueError)
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "list"])
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == "2\tbar\n4\tbat\n"
+
+    cmd_result = cmd_runner.invoke(
+        cmd, ["--cache-dir", CACHE_PATH, "list", "--since", "1h", "--until", "0s"]
+    )
+    assert cmd_result.exit_code == 0
+    assert cmd_result.output == "2\tbar\n4\tbat\n"
+
+
+def test_daemon_slow_client(daemon_socket: pathlib.Path):
+    """
+    A client reading a large response slowly gets all of it,
+    without blocking the others meanwhile
+    """
+
+    copyt_api = api.API(
+        dataclasses.replace(
+            _cli_handler.global_options, cache_dir=CACHE_PATH, max_items=1000
+        )
+    )
+    copyt_api.store_many(f"{idx:04} " + "x" * 1000 for idx in range(1000))
+    copyt_api.close(commit=True)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as slow_client:
+        slow_client.connect(str(daemon_socket))
+        _daemon._send(slow_client, {"method": "iter_history"})  # pylint: disable=W0212
+        assert select.select([slow_client], [], [], 5)[0]
+
+        start = time.monotonic()
+        cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "store", "foo"])
+        assert cmd_result.exit_code == 0
+        assert time.monotonic() - start < _daemon.REQUEST_TIMEOUT
+
+        time.sleep(0.5)
+        receive = _daemon._receive  # pylint: disable=W0212
+        with slow_client.makefile("rb") as stream:
+            frames = list(iter(lambda: receive(stream), None))
+
+    # the response was read before the item was stored
+    assert len(frames) == 1001
+    assert frames[-1][0] == {"end": True}
+
+
+def test_cli_daemon_connection_lost(monkeypatch):
+    """
+    A connection to the daemon lost in the middle of a response is reported
+    """
+
+    cleanup_tests_data()
+    monkeypatch.setenv("XDG_RUNTIME_DIR", os.path.abspath("./tests_data/runtime"))
+    socket_path = _daemon.get_socket_path(CACHE_PATH)
+    os.makedirs(socket_path.parent)
+    record = ClipboardRecord(
+        timestamp=datetime.now(), content="foo", mime="text/plain", preview="foo"
+    )
+
+    def serve_one_record(listener: socket.socket):
+        while True:
+            try:
+                connection, _ = listener.accept()
+
+            except OSError:  # the listener was closed
+                return
+
+            with connection, connection.makefile("rb") as stream:
+                if _daemon._receive(stream) is not None:  # pylint: disable=W0212
+                    connection.sendall(
+                        _daemon._pack(  # pylint: disable=W0212
+                            *_daemon._encode_record(1, record)  # pylint: disable=W0212
+                        )
+                    )
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        listener.bind(str(socket_path))
+        listener.listen()
+        threading.Thread(target=serve_one_record, args=(listener,), daemon=True).start()
+        for args, output in ((["list"], b"1\tfoo\n"), (["get", "1"], b"")):
+            process = subprocess.run(
+                [sys.executable, "-m", "copyt", "--cache-dir", CACHE_PATH, *args],
+                capture_output=True,
+                check=False,
+            )
+            assert process.returncode == 12
+            assert process.stdout == output
+            assert process.stderr == b"The daemon closed the connection\n"
+
+    cleanup_tests_data()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import pickle
+from datetime import datetime
+
+import pytest
+
+from copyt import _record_format
+from copyt.models.clipboard_record import ClipboardRecord
+
+TIMESTAMP = datetime(2023, 5, 1, 12, 30, 15, 250001)
+RECORDS = [
+    ClipboardRecord(timestamp=TIMESTAMP, content="foo ✓", size=7, preview="foo ✓"),
+    ClipboardRecord(
+        timestamp=TIMESTAMP,
+        content=b"\x89PNG\r\n\x1a\n",
+        mime="image/png",
+        description="PNG image data",
+        size=8,
+    ),
+    ClipboardRecord(timestamp=TIMESTAMP, content=""),
+    ClipboardRecord(timestamp=TIMESTAMP, content=None, mime="", size=0),
+]
+
+
+class LegacyRecord:  # pylint: disable=R0903
+    """
+    Pickles like the records of copyt versions without `__slots__`
+    """
+
+    def __init__(self, state: dict):
+        self.state = state
+
+    def __reduce__(self):
+        return object.__new__, (ClipboardRecord,), self.state
+
+
+@pytest.mark.parametrize("record", RECORDS)
+def test_record_format_round_trip(record: ClipboardRecord):
+    """
+    Records are decoded as they were encoded
+    """
+
+    data = _record_format.encode(record)
+    assert _record_format.decode(data) == record
+    assert _record_format.decode(memoryview(data + b"trailing")) == record
+
+
+def test_record_format_metadata():
+    """
+    The metadata of a record is decoded without its content
+    """
+
+    data = _record_format.encode(RECORDS[1])
+    record, flags, content_slice = _record_format.decode_metadata(memoryview(data))
+
+    assert record.content is None
+    assert record.mime == "image/png"
+    assert record.size == 8
+    assert record.timestamp == TIMESTAMP
+    assert flags & _record_format.HAS_CONTENT
+    assert not flags & _record_format.TEXT_CONTENT
+    assert data[content_slice] == RECORDS[1].content
+
+
+def test_record_format_invalid():
+    """
+    Truncated records and unknown versions are rejected
+    """
+
+    data = _record_format.encode(RECORDS[0])
+    with pytest.raises(ValueError):
+        _record_format.decode(data[:-1])
+
+    with pytest.raises(ValueError):
+        _record_format.decode(data[: _record_format.HEADER.size - 1])
+
+    with pytest.raises(ValueError):
+        _record_format.decode(b"\xff" + data[1:])
+
+
+def test_record_format_legacy_pickle():
+    """
+    Records pickled by older versions of copyt can still be read
+    """
+
+    record = pickle.loads(
+        pickle.dumps(LegacyRecord({"timestamp": TIMESTAMP, "content": "foo"}))
+    )
+
+    assert record == ClipboardRecord(timestamp=TIMESTAMP, content="foo")
+    assert not hasattr(record, "__dict__")
+    assert pickle.loads(pickle.dumps(RECORDS[1])) == RECORDS[1]
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import struct
+import sys
+import zlib
+
+import pytest
+
+from copyt import _sniffer, helpers
+
+magic = pytest.importorskip("magic")
+
+PNG_HEADER = struct.pack(">IIBBBBB", 16, 32, 8, 6, 0, 0, 0)
+PNG = (
+    b"\x89PNG\r\n\x1a\n"
+    + struct.pack(">I", 13)
+    + b"IHDR"
+    + PNG_HEADER
+    + struct.pack(">I", zlib.crc32(b"IHDR" + PNG_HEADER))
+)
+JPEG = (
+    b"\xff\xd8\xff\xe0"
+    + struct.pack(">H", 16)
+    + b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    + b"\xff\xc2"
+    + struct.pack(">HBHHB", 17, 8, 600, 800, 3)
+    + b"\x01\x22\x00\x02\x11\x01\x03\x11\x01\xff\xda"
+)
+VP8_CHUNK = (
+    b"VP8 "
+    + struct.pack("<I", 18)
+    + b"\x00\x00\x00\x9d\x01\x2a"
+    + struct.pack("<HH", 16, 32)
+    + bytes(8)
+)
+WEBP = b"RIFF" + struct.pack("<I", 4 + len(VP8_CHUNK)) + b"WEBP" + VP8_CHUNK
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        "foo",
+        "foo\nbar\n",
+        "foo\r\nbar\r\n",
+        "foo\r\nbar\nbaz",
+        "x" * 400,
+        "café\n",
+        "\ufeffhello\n",
+        "a\x1bb\n",
+        "<!DOCTYPE html>\n<html>\n",
+        'hello <a href="x">link</a>\n',
+        "%PDF-1.4\n",
+        PNG,
+        b"GIF89a\x10\x00\x20\x00" + bytes(10),
+        b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n",
+    ],
+)
+def test_sniffer_like_libmagic(data: str | bytes):
+    """
+    The common types are identified like libmagic does
+    """
+
+    assert _sniffer.sniff(data) == (
+        magic.from_buffer(data, mime=True),
+        magic.from_buffer(data),
+    )
+
+
+def test_sniffer_image_dimensions():
+    """
+    The dimensions of images are read from their headers
+    """
+
+    assert _sniffer.sniff(JPEG) == (
+        "image/jpeg",
+        "JPEG image data, JFIF standard 1.01, progressive, precision 8, 800x600,"
+        " components 3",
+    )
+    assert _sniffer.sniff(WEBP) == (
+        "image/webp",
+        "RIFF (little-endian) data, Web/P image, 16x32",
+    )
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        '{"spam": "eggs"}',
+        "#!/bin/sh\necho foo\n",
+        "foo\x00bar",
+        b"\x89PNG\r\n\x1a\n\xff",  # truncated
+        b"\xff\x00\x01",
+    ],
+)
+def test_sniffer_unknown(data: str | bytes):
+    """
+    Other types, and damaged images, are left to libmagic
+    """
+
+    assert _sniffer.sniff(data) is None
+
+
+def test_sniff_without_libmagic(monkeypatch):
+    """
+    Data is still identified when python-magic is not installed
+    """
+
+    monkeypatch.setitem(sys.modules, "magic", None)
+    assert helpers.sniff(PNG)[0] == "image/png"
+    assert helpers.sniff('{"spam": "eggs"}') == (
+        "text/plain",
+        "ASCII text, with no line terminators",
+    )
+    assert helpers.sniff(b"\xff\x00\x01") == _sniffer.OCTET_STREAM
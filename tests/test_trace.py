@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+
+from copyt import _trace
+
+from .test_cli import CACHE_PATH, cleanup_tests_data
+
+TRACE_DIR = "./tests_data/trace"
+TRACE_FILE = os.path.join(TRACE_DIR, "trace.jsonl")
+
+
+def run_copyt(*args: str, env: dict | None = None) -> subprocess.CompletedProcess:
+    """
+    Run copyt in a new process
+    """
+
+    return subprocess.run(
+        [sys.executable, "-m", "copyt", "--cache-dir", CACHE_PATH, *args],
+        capture_output=True,
+        check=True,
+        env={**os.environ, **(env or {})},
+    )
+
+
+def get_phases(report: dict) -> list[str]:
+    """
+    The names of the phases in a report
+    """
+
+    return [phase["phase"] for phase in report["phases"]]
+
+
+def test_trace_disabled():
+    """
+    Phases are not traced by default, and cost nothing
+    """
+
+    assert _trace.phase("foo") is _trace.phase("bar")
+    assert not tracemalloc.is_tracing()
+
+
+def test_trace_phases():
+    """
+    Phases record their time and allocations, including nested phases
+    """
+
+    cleanup_tests_data()
+    os.makedirs(TRACE_DIR)
+    tracer = _trace._Tracer(TRACE_FILE)  # pylint: disable=W0212
+    try:
+        with _trace._Phase(tracer, "outer"):  # pylint: disable=W0212
+            with _trace._Phase(tracer, "inner"):  # pylint: disable=W0212
+                data = bytearray(1024 * 1024)
+
+            del data
+
+        tracer.report()
+
+    finally:
+        tracemalloc.stop()
+
+    with open(TRACE_FILE, encoding="utf-8") as trace_file:
+        report = json.loads(trace_file.read())
+
+    outer, inner = report["phases"]
+    assert get_phases(report) == ["outer", "outer/inner"]
+    assert inner["allocated_in_bytes"] >= 1024 * 1024
+    assert outer["allocated_in_bytes"] < 1024 * 1024
+    assert outer["peak_memory_in_bytes"] >= inner["peak_memory_in_bytes"]
+    assert outer["wall_time_in_seconds"] >= inner["wall_time_in_seconds"]
+
+    cleanup_tests_data()
+
+
+def test_trace_profile():
+    """
+    `--profile` shows the phases on stderr, with or without the full CLI
+    """
+
+    cleanup_tests_data()
+    report = json.loads(run_copyt("--profile", "store", "foo").stderr)
+    assert get_phases(report) == [
+        "store",
+        "store/open history",
+        "store/open history/upgrade schema",
+        "store/add",
+        "store/sniff",
+        "store/evict",
+        "store/commit",
+    ]
+
+    report = json.loads(run_copyt("--profile", "list").stderr)
+    assert get_phases(report) == ["list", "list/open history", "list/output"]
+
+    cleanup_tests_data()
+
+
+def test_trace_environment():
+    """
+    `COPYT_TRACE` appends the phases to a file, imports included
+    """
+
+    cleanup_tests_data()
+    os.makedirs(TRACE_DIR)
+    env = {_trace.TRACE_VARIABLE: TRACE_FILE}
+    assert run_copyt("store", "foo", env=env).stderr == b""
+    assert run_copyt("get", "1", env=env).stdout == b"foo"
+
+    with open(TRACE_FILE, encoding="utf-8") as trace_file:
+        store_report, get_report = map(json.loads, trace_file)
+
+    assert get_phases(store_report)[0] == "import"
+    assert get_phases(get_report) == [
+        "import",
+        "get",
+        "get/open history",
+        "get/query",
+        "get/output",
+    ]
+    assert get_report["argv"][-2:] == ["get", "1"]
+
+    cleanup_tests_data()
+
+
+def test_trace_environment_disabled():
+    """
+    `COPYT_TRACE` only enables tracing with `1`, `stderr` or a path
+    """
+
+    for value in ("", "0", "false", "FALSE"):
+        assert _trace.get_output(value) is None
+
+    assert _trace.get_output(None) is None
+    assert _trace.get_output("1") == "stderr"
+    assert _trace.get_output("stderr") == "stderr"
+    assert _trace.get_output(TRACE_FILE) == TRACE_FILE
+
+    cleanup_tests_data()
+    os.makedirs(TRACE_DIR)
+    process = subprocess.run(
+        [sys.executable, "-m", "copyt", "--cache-dir", "../copyt", "store", "foo"],
+        capture_output=True,
+        check=True,
+        cwd=TRACE_DIR,
+        env={**os.environ, "PYTHONPATH": os.getcwd(), _trace.TRACE_VARIABLE: "0"},
+    )
+    assert process.stderr == b""
+    # the history is the only thing written
+    assert os.listdir(TRACE_DIR) == []
+
+    cleanup_tests_data()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+"""
+MIT License
+
+Copyright (c) 2023 Chris1320
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import signal
+import subprocess
+import sys
+
+from copyt import _watch
+from copyt._cli_handler import cmd
+from tests.test_cli import CACHE_PATH, cleanup_tests_data, cmd_runner
+
+
+def test_cli_watch_nul():
+    """
+    Store a stream of NUL-delimited clips
+    """
+
+    cleanup_tests_data()
+    cmd_result = cmd_runner.invoke(
+        cmd,
+        ["--cache-dir", CACHE_PATH, "--json", "watch"],
+        input=b"foo\0bar\nbaz\0\0\x89PNG\r\n\x1a\n\xff\0foo\0bat",
+    )
+    assert cmd_result.exit_code == 0
+    assert [json.loads(line) for line in cmd_result.output.splitlines()] == [
+        {"id": 1, "duplicate": False},
+        {"id": 2, "duplicate": False},
+        {"id": 3, "duplicate": False},
+        {"id": 4, "duplicate": True},
+        {"id": 5, "duplicate": False},
+    ]
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "get", "3"])
+    assert cmd_result.stdout_bytes == b"\x89PNG\r\n\x1a\n\xff"
+
+    cmd_result = cmd_runner.invoke(
+        cmd, ["--cache-dir", CACHE_PATH, "list", "--output-format", "{content}"]
+    )
+    assert cmd_result.output == "bar\ndata\nfoo\nbat\n"
+
+    cleanup_tests_data()
+
+
+def test_cli_watch_length_prefixed():
+    """
+    Store a stream of clips preceded by their size
+    """
+
+    cleanup_tests_data()
+    cmd_result = cmd_runner.invoke(
+        cmd,
+        ["--cache-dir", CACHE_PATH, "watch", "--framing", "length"],
+        input=b"3\nfoo4\nb\0r\n0\n3\nba",
+    )
+    assert cmd_result.exit_code == 0
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "get", "2"])
+    assert cmd_result.output == "b\0r\n"
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "list"])
+    assert cmd_result.output == "1\tfoo\n2\tb\0r\n"
+
+    cleanup_tests_data()
+
+
+def test_cli_watch_invalid_clips():
+    """
+    Invalid sizes and clips larger than `--max-item-size` are reported and
+    skipped, without stopping the watcher
+    """
+
+    cleanup_tests_data()
+    cmd_result = cmd_runner.invoke(
+        cmd,
+        ["--cache-dir", CACHE_PATH, "--json", "--max-item-size", "4"]
+        + ["watch", "--framing", "length"],
+        input=b"x\n3\nfoo5\nfoo\n\n-1\n" + b"9" * 30 + b"\n3\nbar",
+    )
+    assert cmd_result.exit_code == 0
+    # the errors are reported as the stream is read, before storing its clips
+    assert [json.loads(line) for line in cmd_result.output.splitlines()] == [
+        {"error": "Invalid clip size in the stream"},
+        {"error": "The size of the data is larger than the maximum allowed size"},
+        {"error": "Invalid clip size in the stream"},
+        {"error": "Invalid clip size in the stream"},
+        {"id": 1, "duplicate": False},
+        {"id": 2, "duplicate": False},
+    ]
+
+    cmd_result = cmd_runner.invoke(
+        cmd,
+        ["--cache-dir", CACHE_PATH, "--json", "--max-item-size", "4"]
+        + ["watch", "--framing", "nul"],
+        input=b"foo\0" + b"x" * 200000 + b"\0baz\0quux",
+    )
+    assert cmd_result.exit_code == 0
+    assert [json.loads(line) for line in cmd_result.output.splitlines()] == [
+        {"error": "The size of the data is larger than the maximum allowed size"},
+        {"id": 3, "duplicate": True},
+        {"id": 4, "duplicate": False},
+        {"id": 5, "duplicate": False},
+    ]
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "list"])
+    assert cmd_result.output == "2\tbar\n3\tfoo\n4\tbaz\n5\tquux\n"
+
+    cleanup_tests_data()
+
+
+def test_watch_decoders_bounded():
+    """
+    The decoders do not buffer the clips larger than the maximum size
+    """
+
+    errors = []
+    for decoder, chunks in (
+        (_watch.NulDecoder(10, errors.append), [b"a" * 100] * 1000 + [b"\0ok\0"]),
+        (
+            _watch.LengthPrefixedDecoder(10, errors.append),
+            [b"99990\n"] + [b"a" * 99] * 1010 + [b"2\nok"],
+        ),
+    ):
+        clips = []
+        for chunk in chunks:
+            clips += decoder.feed(chunk)
+            assert len(decoder._buffer) <= 20  # pylint: disable=W0212
+
+        assert clips == [b"ok"]
+
+    assert errors == [_watch.TOO_LARGE_MESSAGE] * 2
+
+
+def test_cli_watch_sigterm():
+    """
+    The clips stored before SIGTERM are saved
+    """
+
+    cleanup_tests_data()
+    with subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "copyt",
+            "--cache-dir",
+            CACHE_PATH,
+            "--verbose",
+            "watch",
+            "--commit-interval",
+            "3600",
+        ],
+        stdin=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    ) as process:
+        assert process.stdin is not None and process.stderr is not None
+        process.stdin.write(b"foo\0bar\0")
+        process.stdin.flush()
+        assert process.stderr.readline() == b"Stored item 1\n"
+        assert process.stderr.readline() == b"Stored item 2\n"
+
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=5) == 0
+
+    cmd_result = cmd_runner.invoke(cmd, ["--cache-dir", CACHE_PATH, "list"])
+    assert cmd_result.output == "1\tfoo\n2\tbar\n"
+
+    cleanup_tests_data()